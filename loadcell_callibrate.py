@@ -1,92 +1,113 @@
 #!/usr/bin/env python3
 """
-Standalone calibration script for HX711 load cell amplifier.
-Determines and prints both the offset (zero reading) and the reference_unit (calibration factor) for converting raw counts to grams.
-Takes 20 readings to compute the offset and 100 readings to compute the calibration factor.
+Standalone calibration script for HX711 load cell amplifiers.
+Determines both the offset (zero reading) and the reference_unit (calibration factor) for converting raw counts to grams,
+for every weighing zone in main.LOAD_CELL_CHANNELS (all zones are sampled concurrently through a LoadCellArray).
+Records the empty offset plus any number of known weights per zone and fits them by least squares, reporting the
+linearity error. The result is saved with a hardware fingerprint to the calibration store, where setup_scale and
+LoadCellArray pick it up on the next start (no constants need copying).
+Takes up to 20 readings for the offset and up to 100 readings per known weight,
+stopping early once the robust estimate has settled (glitch samples and outliers are rejected).
 """
 
 import time
-import RPi.GPIO as GPIO
-from hx711 import HX711
 
-# Configuration: BCM pin numbers for your HX711 wiring
-DOUT_PIN = 5
-SCK_PIN  = 6
+from main import LOAD_CELL_CHANNELS
+from modules import load_cells
+from modules.calibration_store import CalibrationStore, fit_calibration, hardware_fingerprint
+from modules.load_cell_array import LoadCellArray
 
-# Number of samples to average for raw reading
-def read_raw(hx, readings=10):
-    values = []
-    for _ in range(readings):
-        if hasattr(hx, 'get_value'):
-            val = hx.get_value(1)
-        elif hasattr(hx, 'get_weight'):
-            val = hx.get_weight(1)
-        elif hasattr(hx, 'get_units'):
-            val = hx.get_units(1)
-        elif hasattr(hx, 'read_average'):
-            val = hx.read_average(1)
-        elif hasattr(hx, 'read'):
-            val = hx.read(1)
-        elif hasattr(hx, '_read'):
-            val = hx._read()
-        else:
-            raise AttributeError('No supported read method on HX711')
-        values.append(val)
-    return sum(values) / len(values)
+# Settling rule for raw readings: window agreement in counts and window size in samples
+RAW_TOLERANCE = 15.0
+RAW_WINDOW = 20
+# Upper bound on one reading (the HX711 may run at 10 samples/s)
+MAX_READ_TIME = 15.0
 
 
-def main():
-    print("Initializing HX711...")
-    GPIO.setmode(GPIO.BCM)
-    hx = HX711(DOUT_PIN, SCK_PIN)
+# Robust raw readings (counts) of every zone from at most `readings` fresh samples each
+# (None for a zone that gave no valid sample)
+def read_raw(scales, readings=10, names=None):
+    reading = scales.read(max_samples=readings, since=time.monotonic(), tolerance=RAW_TOLERANCE,
+                          window=min(RAW_WINDOW, max(readings, 4)), max_time=MAX_READ_TIME, names=names)
+    for name, estimate in reading.zones.items():
+        print(f"  {name}: {estimate.summary('counts')}")
+    return {name: estimate.value for name, estimate in reading.zones.items()}
 
-    # Try library-specific setup methods gracefully
-    if hasattr(hx, 'set_reading_format'):
-        try:
-            hx.set_reading_format('MSB', 'MSB')
-        except Exception:
-            pass
-    # Use a unity scale to read raw values
-    if hasattr(hx, 'set_reference_unit'):
-        try:
-            hx.set_reference_unit(1)
-        except Exception:
-            pass
-    elif hasattr(hx, 'set_scale'):
+
+def collect_points(scales, name, offset):
+    """
+    Ask for known weights on one zone until the operator enters a blank mass.
+    """
+    where = f" on {name}" if len(scales.names) > 1 else ""
+    points = [(0.0, offset)]
+    while True:
+        entry = input(f"\nPlace a known weight{where} and enter its mass in grams (blank to finish): ").strip()
+        if not entry:
+            if len(points) > 1:
+                return points
+            print("At least one known weight is needed.")
+            continue
         try:
-            hx.set_scale(1)
-        except Exception:
-            pass
+            known = float(entry)
+        except ValueError:
+            print(f"'{entry}' is not a mass in grams; enter a number such as 100 or 250.5.")
+            continue
+        if known <= 0:
+            print("The known mass must be greater than zero.")
+            continue
+        input("Press Enter when the weight is stable to take readings (100 readings)...")
 
-    # Reset and preliminary tare
-    for method in ('reset', 'tare'):
-        if hasattr(hx, method):
-            try:
-                getattr(hx, method)()
-            except Exception:
-                pass
+        # Read raw count with weight (100 readings)
+        raw_with_weight = read_raw(scales, readings=100, names=[name])[name]
+        if raw_with_weight is None:
+            print(f"No valid samples from {name}; this weight was not recorded, please try again.")
+            continue
+        print(f"Raw reading with weight: {raw_with_weight:.2f}")
+        points.append((known, raw_with_weight))
 
-    # Record offset (20 readings)
-    input("Ensure the scale is empty and press Enter to record offset (20 readings)...")
-    offset = read_raw(hx, readings=20)
-    print(f"\nOffset (raw zero count): {offset:.2f}")
 
-    # Ask for known weight
-    known = float(input("\nPlace a known weight on the scale and enter its mass in grams: "))
-    input("Press Enter when the weight is stable to take readings (100 readings)...")
+def main():
+    print("Initializing HX711...")
+    # Unity scale and no offset, so every reading is in raw counts
+    configs = [dict(c, reference_unit=1, zero_offset=0) for c in LOAD_CELL_CHANNELS]
+    scales = LoadCellArray(configs, use_calibration=False)
+    store = CalibrationStore()
 
-    # Read raw count with weight (100 readings)
-    raw_with_weight = read_raw(hx, readings=100)
-    print(f"Raw reading with weight: {raw_with_weight:.2f}")
+    try:
+        # Record offset (20 readings)
+        input("Ensure the scale is empty and press Enter to record offset (20 readings)...")
+        offsets = read_raw(scales, readings=20)
+        failed = [name for name, offset in offsets.items() if offset is None]
+        while failed:
+            answer = input(f"No valid samples from {', '.join(failed)}. Press Enter to retry, "
+                           f"or type 'skip' to leave them uncalibrated: ").strip().lower()
+            if answer == "skip":
+                break
+            offsets.update(read_raw(scales, readings=20, names=failed))
+            failed = [name for name in failed if offsets[name] is None]
+        for name, offset in offsets.items():
+            if offset is not None:
+                print(f"\n{name} offset (raw zero count): {offset:.2f}")
 
-    # Compute calibration factor subtracting offset
-    reference_unit = (raw_with_weight - offset) / known
-    print(f"Suggested reference_unit (counts per gram): {reference_unit:.2f}\n")
+        for config in configs:
+            name = config['name']
+            if offsets[name] is None:
+                print(f"⚠️ Skipping {name}: no offset was recorded, its stored calibration is unchanged.\n")
+                continue
+            points = collect_points(scales, name, offsets[name])
 
-    # Clean up GPIO
-    GPIO.cleanup()
+            # Least-squares fit of raw = reference_unit * mass + zero_offset
+            calibration = fit_calibration(points, name, hardware_fingerprint(config))
+            print(f"{name}: {calibration.summary()}")
+            for mass, raw in points:
+                print(f"  {mass:10.2f} g -> {raw:12.2f} counts (residual {calibration.to_grams(raw) - mass:+.3f} g)")
+            store.save(calibration)
+            print(f"✅ Saved {name} calibration to {store.path}\n")
+    finally:
+        # Clean up GPIO
+        scales.close()
+        load_cells.cleanup()
 
 
 if __name__ == '__main__':
     main()
-
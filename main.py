@@ -1,41 +1,504 @@
 #!/usr/bin/env python3
+import argparse
+import json
 import sys
+import time
+from contextlib import nullcontext
+
+from modules import backend
+
+RELAY_PINS = {
+    '1': ('Left Lock', 18),
+    '2': ('Right Lock', 27),
+    '3': ('Buzzer', 22),
+}
+# Relay safety: the two locks are never energized together, and no relay
+# stays on longer than its limit (seconds)
+RELAY_INTERLOCKS = [('Left Lock', 'Right Lock')]
+RELAY_MAX_ON = {'Left Lock': 5.0, 'Right Lock': 5.0, 'Buzzer': 10.0}
+
+# PIR OUT pin and its power-up stabilisation time
+PIR_PIN = 17
+PIR_WARMUP = 10.0
+
+ENDSTOP_PINS = (23, 24)
+# MFRC522 reader on I2C bus 1
+RFID_ADDRESS = 0x28
+
+# One entry per weighing zone (see loadcell_callibrate.py for the constants)
+LOAD_CELL_CHANNELS = [
+    {
+        'name': 'platform',
+        'dout_pin': 5,
+        'pd_sck_pin': 6,
+        'reference_unit': -237.63,
+        'zero_offset': 2230937.88,
+    },
+]
+# Smallest total load (grams) the weight test accepts as a placed weight
+WEIGHT_TEST_MIN_LOAD = 20.0
+
+
+def station_wiring() -> dict:
+    """The GPIO wiring above, as recorded in the hardware inventory."""
+    return {
+        'relays': {name: pin for name, pin in RELAY_PINS.values()},
+        'pir': PIR_PIN,
+        'endstops': list(ENDSTOP_PINS),
+        'load_cells': {c['name']: [c['dout_pin'], c['pd_sck_pin']] for c in LOAD_CELL_CHANNELS},
+        'led_strip': 'D12',
+    }
+
 
 def test_two_endstops_flexible(pin1: int, pin2: int, timeout: float = 30.0) -> bool:
     """
     Flexible endstop test: user can press either switch first in any order.
+    Both switches are watched at once; `timeout` bounds the whole test.
     """
-    from modules.endstop import setup_gpio, test_endstop, cleanup_gpio
+    from modules.endstop import watch_endstops, cleanup_gpio
 
-    # Initialize both pins
-    setup_gpio(pin1)
-    setup_gpio(pin2)
+    try:
+        print(f"TEST: Press and release the endstop switches on pin {pin1} and pin {pin2}, in any order…")
+        report = watch_endstops([pin1, pin2], timeout)
+        if report["passed"]:
+            print("Both endstop switches passed the flexible test.")
+            return True
+        missing = [pin for pin, stats in report["pins"].items() if not stats["completed"]]
+        print(f"Switch(es) on pin(s) {missing} were not detected. Test failed.")
+        return False
 
+    finally:
+        cleanup_gpio()
+
+
+# Warm drivers while running as the hardware daemon (--serve); None otherwise
+_devices = None
+
+
+def warm_device(name):
+    """
+    The hardware daemon's warm driver `name`, or None outside the daemon (or
+    if it cannot be opened); tests then set up and tear down the hardware
+    themselves.
+    """
+    if _devices is None or name not in _devices:
+        return None
     try:
-        print(f"TEST: Press either endstop switch on pin {pin1} or pin {pin2}…")
-        # Attempt first detection on pin1
-        if test_endstop(pin1, timeout):
-            first, second = pin1, pin2
-            print(f"Switch on pin {first} detected. Now press switch on pin {second}.")
-        else:
-            # Assume pin2 was pressed first
-            print(f"Switch on pin {pin2} detected first or timeout on pin {pin1}. Now press switch on pin {pin1}.")
-            first, second = pin2, pin1
+        return _devices.get(name)
+    except Exception as e:
+        print(f"Warm {name} unavailable ({e}); setting it up for this test.", file=sys.stderr)
+        return None
 
-        # Test the second switch
-        ok_second = test_endstop(second, timeout)
-        if ok_second:
-            print("Both endstop switches passed the flexible test.")
+
+# --- Component tests (shared by the menu, the --all/--tests runner and the daemon) ---
+
+def run_led_test() -> bool:
+    from modules.led_status import get_service
+    service = get_service()
+    if service is not None:
+        # The status service owns the strip during --all/--tests runs
+        from modules.led_animation import startup_wave
+        stats = service.play(startup_wave(len(service.strip), fps=50.0)).result()
+    else:
+        from modules.led import initialize_strip, startup_test, board
+        strip = initialize_strip(num_pixels=72, pin=board.D12, brightness=200)
+        stats = startup_test(strip, wait=0.02)
+    print(f"NeoPixel startup test completed ({stats.summary()}).")
+    return True
+
+
+def run_weight_test() -> bool:
+    from modules.load_cell_array import prompt_and_read_array
+    reading = prompt_and_read_array(LOAD_CELL_CHANNELS, readings=30, scales=warm_device('scale'))
+    print(f"Weight readings: {', '.join(f'{n}={z.value}' for n, z in reading.zones.items())}; total {reading.total}")
+    if reading.total is None:
+        print("No valid weight reading. Test failed.")
+        return False
+    if reading.total < WEIGHT_TEST_MIN_LOAD:
+        # An empty platform reads fine too; only a placed weight proves the load cells respond
+        print(f"No weight on the platform (less than {WEIGHT_TEST_MIN_LOAD:g} g). Test failed.")
+        return False
+    print("Weight reading completed.")
+    return True
+
+
+def run_relay_test(pins=None, duration: float = 3.0) -> bool:
+    """
+    Switch the selected relays (all by default) on for `duration` seconds
+    each, concurrently except the interlocked locks, which take turns.
+    """
+    from modules.relay import RelayController
+    channels = {name: pin for name, pin in RELAY_PINS.values() if pins is None or pin in pins}
+    with RelayController(channels, max_on=RELAY_MAX_ON, interlocks=RELAY_INTERLOCKS) as relays:
+        actions = relays.verify(duration)
+        ok = relays.wait(actions, timeout=max(a.ends_at for a in actions) - time.monotonic() + 1.0)
+        for action in actions:
+            status = "completed" if action.done() and action.future.exception() is None else "FAILED"
+            print(f"Relay test on pin {channels[action.name]} ({action.name}) {status}.")
+        start = relays.log[0][0] if relays.log else 0.0
+        for t, name, event in relays.log:
+            print(f"  +{t - start:.3f}s {name}: {event}")
+    return ok
+
+
+def run_rfid_test(timeout: float = 5.0) -> bool:
+    from modules.hw_inventory import get_inventory
+    from modules.rfid_service import RFIDService
+    if not get_inventory().has_i2c(RFID_ADDRESS):
+        print(f"Warning: nothing answered at 0x{RFID_ADDRESS:02x} in the last I2C scan "
+              "(run with --rescan if the reader was just connected).")
+    warm = warm_device('rfid')
+    # A one-off service creates the reader and closes its bus however the test ends
+    with nullcontext(warm) if warm is not None else RFIDService() as service:
+        print("TEST: Please place a card on the reader…")
+        event = service.wait_for_tag(timeout)
+        print(f"RFID scan stats: {service.stats()}")
+    from modules.i2c_bus import get_bus
+    print(f"I2C bus stats: {get_bus(1).stats()}")
+    if event:
+        print("Tag found:", [hex(b) for b in event.uid])
+        print("RFID module test passed.")
+        return True
+    print("RFID tag was not detected. Test failed.")
+    return False
+
+
+def run_pir_test() -> bool:
+    from modules.pir_sensor import get_sensor, release_sensor
+    # Reuses the sensor if run_all (or the daemon) already started its warm-up
+    warm = warm_device('pir')
+    sensor = warm if warm is not None else get_sensor(PIR_PIN, PIR_WARMUP)
+    try:
+        sensor.wait_ready()
+        pulse = sensor.wait_for_motion(timeout=15)
+        if pulse:
+            print(f"✅ PIR sensor test passed (motion {pulse.start - sensor.ready_at:.2f}s after warm-up).")
             return True
+        print("❌ PIR failed to detect motion")
+        return False
+    finally:
+        if warm is None:
+            release_sensor(PIR_PIN)
+
+
+def run_endstop_test() -> bool:
+    # Success/failure messages are printed by the test itself
+    return test_two_endstops_flexible(*ENDSTOP_PINS)
+
+
+def run_outer_camera_test() -> bool:
+    from modules.camera import CameraTester
+    from modules.camera_pool import CapturePool
+    from modules.hw_inventory import get_inventory
+    warm = warm_device('cameras')
+    with nullcontext(warm) if warm is not None else CapturePool() as pool:
+        if warm is not None:
+            available = pool.indices()
+        else:
+            # Open straight at capture resolution so each device is opened and negotiated once
+            available = CameraTester.list_available_cameras(max_index=3, pool=pool, width=1920, height=1080,
+                                                            indices=get_inventory().usb_cameras)
+        print(f"Found cameras at indices: {available}")
+        with CameraTester(available, width=1920, height=1080, pool=pool) as tester:
+            sync = tester.run_synchronized_tests(save_dir="snapshots")
+            results = sync['results']
+            for idx, ts in sync['timestamps'].items():
+                print(f"Camera {idx} captured at t={ts:.6f}s")
+            print(f"Capture skew across cameras: {sync['skew_s'] * 1000:.2f} ms")
+            print(pool.report())
+            print(tester.buffers.report())
+            for path, written in tester.wait_for_saves().items():
+                print(f"Snapshot {path}: {'saved' if written else 'FAILED'}")
+    for idx, metrics in results.items():
+        print(f"Camera {idx} → {metrics.summary()}")
+    if not all(results.values()):
+        print("One or more cameras failed their tests.")
+    return bool(results) and all(results.values())
+
+
+def run_inner_camera_test() -> bool:
+    from modules.hw_inventory import get_inventory
+    from modules.picamera import test_picamera
+    metrics = test_picamera(session=warm_device('picamera'), camera_num=get_inventory().picamera_num)
+    print("PiCamera test completed.")
+    return bool(metrics)
+
+
+def run_qr_test() -> bool:
+    from modules.hw_inventory import get_inventory
+    from modules.qr_reader import open_scanner, prompt_and_wait_for_qr
+    warm = warm_device('qr')
+    if warm is not None:
+        # Only a code scanned from now on counts
+        warm.clear()
+    # Falls back to decoding from a camera when no serial scanner is attached
+    with nullcontext(warm) if warm is not None else open_scanner(get_inventory().qr_port) as scanner:
+        scanned_data = prompt_and_wait_for_qr(timeout=30.0, scanner=scanner)
+        print(f"QR scanner stats: {scanner.stats()}")
+    if scanned_data:
+        print(f"Scanned QR code data: {scanned_data}")
+        return True
+    print("No QR code was scanned. Test failed.")
+    return False
+
+
+def build_test_specs():
+    """
+    Describe every component test for the parallel runner.
+
+    Resources mark what a test must hold exclusively: its GPIO pins (pins
+    are claimed and released individually through the GPIO manager, so
+    tests on different pins run side by side), the I2C bus, the cameras, the
+    serial scanner, the LED strip, and the operator for tests that need a
+    person to act (place a weight, tap a tag, wave at the PIR, press the
+    switches, scan a code), so those run one at a time and their prompts do
+    not interleave.
+    """
+    from modules.orchestrator import TestSpec
+
+    def gpio(*pins):
+        return {f'gpio{pin}' for pin in pins}
+
+    relay_pins = [pin for _, pin in RELAY_PINS.values()]
+    # Without a serial scanner the QR test decodes from a camera instead
+    from modules.hw_inventory import get_inventory
+    qr_resources = {'serial', 'operator'} if get_inventory().qr_port else {'serial', 'camera', 'operator'}
+    load_cell_pins = [c[key] for c in LOAD_CELL_CHANNELS for key in ('dout_pin', 'pd_sck_pin')]
+    return [
+        TestSpec('led', run_led_test, {'led'}, estimate=7.0, timeout=60,
+                 description='NeoPixel startup test'),
+        TestSpec('weight', run_weight_test, gpio(*load_cell_pins) | {'operator'}, estimate=2.0,
+                 description='Weight reading test'),
+        TestSpec('relay', run_relay_test, gpio(*relay_pins), estimate=6.5, timeout=60,
+                 description='Relay test (all pins)'),
+        TestSpec('rfid', run_rfid_test, {'i2c', 'operator'}, estimate=5.0, timeout=30,
+                 description='RFID module test'),
+        TestSpec('pir', run_pir_test, gpio(PIR_PIN) | {'operator'}, estimate=12.0, timeout=60,
+                 description='PIR sensor test'),
+        TestSpec('endstop', run_endstop_test, gpio(*ENDSTOP_PINS) | {'operator'}, estimate=5.0, timeout=90,
+                 description='Endstop switch flexible test'),
+        TestSpec('outer_camera', run_outer_camera_test, {'camera'}, estimate=6.0, timeout=60,
+                 description='Outer Camera test'),
+        TestSpec('inner_camera', run_inner_camera_test, {'camera'}, estimate=3.0, timeout=60,
+                 description='Inner Camera test'),
+        TestSpec('qr', run_qr_test, qr_resources, estimate=5.0, timeout=60,
+                 description='QR code scan test'),
+    ]
+
+
+def start_status_leds(names):
+    """
+    Start the background LED status service with one strip segment per test.
+    Returns None (and the run continues without LEDs) if the strip is unavailable.
+    """
+    try:
+        from modules.led_status import start_service
+        return start_service(names)
+    except Exception as e:
+        print(f"Status LEDs unavailable: {e}", file=sys.stderr)
+        return None
+
+
+def run_tests(names=None, thread_context=None) -> dict:
+    """
+    Run the selected tests (all when `names` is None) concurrently and
+    return the orchestrator summary. Raises ValueError for unknown names.
+    `thread_context` is passed to run_schedule (the daemon captures each
+    test thread's output with it).
+    """
+    from modules.orchestrator import run_schedule
+    specs = build_test_specs()
+    if names:
+        known = {s.name for s in specs}
+        unknown = [n for n in names if n not in known]
+        if unknown:
+            raise ValueError(f"Unknown test(s): {', '.join(unknown)}. Available: {', '.join(sorted(known))}")
+        specs = [s for s in specs if s.name in names]
+
+    if any(s.name == 'pir' for s in specs):
+        # Start the PIR warm-up now so it overlaps whatever runs first
+        from modules.pir_sensor import get_sensor
+        get_sensor(PIR_PIN, PIR_WARMUP)
+
+    warm_status = warm_device('leds')
+    if warm_status is not None:
+        warm_status.clear()
+    status = warm_status or start_status_leds([s.name for s in specs])
+
+    def show_progress(event, spec, passed=None):
+        if event == 'start':
+            status.running(spec.name, spec.estimate)
         else:
-            print(f"Switch on pin {second} was not detected. Test failed.")
-            return False
+            status.result(spec.name, passed)
 
+    try:
+        return run_schedule(specs, on_event=show_progress if status else None, thread_context=thread_context)
     finally:
-        cleanup_gpio()
+        if status:
+            print(f"Status LEDs: {status.stats()}")
+        if status and warm_status is None:
+            from modules.led_status import stop_service
+            stop_service()
+
+
+def run_all(names=None, output=None) -> int:
+    """
+    Run the selected tests (all when `names` is None) concurrently and print
+    a JSON summary. Returns the process exit code.
+    """
+    try:
+        summary = run_tests(names)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    report = json.dumps(summary, indent=2)
+    print(report)
+    if output:
+        with open(output, 'w') as fh:
+            fh.write(report + '\n')
+    return 0 if summary['passed'] else 1
+
+
+def build_daemon_devices():
+    """
+    The drivers the hardware daemon keeps warm, in start-up order. Relays
+    and endstops only claim GPIO pins, which is cheap, so their tests still
+    set them up per run.
+    """
+    from modules.hw_daemon import Device
+    from modules.hw_inventory import get_inventory
+    inventory = get_inventory()
+
+    def open_leds():
+        from modules.led_status import start_service
+        return start_service([s.name for s in build_test_specs()])
+
+    def close_leds(service):
+        from modules.led_status import stop_service
+        stop_service()
+
+    def open_scale():
+        from modules.load_cell_array import LoadCellArray
+        return LoadCellArray(LOAD_CELL_CHANNELS)
+
+    def close_scale(scales):
+        from modules import load_cells
+        scales.close()
+        load_cells.cleanup()
+
+    def open_rfid():
+        from modules.rfid_service import RFIDService
+        return RFIDService().start()
+
+    def open_qr():
+        # No camera fallback here: the daemon keeps the cameras open itself
+        from modules.qr_reader import open_scanner
+        return open_scanner(inventory.qr_port, fallback=False)
+
+    def open_pir():
+        from modules.pir_sensor import get_sensor
+        return get_sensor(PIR_PIN, PIR_WARMUP)
+
+    def close_pir(sensor):
+        from modules.pir_sensor import release_sensor
+        release_sensor(PIR_PIN)
+
+    def open_cameras():
+        from modules.camera import CameraTester
+        from modules.camera_pool import CapturePool
+        pool = CapturePool(idle_timeout=None)
+        CameraTester.list_available_cameras(max_index=3, pool=pool, width=1920, height=1080,
+                                            indices=inventory.usb_cameras)
+        return pool
+
+    def open_picamera():
+        from modules.picamera import PiCameraSession
+        session = PiCameraSession(inventory.picamera_num)
+        session.wait_for_convergence()
+        return session
+
+    return [
+        Device('leds', open_leds, closer=close_leds),
+        Device('scale', open_scale, closer=close_scale),
+        Device('rfid', open_rfid, closer=lambda service: service.stop()),
+        Device('qr', open_qr),
+        Device('pir', open_pir, closer=close_pir),
+        Device('cameras', open_cameras),
+        Device('picamera', open_picamera),
+    ]
+
+
+def serve(path=None) -> None:
+    """Run as the hardware daemon: warm every driver once and serve test runs on a Unix socket."""
+    global _devices
+    from modules.hw_daemon import DeviceRegistry, HardwareDaemon
+    _devices = DeviceRegistry(build_daemon_devices())
+    try:
+        HardwareDaemon(_devices, run_tests, path).serve_forever()
+    finally:
+        _devices = None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ArculusBoxx component test runner")
+    parser.add_argument(
+        "--backend",
+        choices=[backend.HARDWARE, backend.SIMULATED],
+        default=None,
+        help=f"Hardware backend to use (default: ${backend.BACKEND_ENV} or '{backend.HARDWARE}')"
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Run every test non-interactively, in parallel where resources allow"
+    )
+    parser.add_argument(
+        "--tests",
+        type=lambda s: [n.strip() for n in s.split(',') if n.strip()],
+        default=None,
+        help="Comma-separated test names to run non-interactively (e.g. rfid,pir,qr)"
+    )
+    parser.add_argument(
+        "--output", "-o",
+        default=None,
+        help="Also write the JSON summary to this file"
+    )
+    parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="Probe the attached hardware again instead of using the cached inventory"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run as the hardware daemon, keeping every driver warm "
+             "(send it tests with: python -m modules.hw_daemon run rfid,qr)"
+    )
+    parser.add_argument(
+        "--socket",
+        default=None,
+        help="Unix socket path for --serve (default: $ARCULUS_SOCKET or /tmp/arculus-hwd.sock)"
+    )
+    return parser.parse_args(argv)
 
 
 def main():
+    args = parse_args()
+    if args.backend:
+        backend.use_backend(args.backend)
+
+    # Cached across runs; re-probed when the attached devices change
+    from modules.hw_inventory import load_inventory
+    inventory = load_inventory(station_wiring(), refresh=args.rescan)
+    print(f"Hardware inventory ({inventory.source}): {inventory.summary()}")
+
+    if args.serve:
+        serve(args.socket)
+        sys.exit(0)
+
+    if args.all or args.tests:
+        sys.exit(run_all(None if args.all else args.tests, args.output))
+
     menu = {
         '1': 'NeoPixel startup test',
         '2': 'Weight reading test',
@@ -60,34 +523,13 @@ def main():
             sys.exit(0)
 
         if choice == '1':
-            from modules.led import initialize_strip, startup_test
-            import board
-            strip = initialize_strip(num_pixels=72, pin=board.D12, brightness=200)
-            startup_test(strip, wait=0.02)
-            print("NeoPixel startup test completed.")
+            run_led_test()
 
         elif choice == '2':
-            from modules.load_cells import prompt_and_read
-            weight = prompt_and_read(
-                config={
-                    'dout_pin': 5,
-                    'pd_sck_pin': 6,
-                    'reference_unit': -237.63,
-                    'zero_offset': 2230937.88
-                },
-                readings=30
-            )
-            print(f"Weight readings: {weight}")
-            print("Weight reading completed.")
+            run_weight_test()
 
         elif choice == '3':
-            from modules.relay import Relay
-            pin_menu = {
-                '1': ('Left Lock', 18),
-                '2': ('Right Lock', 27),
-                '3': ('Buzzer', 22),
-                '0': ('Back to main menu', None)
-            }
+            pin_menu = dict(RELAY_PINS, **{'0': ('Back to main menu', None)})
             print("\nSelect which relay pin to test:")
             for k, (desc, _) in pin_menu.items():
                 print(f"{k}. {desc}")
@@ -95,69 +537,27 @@ def main():
             if sub_choice == '0':
                 continue
             elif sub_choice in pin_menu:
-                pin = pin_menu[sub_choice][1]
-                with Relay(pin=pin) as relay:
-                    relay.test(duration=3.0)
-                    print(f"Relay test on pin {pin} completed.")
+                run_relay_test([pin_menu[sub_choice][1]])
             else:
                 print("Invalid choice for relay pin. Returning to main menu.")
 
         elif choice == '4':
-            from modules.rfid import RFID2
-            import time
-            reader = RFID2()
-            print("TEST: Please place a card on the reader…")
-            uid = None
-            for _ in range(50):  # ~5 seconds
-                uid = reader.inventory()
-                if uid:
-                    print("Tag found:", [hex(b) for b in uid])
-                    break
-                time.sleep(0.1)
-            reader.close()
-            if uid:
-                print("RFID module test passed.")
-            else:
-                print("RFID tag was not detected. Test failed.")
+            run_rfid_test()
 
         elif choice == '5':
-            from modules.pir_sensor import PIRSensorTest
-            sensor = PIRSensorTest(pin=17, calibration_delay=10.0)
-            try:
-                if sensor.detect_motion(timeout=15):
-                    print("✅ PIR sensor test passed.")
-                else:
-                    print("❌ PIR failed to detect motion")
-            finally:
-                sensor.cleanup()
+            run_pir_test()
 
         elif choice == '6':
-            # Flexible endstop test
-            if test_two_endstops_flexible(pin1=23, pin2=24):
-                pass  # success message already printed
-            else:
-                pass  # failure message already printed
+            run_endstop_test()
 
         elif choice == '7':
-            from modules.camera import CameraTester
-            available = CameraTester.list_available_cameras(max_index=3)
-            print(f"Found cameras at indices: {available}")
-            tester = CameraTester(available, width=1920, height=1080)
-            results = tester.run_tests(save_dir="snapshots")
-            for idx, passed in results.items():
-                print(f"Camera {idx} → {'OK' if passed else 'FAIL'}")
-            if not all(results.values()):
-                print("One or more cameras failed their tests.")
+            run_outer_camera_test()
 
         elif choice == '8':
-            from modules.picamera import test_picamera
-            test_picamera()
-            print("PiCamera test completed.")
+            run_inner_camera_test()
 
         elif choice == '9':
-            from modules.qr_reader import prompt_and_wait_for_qr
-            scanned_data = prompt_and_wait_for_qr()
-            print(f"Scanned QR code data: {scanned_data}")
+            run_qr_test()
 
         else:
             print("Invalid choice. Please try again.")
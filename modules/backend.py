@@ -0,0 +1,198 @@
+"""
+backend.py — Hardware backend selection for the component test suite.
+
+Every hardware-facing module gets its drivers from here instead of importing
+RPi.GPIO, hx711, mfrc522_i2c, serial, neopixel/board, cv2 or picamera2
+directly. That lets the same code run either against the real Raspberry Pi
+drivers or against the deterministic simulators in ``modules.sim``.
+
+The backend is chosen by the ``ARCULUS_BACKEND`` environment variable
+("hardware", the default, or "sim"), or by calling ``use_backend()`` before
+any component module is imported:
+
+    from modules import backend
+    backend.use_backend("sim")
+    from modules.endstop import test_endstop
+
+The simulated devices are configured by a scenario (see ``modules.sim.scenario``),
+optionally loaded from the JSON file named by ``ARCULUS_SIM_SCENARIO``.
+"""
+
+import glob
+import os
+
+__all__ = [
+    "BACKEND_ENV",
+    "HARDWARE",
+    "SIMULATED",
+    "use_backend",
+    "current_backend",
+    "is_simulated",
+    "gpio",
+    "hx711_class",
+    "hx711_bank_class",
+    "mfrc522_class",
+    "smbus_class",
+    "serial_module",
+    "serial_ports",
+    "neopixel_module",
+    "board_module",
+    "cv2_module",
+    "picamera2_class",
+    "video_nodes",
+]
+
+BACKEND_ENV = "ARCULUS_BACKEND"
+HARDWARE = "hardware"
+SIMULATED = "sim"
+
+_ALIASES = {
+    "hardware": HARDWARE,
+    "hw": HARDWARE,
+    "pi": HARDWARE,
+    "sim": SIMULATED,
+    "simulated": SIMULATED,
+    "simulator": SIMULATED,
+}
+
+_backend = None
+
+
+def _normalise(name: str) -> str:
+    try:
+        return _ALIASES[name.strip().lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown backend {name!r}; expected one of {sorted(set(_ALIASES.values()))}"
+        ) from None
+
+
+def use_backend(name: str) -> None:
+    """
+    Select the backend for this process (and any child processes).
+
+    Must be called before the component modules are imported, since they bind
+    their drivers at import time.
+    """
+    global _backend
+    _backend = _normalise(name)
+    os.environ[BACKEND_ENV] = _backend
+
+
+def current_backend() -> str:
+    """Return the active backend name, resolving it from the environment once."""
+    global _backend
+    if _backend is None:
+        _backend = _normalise(os.environ.get(BACKEND_ENV, HARDWARE))
+    return _backend
+
+
+def is_simulated() -> bool:
+    return current_backend() == SIMULATED
+
+
+def gpio():
+    """Return the RPi.GPIO module, or the simulated GPIO namespace."""
+    if is_simulated():
+        from modules.sim.gpio import GPIO
+        return GPIO
+    import RPi.GPIO as GPIO
+    return GPIO
+
+
+def hx711_class():
+    """Return the HX711 driver class."""
+    if is_simulated():
+        from modules.sim.hx711 import HX711
+        return HX711
+    from hx711 import HX711
+    return HX711
+
+
+def hx711_bank_class():
+    """Return the reader class for HX711 chips sharing one PD_SCK line."""
+    if is_simulated():
+        from modules.sim.hx711 import HX711Bank
+        return HX711Bank
+    from modules.hx711_bank import HX711Bank
+    return HX711Bank
+
+
+def mfrc522_class():
+    """Return the MFRC522 (I2C) reader class."""
+    if is_simulated():
+        from modules.sim.mfrc522 import MFRC522
+        return MFRC522
+    from mfrc522_i2c.mfrc522_i2c import MFRC522
+    return MFRC522
+
+
+def smbus_class():
+    """Return the SMBus class (one handle per /dev/i2c-N bus)."""
+    if is_simulated():
+        from modules.sim.smbus import SMBus
+        return SMBus
+    from smbus import SMBus
+    return SMBus
+
+
+def serial_module():
+    """Return the pyserial module, or a simulated module exposing Serial/SerialException."""
+    if is_simulated():
+        from modules.sim import serial_port
+        return serial_port
+    import serial
+    return serial
+
+
+def serial_ports():
+    """Return the serial port descriptors (shaped like serial.tools.list_ports.comports())."""
+    if is_simulated():
+        from modules.sim.serial_port import comports
+        return comports()
+    from serial.tools.list_ports import comports
+    return comports()
+
+
+def neopixel_module():
+    """Return the neopixel module."""
+    if is_simulated():
+        from modules.sim import neopixel
+        return neopixel
+    import neopixel
+    return neopixel
+
+
+def board_module():
+    """Return the Blinka board module (pin definitions)."""
+    if is_simulated():
+        from modules.sim.neopixel import board
+        return board
+    import board
+    return board
+
+
+def cv2_module():
+    """Return OpenCV, with VideoCapture replaced by a synthetic source when simulated."""
+    if is_simulated():
+        from modules.sim.video import cv2
+        return cv2
+    import cv2
+    return cv2
+
+
+def picamera2_class():
+    """Return the Picamera2 class."""
+    if is_simulated():
+        from modules.sim.video import Picamera2
+        return Picamera2
+    from picamera2 import Picamera2
+    return Picamera2
+
+
+def video_nodes():
+    """Return the sorted /dev/video* device nodes visible to this backend."""
+    if is_simulated():
+        from modules.sim.video import video_nodes as sim_video_nodes
+        return sim_video_nodes()
+    return sorted(glob.glob("/dev/video*"))
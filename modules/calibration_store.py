@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Module: calibration_store.py
+
+Multi-point load cell calibration: least-squares fit of known-mass points
+and a persistent JSON store keyed by channel name.
+
+A fit maps raw counts to grams the same way the rest of the suite does,
+weight = (raw - zero_offset) / reference_unit, and reports the linearity
+error (largest residual of any calibration point, in grams).
+
+Each stored calibration carries a hardware fingerprint (machine ID,
+backend, channel pins and gain) and a timestamp. setup_scale and
+LoadCellArray look calibrations up at startup and use them instead of the
+constants in their configs; a record whose fingerprint does not match the
+current wiring, or that is older than MAX_AGE_DAYS, is ignored.
+
+The store lives at ~/.arculus/load_cell_calibration.json unless
+ARCULUS_CALIBRATION names another file.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from modules import backend
+
+__all__ = [
+    'CALIBRATION_ENV',
+    'Calibration',
+    'CalibrationStore',
+    'fit_calibration',
+    'hardware_fingerprint',
+    'channel_name',
+    'apply_stored_calibration',
+]
+
+CALIBRATION_ENV = 'ARCULUS_CALIBRATION'
+DEFAULT_PATH = os.path.join('~', '.arculus', 'load_cell_calibration.json')
+
+# Stored calibrations older than this are treated as missing
+MAX_AGE_DAYS = 90
+
+
+def channel_name(config):
+    """
+    Store key of a channel config: its 'name', or one derived from its pins.
+    """
+    return config.get('name') or f"hx711-{config['dout_pin']}-{config['pd_sck_pin']}"
+
+
+def _machine_id():
+    for path in ('/etc/machine-id', '/var/lib/dbus/machine-id'):
+        try:
+            with open(path) as fh:
+                return fh.read().strip()
+        except OSError:
+            pass
+    try:
+        with open('/proc/cpuinfo') as fh:
+            for line in fh:
+                if line.startswith('Serial'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return 'unknown'
+
+
+def hardware_fingerprint(config):
+    """
+    Short hash identifying the board and wiring a channel was calibrated on.
+    """
+    parts = [
+        _machine_id(),
+        backend.current_backend(),
+        channel_name(config),
+        str(config['dout_pin']),
+        str(config['pd_sck_pin']),
+        str(config.get('gain', 128)),
+    ]
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()[:16]
+
+
+class Calibration:
+    """
+    Fitted calibration of one channel.
+
+    :param reference_unit: Gain in counts per gram
+    :param zero_offset: Raw count at zero load
+    :param linearity_error: Largest |residual| of the calibration points, in grams
+    :param points: [(mass_g, raw_counts), ...] the fit was made from
+    """
+
+    def __init__(self, reference_unit, zero_offset, linearity_error=0.0, points=None,
+                 name=None, fingerprint=None, created=None):
+        self.reference_unit = reference_unit
+        self.zero_offset = zero_offset
+        self.linearity_error = linearity_error
+        self.points = [tuple(p) for p in (points or [])]
+        self.name = name
+        self.fingerprint = fingerprint
+        self.created = created or datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+
+    @property
+    def full_scale(self):
+        return max((abs(m) for m, _ in self.points), default=0.0)
+
+    @property
+    def linearity_percent(self):
+        """Linearity error as a percentage of the largest calibration mass."""
+        return 100.0 * self.linearity_error / self.full_scale if self.full_scale else 0.0
+
+    def age_days(self, now=None):
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        return (now - datetime.datetime.fromisoformat(self.created)).total_seconds() / 86400.0
+
+    def to_grams(self, raw):
+        return (raw - self.zero_offset) / self.reference_unit
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'fingerprint': self.fingerprint,
+            'created': self.created,
+            'reference_unit': self.reference_unit,
+            'zero_offset': self.zero_offset,
+            'linearity_error': self.linearity_error,
+            'points': [list(p) for p in self.points],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['reference_unit'], data['zero_offset'], data.get('linearity_error', 0.0),
+                   data.get('points'), data.get('name'), data.get('fingerprint'), data.get('created'))
+
+    def summary(self):
+        return (f'reference_unit {self.reference_unit:.4f} counts/g, zero_offset {self.zero_offset:.2f}, '
+                f'linearity error {self.linearity_error:.3f} g ({self.linearity_percent:.3f}% FS) '
+                f'from {len(self.points)} point(s)')
+
+    def __repr__(self):
+        return f'Calibration({self.name!r}: {self.summary()})'
+
+
+def fit_calibration(points, name=None, fingerprint=None):
+    """
+    Least-squares fit of raw = reference_unit * mass + zero_offset.
+
+    :param points: [(mass_g, raw_counts), ...]; at least two distinct masses
+    :return: Calibration
+    """
+    masses = np.array([p[0] for p in points], dtype=np.float64)
+    raws = np.array([p[1] for p in points], dtype=np.float64)
+    if len(np.unique(masses)) < 2:
+        raise ValueError('Calibration needs points at two or more different masses')
+    design = np.column_stack([masses, np.ones_like(masses)])
+    (gain, offset), *_ = np.linalg.lstsq(design, raws, rcond=None)
+    residual_g = (raws - (gain * masses + offset)) / gain
+    return Calibration(float(gain), float(offset), float(np.max(np.abs(residual_g))),
+                       list(zip(masses.tolist(), raws.tolist())), name, fingerprint)
+
+
+class CalibrationStore:
+    """
+    Calibrations persisted as one JSON document: {"channels": {name: record}}.
+    Writes are atomic (temporary file + rename).
+    """
+
+    def __init__(self, path=None):
+        self.path = os.path.expanduser(path or os.environ.get(CALIBRATION_ENV) or DEFAULT_PATH)
+
+    def _read(self):
+        try:
+            with open(self.path) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {'channels': {}}
+        except (OSError, ValueError) as e:
+            print(f"❌ Ignoring unreadable calibration store {self.path}: {e}")
+            return {'channels': {}}
+
+    def load(self, name, fingerprint=None, max_age_days=MAX_AGE_DAYS):
+        """
+        Return the stored Calibration for `name`, or None if there is none,
+        its fingerprint differs from `fingerprint`, or it is too old.
+        """
+        record = self._read().get('channels', {}).get(name)
+        if record is None:
+            return None
+        calibration = Calibration.from_dict(record)
+        if fingerprint is not None and calibration.fingerprint != fingerprint:
+            return None
+        if max_age_days is not None and calibration.age_days() > max_age_days:
+            return None
+        return calibration
+
+    def save(self, calibration):
+        data = self._read()
+        data.setdefault('channels', {})[calibration.name] = calibration.to_dict()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(data, fh, indent=2)
+            fh.write('\n')
+        os.replace(tmp, self.path)
+
+    def names(self):
+        return sorted(self._read().get('channels', {}))
+
+
+def apply_stored_calibration(config, store=None):
+    """
+    Return (config, calibration): a copy of `config` with reference_unit and
+    zero_offset taken from the store when a matching calibration exists, and
+    that Calibration (None if the config was left as given).
+    """
+    store = store or CalibrationStore()
+    calibration = store.load(channel_name(config), hardware_fingerprint(config))
+    if calibration is None:
+        return config, None
+    return dict(config, reference_unit=calibration.reference_unit, zero_offset=calibration.zero_offset), calibration
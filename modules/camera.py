@@ -1,9 +1,20 @@
 # Module for testing Raspberry Pi connected cameras.
 
-import cv2
 import os
 import logging
-from typing import List, Dict, Tuple
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional
+
+from modules import backend
+from modules.camera_pool import CapturePool
+from modules.frame_buffers import FrameBufferPool, rotate_180_inplace, rss_bytes
+from modules.frame_analysis import FrameAnalyzer, FrameMetrics, FrameThresholds
+from modules.snapshot_writer import SnapshotWriter
+from modules import v4l2_discovery
+
+cv2 = backend.cv2_module()
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -11,21 +22,97 @@ logging.basicConfig(level=logging.INFO)
 class CameraTester:
     '''
     Helper class to test camera functionality.
+
+    Devices are kept open in a CapturePool between captures; pass a shared
+    pool to reuse devices across testers, and call close() (or use the
+    tester as a context manager) to release them.
+
+    Snapshots are handed to a SnapshotWriter and encoded/written in the
+    background; `saves` maps each save path to its Future.
+
+    Every captured frame is checked by a FrameAnalyzer (brightness, contrast,
+    clipping, sharpness, stuck frames) against `thresholds`; the tests return
+    FrameMetrics, which are truthy only when the frame passed.
+
+    Frames are read into preallocated arrays from a FrameBufferPool and
+    rotated in place, so steady-state captures allocate nothing; buffers go
+    back to the pool once analysed and (if saved) written.
     '''
 
-    def __init__(self, camera_indices: List[int], width: int = 640, height: int = 480, timeout: int = 5):
+    def __init__(self, camera_indices: List[int], width: int = 640, height: int = 480, timeout: int = 5,
+                 pool: Optional[CapturePool] = None, writer: Optional[SnapshotWriter] = None,
+                 thresholds: Optional[FrameThresholds] = None, buffers: Optional[FrameBufferPool] = None):
         self.camera_indices = camera_indices
         self.width = width
         self.height = height
         self.timeout = timeout
+        self._owns_pool = pool is None
+        self.pool = pool if pool is not None else CapturePool()
+        self._owns_writer = writer is None
+        self._writer = writer
+        self.saves: Dict[str, Future] = {}
+        self.analyzer = FrameAnalyzer(thresholds)
+        self.metrics: Dict[int, FrameMetrics] = {}
+        self.buffers = buffers if buffers is not None else FrameBufferPool()
+        self._frame_shapes: Dict[int, Tuple[int, ...]] = {}
+
+    def __enter__(self) -> 'CameraTester':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        '''
+        Waits for pending snapshots, then releases the devices held by this
+        tester's own pool and writer (shared ones are left open).
+        '''
+        if self._writer is not None and self._owns_writer:
+            self._writer.close()
+            self._writer = None
+        if self._owns_pool:
+            self.pool.close()
+
+    @property
+    def writer(self) -> SnapshotWriter:
+        if self._writer is None:
+            self._writer = SnapshotWriter()
+        return self._writer
 
     @staticmethod
-    def list_available_cameras(max_index: int = 5) -> List[int]:
+    def list_available_cameras(max_index: int = 5, pool: Optional[CapturePool] = None,
+                               width: int = 320, height: int = 240, probe: bool = False,
+                               indices: Optional[List[int]] = None) -> List[int]:
         '''
-        Scans for available camera indices.
+        Returns the capture indices of the connected USB cameras.
+
+        Cameras are found with V4L2 capability queries (no stream is opened),
+        one index per physical camera so metadata/ISP/codec nodes are never
+        returned. With a pool, every camera found is then opened at
+        width x height and kept open for later captures. If discovery finds
+        nothing, or `probe` is set, indices 0..max_index are probed by
+        opening each one with cv2 instead. Known `indices` (e.g. from the
+        hardware inventory) replace the discovery.
         '''
+        if indices is not None and not probe:
+            available = [idx for idx in indices if idx <= max_index]
+            if pool is not None:
+                available = [idx for idx in available if pool.acquire(idx, width, height) is not None]
+            return available
+        if not probe:
+            available = v4l2_discovery.usb_capture_indices(max_index=max_index)
+            if available:
+                logger.info(f'V4L2 discovery found cameras at indices {available}')
+                if pool is not None:
+                    available = [idx for idx in available if pool.acquire(idx, width, height) is not None]
+                return available
+            logger.info('V4L2 discovery found no USB cameras; probing indices with cv2.')
         available = []
         for idx in range(max_index + 1):
+            if pool is not None:
+                if pool.acquire(idx, width, height) is not None:
+                    available.append(idx)
+                continue
             cap = cv2.VideoCapture(idx)
             cap.set(cv2.CAP_PROP_FRAME_WIDTH, 320)
             cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 240)
@@ -35,44 +122,183 @@ class CameraTester:
                 available.append(idx)
         return available
 
+    def _acquire_buffer(self, camera_index: int):
+        shape = self._frame_shapes.get(camera_index, (self.height, self.width, 3))
+        return self.buffers.acquire(shape)
+
+    def _adopt_frame(self, camera_index: int, buf, frame):
+        # cv2 allocates its own array when the supplied buffer does not fit
+        if frame is not buf:
+            self.buffers.release(buf)
+        self._frame_shapes[camera_index] = frame.shape
+        return rotate_180_inplace(frame)
+
+    def release_frame(self, frame) -> None:
+        '''
+        Returns a frame from capture_frame()/capture_synchronized() to the buffer pool.
+        '''
+        self.buffers.release(frame)
+
     def capture_frame(self, camera_index: int) -> Tuple[bool, any]:
         '''
-        Captures a single frame from the given camera index.
+        Captures a single frame from the given camera index into a pooled
+        buffer, rotated 180 degrees in place. Pass the frame to
+        release_frame() when done with it.
         '''
-        cap = cv2.VideoCapture(camera_index)
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
-        if not cap.isOpened():
-            logger.error(f'Camera {camera_index} could not be opened.')
-            return False, None
-        ret, frame = cap.read()
-        rotated_frame = cv2.rotate(frame, cv2.ROTATE_180)
-        del frame
-        cap.release()
-        if not ret or rotated_frame is None:
+        rss_before = rss_bytes()
+        buf = self._acquire_buffer(camera_index)
+        ret, frame = self.pool.read(camera_index, self.width, self.height, image=buf)
+        if not ret or frame is None:
+            self.buffers.release(buf)
             logger.error(f'Failed to read frame from camera {camera_index}.')
             return False, None
-        return True, rotated_frame
+        frame = self._adopt_frame(camera_index, buf, frame)
+        self.buffers.record_capture(rss_before)
+        return True, frame
 
-    def test_camera(self, camera_index: int, save_path: str = None) -> bool:
+    def _finish_frame(self, camera_index: int, frame, save_path: Optional[str]) -> None:
+        # The writer reads the frame until its future is done; only then can the buffer be reused
+        if save_path:
+            future = self._save_frame(camera_index, frame, save_path)
+            future.add_done_callback(lambda _: self.buffers.release(frame))
+        else:
+            self.buffers.release(frame)
+
+    def test_camera(self, camera_index: int, save_path: str = None) -> FrameMetrics:
         '''
-        Tests a single camera by capturing a frame and optionally saving it.
-        Returns True if successful.
+        Tests a single camera by capturing a frame, checking its quality and
+        optionally saving it. Returns the FrameMetrics (truthy if the camera passed).
         '''
         success, frame = self.capture_frame(camera_index)
         if not success:
-            return False
-        if save_path:
-            dirname = os.path.dirname(save_path)
-            if dirname and not os.path.exists(dirname):
-                os.makedirs(dirname)
-            cv2.imwrite(save_path, frame)
-            logger.info(f'Saved frame from camera {camera_index} to {save_path}')
-        return True
+            return self._record(camera_index, FrameMetrics.failed('no frame'))
+        metrics = self._record(camera_index, self.analyzer.analyze(frame, source=camera_index))
+        self._finish_frame(camera_index, frame, save_path)
+        return metrics
+
+    def _record(self, camera_index: int, metrics: FrameMetrics) -> FrameMetrics:
+        self.metrics[camera_index] = metrics
+        log = logger.info if metrics else logger.error
+        log(f'Camera {camera_index}: {metrics.summary()}')
+        return metrics
+
+    def _save_frame(self, camera_index: int, frame, save_path: str) -> Future:
+        future = self.writer.submit(frame, save_path)
+        self.saves[save_path] = future
+        logger.info(f'Queued frame from camera {camera_index} for {save_path}')
+        return future
+
+    def wait_for_saves(self, timeout: Optional[float] = None) -> Dict[str, bool]:
+        '''
+        Waits for every queued snapshot; returns {path: written successfully}.
+        '''
+        written = {}
+        for path, future in self.saves.items():
+            try:
+                future.result(timeout)
+                written[path] = True
+            except Exception:
+                written[path] = False
+        return written
+
+    def capture_synchronized(self, camera_indices: Optional[List[int]] = None) -> Dict[str, any]:
+        '''
+        Captures one frame from every camera at (as near as possible) the same instant.
+
+        Devices are acquired from the pool in parallel, then every worker
+        thread waits on a barrier and calls grab() together; retrieve() (the
+        decode) only runs once all grabs have returned, so decoding one camera
+        never delays another's exposure.
+
+        Frames are retrieved into pooled buffers and rotated in place; pass
+        each to release_frame() when done.
+
+        Returns a dict with 'frames' {index: rotated frame or None},
+        'timestamps' {index: monotonic time the grab completed},
+        'grab_s' {index: grab duration} and 'skew_s' (spread of the timestamps).
+        '''
+        indices = list(self.camera_indices if camera_indices is None else camera_indices)
+        rss_before = rss_bytes()
+        frames = {idx: None for idx in indices}
+        timestamps, grab_s = {}, {}
+        if not indices:
+            return {'frames': frames, 'timestamps': timestamps, 'grab_s': grab_s, 'skew_s': 0.0}
+
+        with ThreadPoolExecutor(max_workers=len(indices), thread_name_prefix='camera-sync') as executor:
+            devices = dict(zip(indices, executor.map(
+                lambda idx: self.pool.acquire(idx, self.width, self.height), indices)))
+            opened = [idx for idx in indices if devices[idx] is not None]
+            for idx in indices:
+                if devices[idx] is None:
+                    logger.error(f'Camera {idx} could not be opened.')
+
+            # Hold every device for the whole grab/retrieve cycle (sorted to avoid lock-order inversions)
+            for idx in sorted(opened):
+                devices[idx].lock.acquire()
+            try:
+                start = threading.Barrier(len(opened)) if opened else None
+
+                def grab(idx):
+                    start.wait()
+                    t0 = time.monotonic()
+                    ok = devices[idx].cap.grab()
+                    t1 = time.monotonic()
+                    return ok, t0, t1
+
+                grabbed = dict(zip(opened, executor.map(grab, opened)))
+
+                def retrieve(idx):
+                    ok, t0, t1 = grabbed[idx]
+                    if not ok:
+                        return None
+                    buf = self._acquire_buffer(idx)
+                    ret, frame = devices[idx].cap.retrieve(buf)
+                    devices[idx].record_frame(time.monotonic() - t0)
+                    if not ret or frame is None:
+                        self.buffers.release(buf)
+                        return None
+                    return self._adopt_frame(idx, buf, frame)
+
+                retrieved = dict(zip(opened, executor.map(retrieve, opened)))
+            finally:
+                for idx in opened:
+                    devices[idx].lock.release()
+
+        for idx in opened:
+            ok, t0, t1 = grabbed[idx]
+            frame = retrieved[idx]
+            if frame is None:
+                logger.error(f'Failed to read frame from camera {idx}.')
+                continue
+            frames[idx] = frame
+            timestamps[idx] = t1
+            grab_s[idx] = t1 - t0
+        if timestamps:
+            self.buffers.record_capture(rss_before)
+        skew = max(timestamps.values()) - min(timestamps.values()) if timestamps else 0.0
+        return {'frames': frames, 'timestamps': timestamps, 'grab_s': grab_s, 'skew_s': skew}
+
+    def run_synchronized_tests(self, save_dir: str = None) -> Dict[str, any]:
+        '''
+        Tests all cameras with one synchronized capture and returns a dict with
+        'results' {index: FrameMetrics}, 'timestamps' {index: monotonic seconds}
+        and 'skew_s' (time between the first and last camera's capture).
+        '''
+        capture = self.capture_synchronized()
+        results = {}
+        for idx, frame in capture['frames'].items():
+            if frame is None:
+                results[idx] = self._record(idx, FrameMetrics.failed('no frame'))
+                continue
+            results[idx] = self._record(idx, self.analyzer.analyze(frame, source=idx))
+            self._finish_frame(idx, frame, os.path.join(save_dir, f'camera_{idx}.jpg') if save_dir else None)
+        logger.info(f'Synchronized capture of {len(capture["timestamps"])} camera(s), '
+                    f'skew {capture["skew_s"] * 1000:.2f} ms')
+        return {'results': results, 'timestamps': capture['timestamps'], 'skew_s': capture['skew_s']}
 
-    def run_tests(self, save_dir: str = None) -> Dict[int, bool]:
+    def run_tests(self, save_dir: str = None) -> Dict[int, FrameMetrics]:
         '''
-        Runs tests on all cameras and returns a dict of results.
+        Runs tests on all cameras and returns a dict of FrameMetrics.
         '''
         results = {}
         for idx in self.camera_indices:
@@ -88,8 +314,8 @@ def assert_camera_functional(camera_index: int, width: int = 640, height: int =
     '''
     Assertion helper for test frameworks.
     '''
-    tester = CameraTester([camera_index], width, height)
-    ok = tester.test_camera(camera_index)
+    with CameraTester([camera_index], width, height) as tester:
+        ok = tester.test_camera(camera_index)
     assert ok, f'Camera {camera_index} failed test'
 
 if __name__ == '__main__':
@@ -99,12 +325,24 @@ if __name__ == '__main__':
     parser.add_argument('--width', type=int, default=640, help='Capture width')
     parser.add_argument('--height', type=int, default=480, help='Capture height')
     parser.add_argument('--save-dir', type=str, default=None, help='Directory to save captured images')
+    parser.add_argument('--repeat', type=int, default=1, help='Run the tests this many times on the pooled devices')
+    parser.add_argument('--sequential', action='store_true', help='Capture cameras one at a time instead of synchronized')
+    parser.add_argument('--no-buffer-pool', action='store_true', help='Allocate every frame (for comparing memory use)')
     args = parser.parse_args()
-    tester = CameraTester(args.cameras, args.width, args.height)
-    results = tester.run_tests(args.save_dir)
-    for idx, ok in results.items():
-        status = 'PASS' if ok else 'FAIL'
-        print(f'Camera {idx}: {status}')
-        if not ok:
+    buffers = FrameBufferPool(max_free=0) if args.no_buffer_pool else None
+    with CameraTester(args.cameras, args.width, args.height, buffers=buffers) as tester:
+        for _ in range(args.repeat):
+            if args.sequential:
+                results = tester.run_tests(args.save_dir)
+            else:
+                sync = tester.run_synchronized_tests(args.save_dir)
+                results = sync['results']
+                print(f'Capture skew: {sync["skew_s"] * 1000:.2f} ms')
+        print(tester.pool.report())
+        print(tester.buffers.report())
+    for idx, metrics in results.items():
+        status = 'PASS' if metrics else 'FAIL'
+        print(f'Camera {idx}: {status} {metrics.summary()}')
+        if not metrics:
             exit(1)
     exit(0)
@@ -0,0 +1,246 @@
+# Pool of persistent, pre-configured cv2.VideoCapture devices.
+
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from modules import backend
+
+cv2 = backend.cv2_module()
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['CapturePool', 'PooledCapture']
+
+
+class PooledCapture:
+    '''
+    One open capture device plus its timing statistics.
+    All access to `cap` must hold `lock`.
+    '''
+
+    def __init__(self, index: int, width: int, height: int):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.cap = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.open_s = 0.0
+        self.negotiate_s = 0.0
+        self.warmup_s = 0.0
+        self.frames = 0
+        self.frame_total_s = 0.0
+        self.frame_last_s = 0.0
+        self.reopens = 0
+
+    def record_frame(self, elapsed: float) -> None:
+        self.frames += 1
+        self.frame_total_s += elapsed
+        self.frame_last_s = elapsed
+        self.last_used = time.monotonic()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'width': self.width,
+            'height': self.height,
+            'open_s': round(self.open_s, 4),
+            'negotiate_s': round(self.negotiate_s, 4),
+            'warmup_s': round(self.warmup_s, 4),
+            'frames': self.frames,
+            'frame_mean_s': round(self.frame_total_s / self.frames, 4) if self.frames else None,
+            'frame_last_s': round(self.frame_last_s, 4),
+            'reopens': self.reopens,
+        }
+
+
+class CapturePool:
+    '''
+    Keeps each cv2.VideoCapture open and configured for its resolution so
+    repeated captures skip the V4L2 open and format negotiation.
+
+    Devices are opened on first use, warmed up by discarding `warmup_frames`,
+    renegotiated only when a different resolution is requested, reopened if
+    they fail a health check, and released after `idle_timeout` seconds
+    without use (checked on every access) or explicitly with release()/close().
+    '''
+
+    def __init__(self, warmup_frames: int = 2, idle_timeout: Optional[float] = 300.0,
+                 api_preference: Optional[int] = None):
+        self.warmup_frames = warmup_frames
+        self.idle_timeout = idle_timeout
+        self.api_preference = api_preference
+        self._devices: Dict[int, PooledCapture] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'CapturePool':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _open(self, dev: PooledCapture) -> bool:
+        t0 = time.monotonic()
+        if self.api_preference is None:
+            cap = cv2.VideoCapture(dev.index)
+        else:
+            cap = cv2.VideoCapture(dev.index, self.api_preference)
+        t1 = time.monotonic()
+        if not cap.isOpened():
+            cap.release()
+            logger.error(f'Camera {dev.index} could not be opened.')
+            return False
+        self._negotiate(cap, dev.width, dev.height)
+        # Keep only the newest frame queued so a pooled device never hands out stale images
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        t2 = time.monotonic()
+        for _ in range(self.warmup_frames):
+            cap.grab()
+        t3 = time.monotonic()
+        dev.cap = cap
+        dev.open_s = t1 - t0
+        dev.negotiate_s = t2 - t1
+        dev.warmup_s = t3 - t2
+        dev.last_used = t3
+        logger.info(f'Camera {dev.index} opened at {dev.width}x{dev.height}: '
+                    f'open {dev.open_s * 1000:.1f} ms, negotiate {dev.negotiate_s * 1000:.1f} ms, '
+                    f'warm-up {dev.warmup_s * 1000:.1f} ms')
+        return True
+
+    @staticmethod
+    def _negotiate(cap, width: int, height: int) -> None:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+    def acquire(self, index: int, width: int, height: int) -> Optional[PooledCapture]:
+        '''
+        Return the pooled device for `index`, opened and configured for
+        width x height, or None if it cannot be opened. Hold `dev.lock`
+        while using `dev.cap`.
+        '''
+        self.evict_idle()
+        with self._lock:
+            dev = self._devices.get(index)
+            if dev is None:
+                dev = self._devices[index] = PooledCapture(index, width, height)
+        with dev.lock:
+            if dev.cap is None:
+                dev.width, dev.height = width, height
+                if not self._open(dev):
+                    with self._lock:
+                        self._devices.pop(index, None)
+                    return None
+            elif (dev.width, dev.height) != (width, height):
+                t0 = time.monotonic()
+                self._negotiate(dev.cap, width, height)
+                for _ in range(self.warmup_frames):
+                    dev.cap.grab()
+                dev.negotiate_s = time.monotonic() - t0
+                dev.width, dev.height = width, height
+            dev.last_used = time.monotonic()
+        return dev
+
+    def read(self, index: int, width: int, height: int, image=None) -> Tuple[bool, any]:
+        '''
+        Read one frame from the pooled device, reopening it once if the read fails.
+        '''
+        for attempt in range(2):
+            dev = self.acquire(index, width, height)
+            if dev is None:
+                return False, None
+            with dev.lock:
+                t0 = time.monotonic()
+                ret, frame = dev.cap.read(image) if image is not None else dev.cap.read()
+                if ret and frame is not None:
+                    dev.record_frame(time.monotonic() - t0)
+                    return True, frame
+                logger.warning(f'Camera {index} read failed; reopening (attempt {attempt + 1}).')
+                self._reset(dev)
+        return False, None
+
+    @staticmethod
+    def _reset(dev: PooledCapture) -> None:
+        # Caller holds dev.lock; the next acquire() reopens the device
+        if dev.cap is not None:
+            dev.cap.release()
+            dev.cap = None
+        dev.reopens += 1
+
+    def health_check(self, index: int) -> bool:
+        '''
+        Returns True if the device is open and still delivers frames.
+        An unhealthy device is closed so the next acquire() reopens it.
+        '''
+        with self._lock:
+            dev = self._devices.get(index)
+        if dev is None:
+            return False
+        with dev.lock:
+            healthy = dev.cap is not None and dev.cap.isOpened() and dev.cap.grab()
+            if not healthy:
+                logger.warning(f'Camera {index} failed its health check; it will be reopened.')
+                self._reset(dev)
+        return bool(healthy)
+
+    def healthy(self) -> bool:
+        '''
+        Health-checks every pooled device (failing ones are closed, to be
+        reopened on next use). True if all passed.
+        '''
+        return all([self.health_check(index) for index in self.indices()])
+
+    def evict_idle(self, now: Optional[float] = None) -> None:
+        '''
+        Release devices unused for longer than idle_timeout.
+        '''
+        if self.idle_timeout is None:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [i for i, d in self._devices.items() if now - d.last_used > self.idle_timeout]
+        for index in idle:
+            logger.info(f'Camera {index} idle for over {self.idle_timeout}s; releasing.')
+            self.release(index)
+
+    def release(self, index: int) -> None:
+        '''
+        Release one device.
+        '''
+        with self._lock:
+            dev = self._devices.pop(index, None)
+        if dev is not None:
+            with dev.lock:
+                if dev.cap is not None:
+                    dev.cap.release()
+                    dev.cap = None
+
+    def close(self) -> None:
+        '''
+        Release every device in the pool.
+        '''
+        with self._lock:
+            indices = list(self._devices)
+        for index in indices:
+            self.release(index)
+
+    def indices(self):
+        with self._lock:
+            return sorted(self._devices)
+
+    def stats(self) -> Dict[int, Dict[str, float]]:
+        '''
+        Per-device open/negotiate/warm-up cost versus steady-state frame latency.
+        '''
+        with self._lock:
+            return {i: d.stats() for i, d in sorted(self._devices.items())}
+
+    def report(self) -> str:
+        lines = []
+        for index, s in self.stats().items():
+            setup_ms = (s['open_s'] + s['negotiate_s'] + s['warmup_s']) * 1000
+            frame_ms = (s['frame_mean_s'] or 0.0) * 1000
+            lines.append(f'Camera {index} ({s["width"]}x{s["height"]}): '
+                         f'open+negotiate {setup_ms:.1f} ms, '
+                         f'steady-state {frame_ms:.1f} ms/frame over {s["frames"]} frame(s)')
+        return '\n'.join(lines)
@@ -2,86 +2,292 @@
 """
 endstop_test.py
 
-Test a mechanical endstop switch on a Raspberry Pi GPIO pin.
+Test mechanical endstop switches on Raspberry Pi GPIO pins.
+
+Switches are watched with edge interrupts (GPIO.add_event_detect) rather
+than by polling: any number of pins are watched at once, every debounced
+press/release is timestamped, and a test finishes as soon as every pin has
+completed a press-release cycle. Pins are claimed through the shared GPIO
+manager with a bouncetime, so each press or release arrives as one edge
+carrying the settled level; edges the manager discards are reported as bounces.
+Cleanup only releases this module's pins.
 
 Usage (CLI):
-    python endstop_test.py --pin 17 [--timeout 10]
+    python endstop_test.py --pin 17 [--pin 27 ...] [--timeout 10] [--debounce 20]
 
 Importable API:
-    from endstop_test import setup_gpio, test_endstop, cleanup_gpio
+    from endstop_test import setup_gpio, test_endstop, watch_endstops, cleanup_gpio
     setup_gpio(pin)
     ok = test_endstop(pin, timeout=5)
     cleanup_gpio()
+
+    report = watch_endstops([23, 24], timeout=30)    # both switches, any order
 """
 
-import RPi.GPIO as GPIO
 import argparse
 import sys
+import threading
 import time
 
+from modules import backend
+from modules.gpio_manager import get_manager
+
+GPIO = backend.gpio()
+
+PRESS = "press"
+RELEASE = "release"
+
+# Default debounce window (bouncetime) in milliseconds
+DEBOUNCE_MS = 20
+
+# Pins claimed by setup_gpio(), released by cleanup_gpio()
+_claims = []
+
+
+def _claim(pin: int, debounce_ms: float = DEBOUNCE_MS):
+    return get_manager().claim(pin, GPIO.IN, pull=GPIO.PUD_UP, owner="endstop",
+                               bouncetime=int(round(debounce_ms)) or None)
+
+
 def setup_gpio(pin: int) -> None:
     """
-    Initialize RPi.GPIO to use BCM numbering and set `pin` as input
-    with an internal pull-up (so switch should pull it down to GND).
+    Claim `pin` (BCM numbering) as an input with an internal pull-up
+    (so switch should pull it down to GND), debounced by DEBOUNCE_MS.
     """
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    _claims.append(_claim(pin))
 
 def cleanup_gpio() -> None:
-    """Restore GPIO to a safe state."""
-    GPIO.cleanup()
+    """Release the pins claimed by setup_gpio(); other components' pins are untouched."""
+    while _claims:
+        _claims.pop().release()
+
+
+class EndstopEvent:
+    """
+    One debounced press or release.
+
+    `t` is the monotonic time the edge was reported; `latency_s` is how long
+    after that the waiting test thread picked the event up.
+    """
+
+    def __init__(self, pin: int, kind: str, t: float):
+        self.pin = pin
+        self.kind = kind
+        self.t = t
+        self.latency_s = None
+
+    def to_dict(self) -> dict:
+        return {"pin": self.pin, "kind": self.kind, "t": self.t, "latency_s": self.latency_s}
+
+    def __repr__(self) -> str:
+        return f"EndstopEvent(pin={self.pin}, {self.kind}, t={self.t:.4f})"
+
+
+class EndstopWatcher:
+    """
+    Watches several endstop pins through GPIO manager edge subscriptions.
+
+    Each pin is pulled up (a pressed switch reads LOW) and claimed with a
+    `debounce_ms` bouncetime, so the manager only delivers settled edges:
+    one whose level differs from the pin's last state is a press or release.
+    `bounces` counts the edges the manager discarded while debouncing.
 
-def _wait_for(pin: int, target_state: int, timeout: float) -> bool:
+    Usage:
+        with EndstopWatcher([23, 24]) as watcher:
+            ok = watcher.wait_for_cycles(timeout=30)
+            print(watcher.report())
     """
-    Wait up to `timeout` seconds for GPIO.input(pin) == target_state.
-    Returns True if seen, False on timeout.
+
+    def __init__(self, pins, debounce_ms: float = DEBOUNCE_MS):
+        self.pins = list(pins)
+        self.debounce_ms = debounce_ms
+        self.events = []
+        self.bounces = {pin: 0 for pin in self.pins}
+        self._bounce_base = {}
+        self._state = {}
+        self._cycle_done = {pin: False for pin in self.pins}
+        self._pressed = {pin: False for pin in self.pins}
+        self._consumed = 0
+        self._cond = threading.Condition()
+        self._gpio = get_manager()
+        self._claims = []
+        self.started_at = None
+        self._started = False
+
+    def __enter__(self) -> "EndstopWatcher":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def start(self) -> "EndstopWatcher":
+        self.started_at = time.monotonic()
+        subscribed = []
+        with self._cond:
+            try:
+                for pin in self.pins:
+                    self._claims.append(_claim(pin, self.debounce_ms))
+                    self._state[pin] = self._gpio.read(pin)
+                    self._bounce_base[pin] = self._gpio.bounces(pin)
+                    self._gpio.subscribe(pin, self._on_edge)
+                    subscribed.append(pin)
+            except Exception:
+                # __exit__ never runs when start() fails: undo what was set up
+                for pin in subscribed:
+                    self._gpio.unsubscribe(pin, self._on_edge)
+                while self._claims:
+                    self._claims.pop().release()
+                raise
+            self._started = True
+        return self
+
+    def stop(self) -> None:
+        with self._cond:
+            if not self._started:
+                return
+            for pin in self.pins:
+                self.bounces[pin] = self._bounce_count(pin)
+            self._started = False
+        for pin in self.pins:
+            self._gpio.unsubscribe(pin, self._on_edge)
+        while self._claims:
+            self._claims.pop().release()
+
+    def _on_edge(self, edge) -> None:
+        pin = edge.pin
+        with self._cond:
+            if not self._started:
+                return
+            if edge.level != self._state[pin]:
+                self._transition(pin, edge.level, edge.t)
+
+    def _bounce_count(self, pin: int) -> int:
+        # Caller holds self._cond
+        if not self._started:
+            return self.bounces[pin]
+        return self._gpio.bounces(pin) - self._bounce_base[pin]
+
+    def _transition(self, pin: int, level: int, now: float) -> None:
+        # Caller holds self._cond
+        self._state[pin] = level
+        kind = PRESS if level == GPIO.LOW else RELEASE
+        self.events.append(EndstopEvent(pin, kind, now))
+        if kind == PRESS:
+            self._pressed[pin] = True
+        elif self._pressed[pin]:
+            self._cycle_done[pin] = True
+        self._cond.notify_all()
+
+    def _consume(self) -> None:
+        # Caller holds self._cond; stamps how long new events waited for the test thread
+        now = time.monotonic()
+        for event in self.events[self._consumed:]:
+            event.latency_s = now - event.t
+            print(f"[Endstop Test] Pin {event.pin}: {event.kind.upper()} at +{event.t - self.started_at:.3f}s")
+        self._consumed = len(self.events)
+
+    def wait_for_cycles(self, timeout: float = 30.0, pins=None) -> bool:
+        """
+        Block until every pin (or every pin in `pins`) has been pressed and
+        released, or `timeout` seconds pass. Returns True if all completed.
+        """
+        pins = self.pins if pins is None else list(pins)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._consume()
+                if all(self._cycle_done[pin] for pin in pins):
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+    def completed(self, pin: int) -> bool:
+        return self._cycle_done[pin]
+
+    def report(self) -> dict:
+        """
+        Per-pin cycle status, event times and bounce counts, plus latency stats.
+        """
+        with self._cond:
+            latencies = [e.latency_s for e in self.events if e.latency_s is not None]
+            per_pin = {}
+            for pin in self.pins:
+                events = [e for e in self.events if e.pin == pin]
+                per_pin[pin] = {
+                    "completed": self._cycle_done[pin],
+                    "presses": sum(e.kind == PRESS for e in events),
+                    "releases": sum(e.kind == RELEASE for e in events),
+                    "bounces": self._bounce_count(pin),
+                    "events": [(e.kind, round(e.t - self.started_at, 4)) for e in events],
+                }
+            return {
+                "pins": per_pin,
+                "latency_mean_ms": round(1000 * sum(latencies) / len(latencies), 3) if latencies else None,
+                "latency_max_ms": round(1000 * max(latencies), 3) if latencies else None,
+            }
+
+
+def watch_endstops(pins, timeout: float = 30.0, debounce_ms: float = DEBOUNCE_MS) -> dict:
     """
-    deadline = time.time() + timeout
-    while time.time() < deadline:
-        if GPIO.input(pin) == target_state:
-            return True
-        time.sleep(0.01)
-    return False
+    Watch `pins` concurrently until each has completed a press-release cycle
+    (in any order) or `timeout` seconds pass overall.
+
+    Returns the watcher's report with an extra "passed" key.
+    """
+    with EndstopWatcher(pins, debounce_ms) as watcher:
+        print(f"[Endstop Test] Pins {pins}: waiting up to {timeout}s for PRESS and RELEASE on each...")
+        passed = watcher.wait_for_cycles(timeout)
+        report = watcher.report()
+    report["passed"] = passed
+    for pin, stats in report["pins"].items():
+        status = "PASS" if stats["completed"] else "no press-release cycle"
+        print(f"[Endstop Test] Pin {pin}: {status} ({stats['presses']} press, {stats['releases']} release, "
+              f"{stats['bounces']} bounce(s))")
+    if report["latency_mean_ms"] is not None:
+        print(f"[Endstop Test] Event latency: mean {report['latency_mean_ms']} ms, max {report['latency_max_ms']} ms")
+    return report
+
 
 def test_endstop(pin: int, timeout: float = 30.0) -> bool:
     """
     Perform a full “press-and-release” test on the endstop.
-    - Wait `timeout` s for a press (LOW)
-    - Then wait `timeout` s for a release (HIGH)
+    - Wait up to `timeout` s for a press (LOW) followed by a release (HIGH)
     Returns True if both events succeed in time.
     """
-    print(f"[Endstop Test] Pin {pin}: waiting up to {timeout}s for PRESS (LOW)...")
-    if not _wait_for(pin, GPIO.LOW, timeout):
-        print(f"[Endstop Test] Timeout waiting for press.")
-        return False
-
-    print(f"[Endstop Test] PRESS detected! Now waiting up to {timeout}s for RELEASE (HIGH)...")
-    if not _wait_for(pin, GPIO.HIGH, timeout):
-        print(f"[Endstop Test] Timeout waiting for release.")
-        return False
-
-    print(f"[Endstop Test] RELEASE detected! → PASS")
-    return True
+    passed = watch_endstops([pin], timeout)["passed"]
+    if passed:
+        print(f"[Endstop Test] RELEASE detected! → PASS")
+    else:
+        print(f"[Endstop Test] Timeout waiting for press and release.")
+    return passed
 
 def main():
     parser = argparse.ArgumentParser(description="Mechanical endstop switch test")
     parser.add_argument(
         "--pin", "-p",
         type=int,
+        action="append",
         required=True,
-        help="BCM GPIO pin number where the switch is connected"
+        help="BCM GPIO pin number where a switch is connected (repeat for several switches)"
     )
     parser.add_argument(
         "--timeout", "-t",
         type=float,
         default=30.0,
-        help="Seconds to wait for each press/release event"
+        help="Seconds to wait for every switch to be pressed and released"
+    )
+    parser.add_argument(
+        "--debounce", "-d",
+        type=float,
+        default=DEBOUNCE_MS,
+        help="Debounce window (bouncetime) in milliseconds"
     )
     args = parser.parse_args()
 
-    setup_gpio(args.pin)
     try:
-        ok = test_endstop(args.pin, args.timeout)
+        ok = watch_endstops(args.pin, args.timeout, args.debounce)["passed"]
         sys.exit(0 if ok else 1)
     finally:
         cleanup_gpio()
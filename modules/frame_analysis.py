@@ -0,0 +1,180 @@
+# Vectorized quality checks for captured camera frames.
+
+import hashlib
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+__all__ = ['FrameThresholds', 'FrameMetrics', 'FrameAnalyzer']
+
+# ITU-R BT.601 luma weights, indexed by channel order
+_LUMA = {
+    'BGR': np.array([0.114, 0.587, 0.299], dtype=np.float32),
+    'RGB': np.array([0.299, 0.587, 0.114], dtype=np.float32),
+}
+
+
+class FrameThresholds:
+    '''
+    Pass/fail limits for FrameAnalyzer. Brightness values are on the 0-255
+    scale; clipping limits are fractions of the (downsampled) pixels.
+
+    :param min_mean: darker frames fail (black frame, covered lens)
+    :param max_mean: brighter frames fail (washed out)
+    :param min_std: flatter frames fail (uniform image, lens cap, test pattern)
+    :param max_clipped: max fraction of pixels at 0 or 255 in any one channel
+    :param min_sharpness: minimum Laplacian variance (out of focus / smeared)
+    :param allow_stuck: if False, a frame identical to the previous one fails
+    '''
+
+    def __init__(self, min_mean: float = 16.0, max_mean: float = 240.0, min_std: float = 6.0,
+                 max_clipped: float = 0.25, min_sharpness: float = 10.0, allow_stuck: bool = False):
+        self.min_mean = min_mean
+        self.max_mean = max_mean
+        self.min_std = min_std
+        self.max_clipped = max_clipped
+        self.min_sharpness = min_sharpness
+        self.allow_stuck = allow_stuck
+
+
+class FrameMetrics:
+    '''
+    Result of analysing one frame. Truthy when the frame passed every check,
+    so it can stand in for the bool the camera tests used to return.
+    '''
+
+    def __init__(self, mean: float = 0.0, std: float = 0.0, clipped_low: List[float] = None,
+                 clipped_high: List[float] = None, sharpness: float = 0.0, digest: str = None,
+                 stuck: bool = False, shape=None, elapsed_s: float = 0.0, failures: List[str] = None):
+        self.mean = mean
+        self.std = std
+        self.clipped_low = clipped_low or []
+        self.clipped_high = clipped_high or []
+        self.sharpness = sharpness
+        self.digest = digest
+        self.stuck = stuck
+        self.shape = shape
+        self.elapsed_s = elapsed_s
+        self.failures = failures or []
+
+    @classmethod
+    def failed(cls, reason: str) -> 'FrameMetrics':
+        '''
+        Metrics for a capture that produced no frame at all.
+        '''
+        return cls(failures=[reason])
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def to_dict(self) -> dict:
+        return {
+            'ok': self.ok,
+            'failures': list(self.failures),
+            'mean': round(self.mean, 2),
+            'std': round(self.std, 2),
+            'clipped_low': [round(c, 4) for c in self.clipped_low],
+            'clipped_high': [round(c, 4) for c in self.clipped_high],
+            'sharpness': round(self.sharpness, 2),
+            'stuck': self.stuck,
+            'digest': self.digest,
+            'shape': list(self.shape) if self.shape is not None else None,
+            'elapsed_ms': round(self.elapsed_s * 1000, 3),
+        }
+
+    def summary(self) -> str:
+        if self.shape is None:
+            return f'FAIL ({"; ".join(self.failures)})'
+        status = 'OK' if self.ok else f'FAIL ({"; ".join(self.failures)})'
+        return (f'{status}: mean {self.mean:.1f}, std {self.std:.1f}, '
+                f'sharpness {self.sharpness:.1f}, max clip {max(self.clipped_low + self.clipped_high, default=0):.1%}, '
+                f'analysed in {self.elapsed_s * 1000:.2f} ms')
+
+    def __repr__(self) -> str:
+        return f'FrameMetrics({self.summary()})'
+
+
+class FrameAnalyzer:
+    '''
+    Measures brightness, contrast, per-channel clipping, Laplacian-variance
+    sharpness and stuck frames on a strided, downsampled view of each frame,
+    so a 1920x1080 frame costs a few milliseconds.
+
+    Stuck detection hashes the downsampled pixels and compares against the
+    previous frame from the same `source` (e.g. a camera index).
+    '''
+
+    def __init__(self, thresholds: Optional[FrameThresholds] = None, target_width: int = 320):
+        self.thresholds = thresholds or FrameThresholds()
+        self.target_width = target_width
+        self._last_digest: Dict[object, str] = {}
+        self._lock = threading.Lock()
+
+    def analyze(self, frame: np.ndarray, source=None, colorspace: str = 'BGR') -> FrameMetrics:
+        '''
+        Analyse one frame (HxW grayscale or HxWxC uint8) and apply the thresholds.
+        '''
+        if frame is None or frame.size == 0:
+            return FrameMetrics.failed('no frame')
+        t0 = time.monotonic()
+        th = self.thresholds
+        step = max(1, frame.shape[1] // self.target_width)
+        # One compact copy of the strided view; everything below works on it
+        small = np.ascontiguousarray(frame[::step, ::step])
+
+        if small.ndim == 2:
+            channels = small[..., None]
+            gray = small.astype(np.float32)
+        else:
+            channels = small[..., :3]
+            weights = _LUMA.get(colorspace[:3], _LUMA['BGR'])
+            gray = channels.astype(np.float32) @ weights
+
+        n = gray.size
+        clipped_low = (np.count_nonzero(channels <= 2, axis=(0, 1)) / n).tolist()
+        clipped_high = (np.count_nonzero(channels >= 253, axis=(0, 1)) / n).tolist()
+        mean = float(gray.mean())
+        std = float(gray.std())
+        lap = (gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1]
+               - 4.0 * gray[1:-1, 1:-1])
+        sharpness = float(lap.var()) if lap.size else 0.0
+
+        digest = hashlib.blake2b(small.data, digest_size=16).hexdigest()
+        with self._lock:
+            stuck = source is not None and self._last_digest.get(source) == digest
+            if source is not None:
+                self._last_digest[source] = digest
+
+        failures = []
+        if mean < th.min_mean:
+            failures.append(f'too dark (mean {mean:.1f} < {th.min_mean})')
+        if mean > th.max_mean:
+            failures.append(f'too bright (mean {mean:.1f} > {th.max_mean})')
+        if std < th.min_std:
+            failures.append(f'no contrast (std {std:.1f} < {th.min_std})')
+        worst_clip = max(clipped_low + clipped_high)
+        if worst_clip > th.max_clipped:
+            failures.append(f'clipped ({worst_clip:.1%} > {th.max_clipped:.0%} of a channel)')
+        if sharpness < th.min_sharpness:
+            failures.append(f'blurred (sharpness {sharpness:.1f} < {th.min_sharpness})')
+        if stuck and not th.allow_stuck:
+            failures.append('stuck (identical to previous frame)')
+
+        return FrameMetrics(mean, std, clipped_low, clipped_high, sharpness, digest, stuck,
+                            frame.shape, time.monotonic() - t0, failures)
+
+    def reset(self, source=None) -> None:
+        '''
+        Forget the previous-frame hash for `source` (or for every source).
+        '''
+        with self._lock:
+            if source is None:
+                self._last_digest.clear()
+            else:
+                self._last_digest.pop(source, None)
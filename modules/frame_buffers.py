@@ -0,0 +1,152 @@
+# Reusable frame buffers so captures stop allocating a new full-size array each time.
+
+import logging
+import resource
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modules import backend
+
+cv2 = backend.cv2_module()
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['FrameBufferPool', 'rotate_180_inplace', 'rss_bytes', 'peak_rss_bytes']
+
+_PAGE_SIZE = resource.getpagesize()
+
+
+def rss_bytes() -> int:
+    '''
+    Current resident set size of this process (0 where /proc is unavailable).
+    '''
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def peak_rss_bytes() -> int:
+    '''
+    Peak resident set size of this process so far (ru_maxrss is in KiB on Linux).
+    '''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def rotate_180_inplace(frame: np.ndarray) -> np.ndarray:
+    '''
+    Rotates `frame` by 180 degrees in its own memory and returns it.
+    cv2.flip(-1) swaps symmetric rows/pixels in place; without it, rows are
+    swapped pairwise with one row of scratch space.
+    '''
+    if hasattr(cv2, 'flip'):
+        return cv2.flip(frame, -1, dst=frame)
+    h = frame.shape[0]
+    for top in range(h // 2):
+        bottom = h - 1 - top
+        row = frame[top, ::-1].copy()
+        frame[top] = frame[bottom, ::-1]
+        frame[bottom] = row
+    if h % 2:
+        frame[h // 2] = frame[h // 2, ::-1].copy()
+    return frame
+
+
+class FrameBufferPool:
+    '''
+    Free lists of preallocated frame arrays, keyed by shape and dtype.
+
+    acquire() hands out a free buffer of the requested shape (allocating one
+    only when none is free) and release() returns it once the caller, and
+    anything it passed the frame to, is done with it. At most `max_free`
+    buffers per shape are kept; with max_free=0 every acquire allocates,
+    which reproduces unpooled behaviour for comparison.
+
+    Usage:
+        buf = pool.acquire((1080, 1920, 3))
+        ret, frame = cap.read(buf)
+        ...
+        pool.release(frame)
+    '''
+
+    def __init__(self, max_free: int = 4):
+        self.max_free = max_free
+        self._free: Dict[Tuple, List[np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+        self.released = 0
+        self.allocated_bytes = 0
+        self.captures = 0
+        self.max_capture_rss_growth = 0
+        self.rss_at_start = rss_bytes()
+
+    @staticmethod
+    def _key(shape, dtype) -> Tuple:
+        return tuple(shape), np.dtype(dtype).str
+
+    def acquire(self, shape, dtype=np.uint8) -> np.ndarray:
+        '''
+        Returns a buffer of `shape`; its contents are whatever the last user left.
+        '''
+        key = self._key(shape, dtype)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                self.reused += 1
+                return free.pop()
+            self.allocated += 1
+            buf = np.empty(shape, dtype=dtype)
+            self.allocated_bytes += buf.nbytes
+        return buf
+
+    def release(self, buf: Optional[np.ndarray]) -> None:
+        '''
+        Returns `buf` to the pool. Arrays the pool never handed out (e.g. one
+        cv2 allocated because the supplied buffer did not fit) are adopted.
+        '''
+        if buf is None or not buf.flags['C_CONTIGUOUS'] or not buf.flags['OWNDATA']:
+            return
+        key = self._key(buf.shape, buf.dtype)
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            if len(free) >= self.max_free or any(b is buf for b in free):
+                return
+            free.append(buf)
+            self.released += 1
+
+    def record_capture(self, rss_before: int) -> None:
+        '''
+        Notes one capture and how much the RSS grew across it.
+        '''
+        growth = rss_bytes() - rss_before
+        with self._lock:
+            self.captures += 1
+            self.max_capture_rss_growth = max(self.max_capture_rss_growth, growth)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._free.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'captures': self.captures,
+                'allocated': self.allocated,
+                'reused': self.reused,
+                'free': sum(len(f) for f in self._free.values()),
+                'allocated_mb': round(self.allocated_bytes / 2**20, 1),
+                'rss_mb': round(rss_bytes() / 2**20, 1),
+                'peak_rss_mb': round(peak_rss_bytes() / 2**20, 1),
+                'max_capture_rss_growth_mb': round(self.max_capture_rss_growth / 2**20, 1),
+            }
+
+    def report(self) -> str:
+        s = self.stats()
+        return (f'Frame buffers: {s["captures"]} capture(s), {s["allocated"]} allocated '
+                f'({s["allocated_mb"]} MB), {s["reused"]} reused, {s["free"]} free; '
+                f'RSS {s["rss_mb"]} MB (peak {s["peak_rss_mb"]} MB, '
+                f'max growth per capture {s["max_capture_rss_growth_mb"]} MB)')
@@ -0,0 +1,389 @@
+"""
+gpio_manager.py — Shared owner of the RPi.GPIO pins.
+
+One GPIOManager per process (get_manager()) configures pins, counts who
+is using them and cleans a pin up only when its last user releases it, so
+one component finishing never tears down pins another is still using.
+
+Claimed inputs have edge detection enabled (unless claimed with
+edges=False, for data lines like an HX711's DOUT). Edges are timestamped
+(time.monotonic()) in the RPi.GPIO callback, appended to a bounded edge
+log with a monotonic sequence number, and handed to subscribers on a
+single "gpio-events" thread, which also runs call_later() timers. Callers
+wait for edges or arbitrary conditions with a deadline instead of polling.
+
+An input claimed with a bouncetime (switches, anything mechanical) is
+debounced before its edges are logged: the first edge of a burst starts a
+settle timer, later edges within the bouncetime are folded into it
+(and counted by bounces()), and when the timer fires the settled level is
+logged with the first edge's time, or nothing if the pin bounced back to
+where it was.
+
+Usage:
+    from modules.gpio_manager import get_manager
+    gpio = get_manager()
+    with gpio.claim(23, GPIO.IN, pull=GPIO.PUD_UP, owner="endstop", bouncetime=20) as pin:
+        edge = gpio.wait_for_edge(23, level=GPIO.LOW, timeout=5.0)
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from modules import backend
+
+GPIO = backend.gpio()
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["Edge", "PinClaim", "GPIOManager", "get_manager", "EDGE_LOG_SIZE"]
+
+# Edges kept in the log (oldest are dropped first)
+EDGE_LOG_SIZE = 4096
+
+
+class Edge:
+    """
+    One level change on an input pin.
+
+    `seq` increases by one per edge across all pins; `t` is time.monotonic()
+    when the edge was reported and `level` the pin level read at that moment.
+    On a debounced pin `t` is the first edge of the burst and `level` the
+    level the pin settled at.
+    """
+    __slots__ = ("seq", "pin", "level", "t")
+
+    def __init__(self, seq: int, pin: int, level: int, t: float) -> None:
+        self.seq = seq
+        self.pin = pin
+        self.level = level
+        self.t = t
+
+    def to_dict(self) -> dict:
+        return {"seq": self.seq, "pin": self.pin, "level": self.level, "t": self.t}
+
+    def __repr__(self) -> str:
+        return f"Edge(#{self.seq}, pin={self.pin}, level={self.level}, t={self.t:.4f})"
+
+
+class PinClaim:
+    """
+    One reference to a claimed pin. release() (or leaving the `with` block)
+    drops it; the pin is cleaned up when its last claim is released.
+    """
+
+    def __init__(self, manager: "GPIOManager", pin: int, owner=None) -> None:
+        self.manager = manager
+        self.pin = pin
+        self.owner = owner
+        self.released = False
+
+    def __enter__(self) -> "PinClaim":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+    def read(self) -> int:
+        return self.manager.read(self.pin)
+
+    def write(self, value) -> None:
+        self.manager.write(self.pin, value)
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.manager.release(self.pin, self.owner)
+
+    def __repr__(self) -> str:
+        return f"PinClaim(pin={self.pin}, owner={self.owner!r}{', released' if self.released else ''})"
+
+
+class _Timer:
+    __slots__ = ("when", "callback", "args", "cancelled")
+
+    def __init__(self, when: float, callback, args) -> None:
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class GPIOManager:
+    """
+    Reference-counted pin allocation, edge log, subscriptions and timers.
+
+    :param log_size: Number of edges kept in the log
+    """
+
+    def __init__(self, log_size: int = EDGE_LOG_SIZE) -> None:
+        # Guards all state below; waiters are woken on every edge
+        self._cond = threading.Condition()
+        self._pins = {}
+        self._subscribers = {}
+        self.log = deque(maxlen=log_size)
+        self._seq = itertools.count(1)
+        self.last_seq = 0
+        self._pending = deque()
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._thread = None
+
+    # --- pin allocation --------------------------------------------------
+
+    def claim(self, pin: int, direction, pull=None, initial=None, owner=None, edges: bool = True,
+              bouncetime: int = None) -> PinClaim:
+        """
+        Configure `pin` (BCM numbering) or take another reference to it.
+
+        A pin that is already claimed must be claimed with the same direction,
+        pull, edge setting and bouncetime; otherwise RuntimeError is raised.
+        `initial` only applies to the claim that configures an output.
+        `edges=False` leaves edge detection off for an input that toggles too
+        fast to log (a bit-banged data line). `bouncetime` (milliseconds)
+        debounces the input's edges before they are logged.
+        """
+        with self._cond:
+            if direction == GPIO.IN:
+                config = (direction, pull, edges, bouncetime if edges else None)
+            else:
+                config = (direction, None, False, None)
+            state = self._pins.get(pin)
+            if state is None:
+                GPIO.setmode(GPIO.BCM)
+                if direction == GPIO.IN:
+                    GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_OFF if pull is None else pull)
+                    if edges and bouncetime:
+                        GPIO.add_event_detect(pin, GPIO.BOTH, callback=self._on_edge, bouncetime=bouncetime)
+                    elif edges:
+                        GPIO.add_event_detect(pin, GPIO.BOTH, callback=self._on_edge)
+                elif initial is None:
+                    GPIO.setup(pin, GPIO.OUT)
+                else:
+                    GPIO.setup(pin, GPIO.OUT, initial=initial)
+                state = self._pins[pin] = {"config": config, "owners": [], "bounces": 0, "settling": None,
+                                           "level": GPIO.input(pin) if config[3] else None}
+            elif state["config"] != config:
+                raise RuntimeError(f"GPIO {pin} is already claimed by {state['owners']} with a different setup")
+            state["owners"].append(owner)
+        return PinClaim(self, pin, owner)
+
+    def release(self, pin: int, owner=None) -> None:
+        """
+        Drop one reference to `pin`; the last one removes edge detection,
+        subscribers and the pin's configuration (GPIO.cleanup(pin)).
+        """
+        with self._cond:
+            state = self._pins.get(pin)
+            if state is None:
+                return
+            owners = state["owners"]
+            owners.remove(owner if owner in owners else owners[-1])
+            if owners:
+                return
+            del self._pins[pin]
+            self._subscribers.pop(pin, None)
+            if state["config"][2]:
+                GPIO.remove_event_detect(pin)
+            GPIO.cleanup(pin)
+
+    def claimed(self) -> dict:
+        """{pin: [owners]} of every claimed pin."""
+        with self._cond:
+            return {pin: list(state["owners"]) for pin, state in self._pins.items()}
+
+    def read(self, pin: int) -> int:
+        return GPIO.input(pin)
+
+    def bounces(self, pin: int) -> int:
+        """
+        Edges on a debounced `pin` discarded as bounces since it was claimed.
+        Edges the driver's own bouncetime filter drops never reach the
+        manager and are not counted.
+        """
+        with self._cond:
+            state = self._pins.get(pin)
+            return state["bounces"] if state is not None else 0
+
+    def write(self, pin: int, value) -> None:
+        GPIO.output(pin, value)
+
+    # --- edges -----------------------------------------------------------
+
+    def _on_edge(self, pin: int) -> None:
+        # Runs on the RPi.GPIO callback thread: stamp, log and hand off quickly
+        t = time.monotonic()
+        with self._cond:
+            state = self._pins.get(pin)
+            if state is None:
+                return
+            bouncetime = state["config"][3]
+            if bouncetime:
+                # Log nothing until the pin has settled; a burst keeps its first edge's time
+                if state["settling"] is None:
+                    state["settling"] = t
+                    self.call_at(t + bouncetime / 1000.0, self._settle, pin)
+                else:
+                    state["bounces"] += 1
+                return
+        # Without debouncing every edge is logged with the level it left the pin at
+        self._record(pin, GPIO.input(pin), t)
+
+    def _settle(self, pin: int) -> None:
+        # Event thread, once a debounced pin's bouncetime has passed since the burst began
+        level = GPIO.input(pin)
+        with self._cond:
+            state = self._pins.get(pin)
+            if state is None or state["settling"] is None:
+                return
+            t, state["settling"] = state["settling"], None
+            if level == state["level"]:
+                state["bounces"] += 1
+                return
+            state["level"] = level
+        self._record(pin, level, t)
+
+    def _record(self, pin: int, level: int, t: float) -> None:
+        with self._cond:
+            edge = Edge(next(self._seq), pin, level, t)
+            self.log.append(edge)
+            self.last_seq = edge.seq
+            callbacks = self._subscribers.get(pin)
+            if callbacks:
+                self._pending.append((tuple(callbacks), edge))
+                self._ensure_thread()
+            self._cond.notify_all()
+
+    def subscribe(self, pin: int, callback) -> None:
+        """
+        Call `callback(edge)` on the event thread for every edge on `pin`,
+        which must be claimed as an input. Callbacks should return quickly.
+        """
+        with self._cond:
+            state = self._pins.get(pin)
+            if state is None or not state["config"][2]:
+                raise RuntimeError(f"GPIO {pin} must be claimed as an input with edges before subscribing")
+            self._subscribers.setdefault(pin, []).append(callback)
+
+    def unsubscribe(self, pin: int, callback) -> None:
+        with self._cond:
+            callbacks = self._subscribers.get(pin, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def edges(self, pin: int = None, since: int = 0) -> list:
+        """
+        Logged edges with seq > `since`, optionally only those on `pin`.
+        """
+        with self._cond:
+            found = []
+            for edge in reversed(self.log):
+                if edge.seq <= since:
+                    break
+                if pin is None or edge.pin == pin:
+                    found.append(edge)
+            found.reverse()
+            return found
+
+    def wait_for(self, predicate, timeout: float = None) -> bool:
+        """
+        Block until `predicate()` is true or `timeout` seconds pass; the
+        predicate is re-evaluated (with the manager locked) after every edge.
+        Returns the predicate's last result.
+        """
+        with self._cond:
+            return self._cond.wait_for(predicate, timeout)
+
+    def wait_for_edge(self, pin: int, level: int = None, since: int = None, timeout: float = None):
+        """
+        Wait for an edge on `pin` (ending at `level`, if given) logged after
+        sequence number `since` (default: now). Returns the Edge, or None on
+        timeout.
+        """
+        with self._cond:
+            cursor = self.last_seq if since is None else since
+
+            def match():
+                for edge in self.edges(pin, cursor):
+                    if level is None or edge.level == level:
+                        return edge
+                return None
+
+            return self._cond.wait_for(match, timeout)
+
+    # --- event thread ----------------------------------------------------
+
+    def call_later(self, delay: float, callback, *args) -> _Timer:
+        """
+        Run `callback(*args)` on the event thread after `delay` seconds.
+        Returns a handle whose cancel() prevents the call.
+        """
+        return self.call_at(time.monotonic() + max(delay, 0.0), callback, *args)
+
+    def call_at(self, when: float, callback, *args) -> _Timer:
+        """
+        Run `callback(*args)` on the event thread at time.monotonic() `when`.
+        Timers due at the same time run in the order they were scheduled.
+        """
+        timer = _Timer(when, callback, args)
+        with self._cond:
+            heapq.heappush(self._timers, (timer.when, next(self._timer_seq), timer))
+            self._ensure_thread()
+            self._cond.notify_all()
+        return timer
+
+    def _ensure_thread(self) -> None:
+        # Caller holds self._cond
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="gpio-events", daemon=True)
+            self._thread.start()
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if self._pending:
+                    callbacks, edge = self._pending.popleft()
+                    return [(callback, (edge,)) for callback in callbacks]
+                while self._timers and self._timers[0][2].cancelled:
+                    heapq.heappop(self._timers)
+                now = time.monotonic()
+                if self._timers and self._timers[0][0] <= now:
+                    timer = heapq.heappop(self._timers)[2]
+                    return [(timer.callback, timer.args)]
+                self._cond.wait(self._timers[0][0] - now if self._timers else None)
+
+    def _run(self) -> None:
+        while True:
+            for callback, args in self._next_job():
+                try:
+                    callback(*args)
+                except Exception:
+                    logger.exception("GPIO event callback %r failed", callback)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "claimed": {pin: len(state["owners"]) for pin, state in self._pins.items()},
+                "edges": self.last_seq,
+                "logged": len(self.log),
+                "pending": len(self._pending),
+                "timers": sum(not t[2].cancelled for t in self._timers),
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager() -> GPIOManager:
+    """The process-wide GPIOManager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = GPIOManager()
+        return _manager
@@ -0,0 +1,430 @@
+"""
+hw_daemon.py — Long-lived hardware owner serving test requests over a Unix socket.
+
+A HardwareDaemon starts once and keeps the station's drivers initialized
+and warm in a DeviceRegistry: the PIR sensor stays past its warm-up, the
+cameras stay open with AE converged, the RFID and QR services keep
+running. Test runs are requested over a local Unix socket, so a run costs
+the tests themselves instead of the hardware setup and teardown.
+
+A background thread health-checks every open device; only a device that
+fails its check is closed and reopened, the others stay warm.
+
+Protocol: one JSON object per line in each direction. Requests are
+{"op": "run", "tests": [...] or null for all}, {"op": "status"},
+{"op": "check"}, {"op": "reset", "device": name}, {"op": "ping"} and
+{"op": "shutdown"}; replies carry "ok" plus the result or "error".
+
+The thin client needs nothing but the standard library:
+    python -m modules.hw_daemon run rfid,qr
+    python -m modules.hw_daemon status
+"""
+import argparse
+import functools
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["Device", "DeviceRegistry", "HardwareDaemon", "request", "SOCKET_ENV", "DEFAULT_SOCKET"]
+
+SOCKET_ENV = "ARCULUS_SOCKET"
+DEFAULT_SOCKET = "/tmp/arculus-hwd.sock"
+
+
+def socket_path(path: str = None) -> str:
+    return path or os.environ.get(SOCKET_ENV) or DEFAULT_SOCKET
+
+
+class Device:
+    """
+    One warm driver: how to open, health-check and close it.
+
+    :param name: registry key
+    :param opener: callable returning the open driver handle
+    :param check: callable(handle) -> bool; defaults to handle.healthy() when present
+    :param closer: callable(handle); defaults to handle.close() when present
+    :param warm: open when the daemon starts rather than on first use
+    """
+
+    def __init__(self, name: str, opener, check=None, closer=None, warm: bool = True) -> None:
+        self.name = name
+        self.opener = opener
+        self.checker = check
+        self.closer = closer
+        self.warm = warm
+        self.handle = None
+        self._lock = threading.RLock()
+        self.opened_at = None
+        self.open_s = None
+        self.uses = 0
+        self.checks = 0
+        self.failures = 0
+        self.resets = 0
+        self.last_error = None
+
+    def get(self):
+        """The open handle, opening the driver first if needed."""
+        with self._lock:
+            if self.handle is None:
+                t0 = time.monotonic()
+                try:
+                    self.handle = self.opener()
+                except Exception as e:
+                    self.last_error = f"open failed: {type(e).__name__}: {e}"
+                    raise
+                self.opened_at = time.monotonic()
+                self.open_s = self.opened_at - t0
+                logger.info(f"{self.name}: opened in {self.open_s * 1000:.1f} ms")
+            self.uses += 1
+            return self.handle
+
+    def _healthy(self, handle) -> bool:
+        if self.checker is not None:
+            return bool(self.checker(handle))
+        healthy = getattr(handle, "healthy", None)
+        return bool(healthy()) if callable(healthy) else True
+
+    def check(self) -> bool:
+        """
+        Health-check the open driver; a failing one is reset (closed and
+        reopened). A driver that is not open counts as healthy.
+        """
+        with self._lock:
+            if self.handle is None:
+                return True
+            self.checks += 1
+            try:
+                healthy = self._healthy(self.handle)
+            except Exception as e:
+                healthy = False
+                self.last_error = f"check raised {type(e).__name__}: {e}"
+            if healthy:
+                return True
+            self.failures += 1
+            logger.warning(f"{self.name}: failed its health check; resetting")
+            self.reset()
+            return False
+
+    def reset(self) -> None:
+        """Close the driver and, if it is warm, reopen it at once."""
+        with self._lock:
+            self.close()
+            self.resets += 1
+            if self.warm:
+                try:
+                    self.get()
+                except Exception as e:
+                    logger.error(f"{self.name}: reopen failed: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            handle, self.handle = self.handle, None
+            if handle is None:
+                return
+            try:
+                if self.closer is not None:
+                    self.closer(handle)
+                elif hasattr(handle, "close"):
+                    handle.close()
+            except Exception as e:
+                self.last_error = f"close failed: {type(e).__name__}: {e}"
+                logger.exception(f"{self.name}: close failed")
+
+    def stats(self) -> dict:
+        return {
+            "open": self.handle is not None,
+            "open_s": None if self.open_s is None else round(self.open_s, 4),
+            "up_s": None if self.handle is None else round(time.monotonic() - self.opened_at, 1),
+            "uses": self.uses,
+            "checks": self.checks,
+            "failures": self.failures,
+            "resets": self.resets,
+            "last_error": self.last_error,
+        }
+
+
+class DeviceRegistry:
+    """
+    The daemon's warm drivers, with a background health-check loop.
+
+    :param devices: iterable of Device
+    :param check_interval: seconds between health-check rounds
+    """
+
+    def __init__(self, devices=(), check_interval: float = 10.0) -> None:
+        self.devices = {d.name: d for d in devices}
+        self.check_interval = check_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.devices
+
+    def get(self, name: str):
+        """The open handle for `name`; KeyError if it is not registered."""
+        return self.devices[name].get()
+
+    def warm_up(self) -> dict:
+        """Open every warm device; returns {name: error} for those that failed."""
+        errors = {}
+        for device in self.devices.values():
+            if device.warm:
+                try:
+                    device.get()
+                except Exception as e:
+                    errors[device.name] = str(e)
+                    logger.error(f"{device.name}: could not be opened: {e}")
+        return errors
+
+    def check(self) -> dict:
+        """Health-check every device now; returns {name: healthy}."""
+        return {name: device.check() for name, device in self.devices.items()}
+
+    def reset(self, name: str) -> None:
+        self.devices[name].reset()
+
+    def start(self) -> "DeviceRegistry":
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="hw-health", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            self.check()
+
+    def close(self) -> None:
+        """Stop health checks and close every driver (in reverse order of registration)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for device in reversed(list(self.devices.values())):
+            device.close()
+
+    def stats(self) -> dict:
+        return {name: device.stats() for name, device in self.devices.items()}
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _StdoutRouter:
+    """
+    sys.stdout stand-in while the daemon serves: writes from a thread
+    attached to a capture buffer go to that buffer, everything else
+    (health checks, other connections, detached threads) to the original
+    stream.
+    """
+
+    def __init__(self, stream) -> None:
+        self.stream = stream
+        self._targets = {}
+
+    def _target(self):
+        return self._targets.get(threading.get_ident(), self.stream)
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+    @contextmanager
+    def capture(self, buffer):
+        """Send the calling thread's output to `buffer` for the duration of the block."""
+        ident = threading.get_ident()
+        previous = self._targets.get(ident)
+        self._targets[ident] = buffer
+        try:
+            yield buffer
+        finally:
+            if self._targets.get(ident) is buffer:
+                if previous is None:
+                    del self._targets[ident]
+                else:
+                    self._targets[ident] = previous
+
+    def detach(self, buffer) -> None:
+        """Stop capturing into `buffer`: threads still attached to it (a timed-out test) write to the stream again."""
+        for ident, target in list(self._targets.items()):
+            if target is buffer:
+                self._targets.pop(ident, None)
+
+
+class HardwareDaemon:
+    """
+    Serves test runs against a warm DeviceRegistry.
+
+    :param registry: DeviceRegistry the tests use
+    :param run_tests: callable(names or None, thread_context) -> summary dict
+                      (as from orchestrator.run_schedule); runs are
+                      serialized. thread_context is passed on to
+                      run_schedule so each test thread's output is captured
+                      for the client.
+    :param path: socket path (default $ARCULUS_SOCKET or /tmp/arculus-hwd.sock)
+    """
+
+    def __init__(self, registry: DeviceRegistry, run_tests, path: str = None) -> None:
+        self.registry = registry
+        self.run_tests = run_tests
+        self.path = socket_path(path)
+        self.started_at = None
+        self.runs = 0
+        self._run_lock = threading.Lock()
+        self._server = None
+        self._stdout = None
+
+    # --- requests --------------------------------------------------------
+
+    def _run(self, tests) -> dict:
+        with self._run_lock:
+            t0 = time.monotonic()
+            self.registry.check()
+            dispatch_s = time.monotonic() - t0
+            log = io.StringIO()
+            # Output of this run's threads goes back to the client; the rest of
+            # the process keeps writing to the daemon's console
+            if self._stdout is None:
+                # Not serving (handle() called directly): nothing to route
+                summary = self.run_tests(tests, None)
+            else:
+                thread_output = functools.partial(self._stdout.capture, log)
+                try:
+                    with thread_output():
+                        summary = self.run_tests(tests, thread_output)
+                finally:
+                    self._stdout.detach(log)
+            self.runs += 1
+            return {"summary": summary, "log": log.getvalue(), "dispatch_s": round(dispatch_s, 4),
+                    "elapsed_s": round(time.monotonic() - t0, 4)}
+
+    def handle(self, message: dict) -> dict:
+        op = message.get("op")
+        if op == "ping":
+            return {"pid": os.getpid()}
+        if op == "run":
+            return self._run(message.get("tests"))
+        if op == "status":
+            return {"pid": os.getpid(), "up_s": round(time.monotonic() - self.started_at, 1),
+                    "runs": self.runs, "devices": self.registry.stats()}
+        if op == "check":
+            return {"healthy": self.registry.check()}
+        if op == "reset":
+            self.registry.reset(message["device"])
+            return {"device": message["device"], "stats": self.registry.devices[message["device"]].stats()}
+        if op == "shutdown":
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+            return {}
+        raise ValueError(f"Unknown op {op!r}")
+
+    # --- server ----------------------------------------------------------
+
+    def serve_forever(self) -> None:
+        """Warm the devices, then serve until a shutdown request or Ctrl+C."""
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        reply = {"ok": True, **daemon.handle(json.loads(line))}
+                    except (ValueError, KeyError) as e:
+                        # A bad request (unknown op, test or device)
+                        reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                    except Exception as e:
+                        logger.exception("Request failed")
+                        reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                    self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+        if os.path.exists(self.path):
+            # A stale socket from a previous daemon; refuse to start if one is still answering
+            try:
+                request({"op": "ping"}, self.path, timeout=1.0)
+            except OSError:
+                os.unlink(self.path)
+            else:
+                raise RuntimeError(f"A hardware daemon is already listening on {self.path}")
+        self.started_at = time.monotonic()
+        errors = self.registry.warm_up()
+        print(f"Devices warm in {time.monotonic() - self.started_at:.2f}s"
+              + (f" (unavailable: {', '.join(errors)})" if errors else ""))
+        self.registry.start()
+        self._server = _Server(self.path, Handler)
+        self._stdout = sys.stdout = _StdoutRouter(sys.stdout)
+        try:
+            print(f"Hardware daemon listening on {self.path}")
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sys.stdout = self._stdout.stream
+            self._stdout = None
+            self._server.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self.registry.close()
+
+
+def request(message: dict, path: str = None, timeout: float = None) -> dict:
+    """Send one request to the daemon and return its reply (OSError if none is running)."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path(path))
+        sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as reply:
+            line = reply.readline()
+    if not line:
+        raise ConnectionError("The hardware daemon closed the connection without replying")
+    return json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Client for the hardware daemon (start it with main.py --serve)")
+    parser.add_argument("op", choices=["run", "status", "check", "reset", "ping", "shutdown"])
+    parser.add_argument("arg", nargs="?", help="run: comma-separated test names (default all); reset: device name")
+    parser.add_argument("--socket", default=None, help=f"Socket path (default ${SOCKET_ENV} or {DEFAULT_SOCKET})")
+    args = parser.parse_args()
+
+    message = {"op": args.op}
+    if args.op == "run":
+        message["tests"] = [n.strip() for n in args.arg.split(",") if n.strip()] if args.arg else None
+    elif args.op == "reset":
+        if not args.arg:
+            parser.error("reset needs a device name")
+        message["device"] = args.arg
+    t0 = time.monotonic()
+    try:
+        reply = request(message, args.socket)
+    except OSError as e:
+        print(f"Hardware daemon not reachable at {socket_path(args.socket)}: {e}", file=sys.stderr)
+        sys.exit(2)
+    if not reply.pop("ok"):
+        print(reply["error"], file=sys.stderr)
+        sys.exit(1)
+    if args.op == "run":
+        sys.stdout.write(reply["log"])
+        print(json.dumps(reply["summary"], indent=2))
+        print(f"Dispatch {reply['dispatch_s'] * 1000:.1f} ms, run {reply['elapsed_s']:.3f}s, "
+              f"round trip {time.monotonic() - t0:.3f}s")
+        sys.exit(0 if reply["summary"]["passed"] else 1)
+    print(json.dumps(reply, indent=2))
+
+
+if __name__ == "__main__":
+    main()
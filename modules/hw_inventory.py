@@ -0,0 +1,304 @@
+"""
+hw_inventory.py — Cached inventory of the hardware attached to the station.
+
+Probing what is connected (USB and CSI cameras, serial ports, responding
+I2C addresses) costs far more than the tests need at startup, and it finds
+the same answer on every run. probe() does it once; the result is saved
+together with a fingerprint of the device nodes and reused by later runs
+for as long as the fingerprint matches.
+
+The fingerprint is cheap to compute: it only stats and reads files. It
+covers the /dev nodes of cameras, serial ports, I2C buses and GPIO chips
+(path, inode and device number, so a replugged device gets a new inode),
+the USB devices' vendor, product and serial number, the V4L2 node names
+in sysfs and the serial by-id links. When any of them changes, the next
+load re-probes; a re-probe can also be forced with refresh=True
+(main.py --rescan). On the simulated backend the scenario's device
+descriptions take the place of /dev and sysfs.
+
+The GPIO wiring cannot be probed; the caller passes it in and it is
+recorded with the inventory.
+
+The inventory lives at ~/.arculus/hardware_inventory.json, one record per
+backend, unless ARCULUS_INVENTORY names another file.
+
+Usage:
+    from modules.hw_inventory import get_inventory
+    inventory = get_inventory()
+    inventory.usb_cameras, inventory.qr_port, inventory.picamera_num
+"""
+import argparse
+import datetime
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+from modules import backend
+
+__all__ = [
+    "INVENTORY_ENV",
+    "Inventory",
+    "InventoryStore",
+    "fingerprint",
+    "probe",
+    "load_inventory",
+    "get_inventory",
+]
+
+INVENTORY_ENV = "ARCULUS_INVENTORY"
+DEFAULT_PATH = os.path.join("~", ".arculus", "hardware_inventory.json")
+
+# Device nodes whose presence and identity make up the fingerprint
+_NODE_GLOBS = ("/dev/video*", "/dev/media*", "/dev/ttyACM*", "/dev/ttyUSB*", "/dev/i2c-*", "/dev/gpiochip*")
+# Attributes of each USB device in sysfs
+_USB_ATTRIBUTES = ("idVendor", "idProduct", "serial")
+# Serial port descriptor fields kept in the inventory
+_PORT_FIELDS = ("device", "description", "serial_number", "vid", "pid", "manufacturer", "product", "location")
+
+_inventory = None
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path) as fh:
+            return fh.read().strip()
+    except OSError:
+        return ""
+
+
+def _fingerprint_parts() -> list:
+    if backend.is_simulated():
+        from modules.sim.scenario import get_scenario
+        scenario = get_scenario()
+        return [json.dumps({
+            "serial": {device: spec.get("serial_number") for device, spec in scenario.get("serial", {}).items()},
+            "i2c": scenario.get("i2c", {}),
+            "cameras": scenario.get("cameras", {}).get("indices", []),
+            "picamera": scenario.get("picamera", {}).get("count", 0),
+        }, sort_keys=True)]
+    parts = []
+    for path in sorted(p for pattern in _NODE_GLOBS for p in glob.glob(pattern)):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        parts.append(f"{path}:{st.st_ino}:{st.st_rdev}")
+    for device in sorted(glob.glob("/sys/bus/usb/devices/*")):
+        if os.path.exists(os.path.join(device, "idVendor")):
+            parts.append(":".join([os.path.basename(device)]
+                                  + [_read(os.path.join(device, a)) for a in _USB_ATTRIBUTES]))
+    for name in sorted(glob.glob("/sys/class/video4linux/*/name")):
+        parts.append(f"{name}:{_read(name)}")
+    for link in sorted(glob.glob("/dev/serial/by-id/*")):
+        parts.append(f"{link}->{os.path.realpath(link)}")
+    return parts
+
+
+def fingerprint() -> str:
+    """Short hash of the attached devices (stat and sysfs reads only)."""
+    parts = [backend.current_backend()] + _fingerprint_parts()
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+
+class Inventory:
+    """
+    What was found on the station.
+
+    :param usb_cameras: cv2.VideoCapture indices, one per USB camera
+    :param csi_sensors: /dev/video* capture nodes of CSI sensors
+    :param picameras: [{"num", "model", "id"}, ...] from libcamera's camera list
+    :param serial_ports: serial port descriptors as dicts
+    :param i2c: {bus: [responding 7-bit addresses]}
+    :param gpio: GPIO wiring as configured by the caller
+    :param fingerprint: fingerprint() at probe time
+    :param probe_s: seconds the probe took
+    """
+
+    def __init__(self, usb_cameras=(), csi_sensors=(), picameras=(), serial_ports=(), i2c=None, gpio=None,
+                 fingerprint=None, created=None, probe_s=None):
+        self.usb_cameras = list(usb_cameras)
+        self.csi_sensors = list(csi_sensors)
+        self.picameras = list(picameras)
+        self.serial_ports = [dict(p) for p in serial_ports]
+        self.i2c = {int(bus): list(addresses) for bus, addresses in (i2c or {}).items()}
+        self.gpio = dict(gpio or {})
+        self.fingerprint = fingerprint
+        self.created = created or datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        self.probe_s = probe_s
+        # "probe" or "cache"; not stored
+        self.source = "probe"
+
+    @property
+    def qr_port(self):
+        """The QR scanner's port, chosen from the inventoried ports (None if there is none)."""
+        from modules.qr_reader import find_scanner_port
+        ports = [SimpleNamespace(**{field: p.get(field) for field in _PORT_FIELDS}) for p in self.serial_ports]
+        return find_scanner_port(ports)
+
+    @property
+    def picamera_num(self):
+        """libcamera camera number of the first CSI camera, or None."""
+        return self.picameras[0]["num"] if self.picameras else None
+
+    def has_i2c(self, address: int, bus: int = 1) -> bool:
+        return address in self.i2c.get(bus, [])
+
+    def to_dict(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "created": self.created,
+            "probe_s": self.probe_s,
+            "usb_cameras": self.usb_cameras,
+            "csi_sensors": self.csi_sensors,
+            "picameras": self.picameras,
+            "serial_ports": self.serial_ports,
+            "i2c": {str(bus): addresses for bus, addresses in self.i2c.items()},
+            "gpio": self.gpio,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Inventory":
+        return cls(data.get("usb_cameras", ()), data.get("csi_sensors", ()), data.get("picameras", ()),
+                   data.get("serial_ports", ()), data.get("i2c"), data.get("gpio"), data.get("fingerprint"),
+                   data.get("created"), data.get("probe_s"))
+
+    def summary(self) -> str:
+        i2c = ", ".join(f"bus {bus}: {' '.join(f'0x{a:02x}' for a in addresses) or 'none'}"
+                        for bus, addresses in self.i2c.items()) or "none"
+        return (f"USB cameras {self.usb_cameras}, CSI cameras {[c['num'] for c in self.picameras]}, "
+                f"serial {[p['device'] for p in self.serial_ports]} (QR {self.qr_port}), I2C {i2c}")
+
+    def __repr__(self) -> str:
+        return f"Inventory({self.source}: {self.summary()})"
+
+
+def _probe_picameras(nodes) -> list:
+    from modules.v4l2_discovery import csi_sensor_nodes
+    if not csi_sensor_nodes(nodes):
+        return []
+    try:
+        cameras = backend.picamera2_class().global_camera_info()
+    except Exception as e:
+        print(f"libcamera camera list unavailable: {e}", file=sys.stderr)
+        return []
+    return [{"num": info.get("Num", position), "model": info.get("Model"), "id": str(info.get("Id", ""))}
+            for position, info in enumerate(cameras) if "usb" not in str(info.get("Id", "")).lower()]
+
+
+def probe(gpio=None, i2c_buses=(1,), max_camera_index: int = 3) -> Inventory:
+    """
+    Discover the attached hardware. USB cameras come from V4L2 capability
+    queries, or from opening indices 0..max_camera_index with cv2 when
+    V4L2 finds none; each I2C bus in `i2c_buses` is scanned for
+    responding addresses.
+    """
+    t0 = time.monotonic()
+    from modules import v4l2_discovery
+    from modules.camera import CameraTester
+
+    current = fingerprint()
+    nodes = v4l2_discovery.discover()
+    usb_cameras = v4l2_discovery.usb_capture_indices(nodes, max_index=max_camera_index)
+    if not usb_cameras:
+        usb_cameras = CameraTester.list_available_cameras(max_index=max_camera_index, probe=True)
+    i2c = {}
+    for bus in i2c_buses:
+        try:
+            from modules.i2c_bus import get_bus
+            i2c[bus] = get_bus(bus).scan()
+        except (ImportError, OSError) as e:
+            print(f"I2C bus {bus} unavailable: {e}", file=sys.stderr)
+    ports = [{field: getattr(p, field, None) for field in _PORT_FIELDS} for p in backend.serial_ports()]
+    return Inventory(usb_cameras, [n.path for n in v4l2_discovery.csi_sensor_nodes(nodes)],
+                     _probe_picameras(nodes), ports, i2c, gpio, current, probe_s=round(time.monotonic() - t0, 4))
+
+
+class InventoryStore:
+    """
+    Inventories persisted as one JSON document: {"backends": {backend: record}}.
+    Writes are atomic (temporary file + rename).
+    """
+
+    def __init__(self, path: str = None):
+        self.path = os.path.expanduser(path or os.environ.get(INVENTORY_ENV) or DEFAULT_PATH)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {"backends": {}}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable hardware inventory {self.path}: {e}", file=sys.stderr)
+            return {"backends": {}}
+
+    def load(self, name: str = None):
+        """The stored Inventory of backend `name` (the current one by default), or None."""
+        record = self._read().get("backends", {}).get(name or backend.current_backend())
+        return None if record is None else Inventory.from_dict(record)
+
+    def save(self, inventory: Inventory, name: str = None) -> None:
+        data = self._read()
+        data.setdefault("backends", {})[name or backend.current_backend()] = inventory.to_dict()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(data, fh, indent=2)
+            fh.write("\n")
+        os.replace(tmp, self.path)
+
+
+def load_inventory(gpio=None, refresh: bool = False, store: InventoryStore = None) -> Inventory:
+    """
+    The stored inventory while its fingerprint matches the attached
+    devices, otherwise (or with `refresh`) a fresh probe, which is saved.
+    A changed `gpio` wiring is recorded without re-probing. The result also
+    becomes the process-wide inventory returned by get_inventory().
+    """
+    global _inventory
+    store = store or InventoryStore()
+    cached = store.load()
+    if cached is not None and not refresh and cached.fingerprint == fingerprint():
+        inventory = cached
+        inventory.source = "cache"
+        if gpio is not None and inventory.gpio != gpio:
+            inventory.gpio = dict(gpio)
+            store.save(inventory)
+    else:
+        inventory = probe(gpio if gpio is not None or cached is None else cached.gpio)
+        try:
+            store.save(inventory)
+        except OSError as e:
+            print(f"Could not save the hardware inventory to {store.path}: {e}", file=sys.stderr)
+    _inventory = inventory
+    return inventory
+
+
+def get_inventory() -> Inventory:
+    """The process-wide inventory, loaded (or probed) on first use."""
+    if _inventory is None:
+        return load_inventory()
+    return _inventory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the cached hardware inventory")
+    parser.add_argument("--rescan", action="store_true", help="Probe the hardware even if the cache matches")
+    parser.add_argument("--path", default=None, help=f"Inventory file (default ${INVENTORY_ENV} or {DEFAULT_PATH})")
+    args = parser.parse_args()
+
+    t0 = time.monotonic()
+    inventory = load_inventory(refresh=args.rescan, store=InventoryStore(args.path))
+    elapsed = time.monotonic() - t0
+    print(json.dumps(inventory.to_dict(), indent=2))
+    print(inventory.summary())
+    print(f"Loaded from {inventory.source} in {elapsed * 1000:.2f} ms"
+          + (f" (last probe took {inventory.probe_s * 1000:.1f} ms)" if inventory.probe_s is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
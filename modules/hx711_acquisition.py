@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Module: hx711_acquisition.py
+
+Continuous HX711 sampling on a background thread into a timestamped NumPy
+ring buffer, so weight queries are answered from samples that have already
+been converted instead of waiting on the chip.
+
+The read method is picked once when the engine is created; the thread then
+reads at the HX711's own data rate (10 or 80 samples/s), which the driver
+paces by waiting for DOUT to go low.
+
+HX711BankAcquisition does the same for several HX711s sharing one PD_SCK
+line (an HX711Bank): each clocked conversion yields one sample per chip,
+all stored under the same timestamp.
+
+Usage:
+    engine = HX711Acquisition(hx).start()
+    timestamps, values = engine.samples(20)
+    engine.stop()
+"""
+
+import threading
+import time
+
+import numpy as np
+
+__all__ = [
+    'SampleRing',
+    'HX711Acquisition',
+    'HX711BankAcquisition',
+    'select_reader',
+]
+
+
+def select_reader(hx):
+    """
+    Return a zero-argument callable that performs one raw conversion on `hx`.
+
+    Resolved once per HX711 instance so the sampling loop does no attribute lookups.
+    Readers return False (or None) when no sample was available.
+    """
+    if hasattr(hx, '_read'):
+        return hx._read
+    if hasattr(hx, 'read'):
+        read = hx.read
+        return lambda: read(1)
+    if hasattr(hx, 'read_average'):
+        read_average = hx.read_average
+        return lambda: read_average(1)
+    raise AttributeError('No supported raw read method on HX711 object')
+
+
+class SampleRing:
+    """
+    Fixed-size ring of (monotonic timestamp, raw value) pairs.
+
+    Appends overwrite the oldest sample once full; readers get chronological copies.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self._t = np.zeros(capacity, dtype=np.float64)
+        self._v = np.zeros(capacity, dtype=np.float64)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def append(self, timestamp, value):
+        with self._lock:
+            i = self.total % self.capacity
+            self._t[i] = timestamp
+            self._v[i] = value
+            self.total += 1
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def latest(self, n=None, since=None):
+        """
+        Return (timestamps, values) for the newest `n` samples (all buffered if None),
+        optionally only those taken at or after monotonic time `since`.
+        """
+        with self._lock:
+            count = min(self.total, self.capacity)
+            if n is not None:
+                count = min(count, n)
+            end = self.total % self.capacity
+            idx = (np.arange(end - count, end)) % self.capacity
+            t = self._t[idx]
+            v = self._v[idx]
+        if since is not None:
+            keep = t >= since
+            t, v = t[keep], v[keep]
+        return t, v
+
+    def clear(self):
+        with self._lock:
+            self.total = 0
+
+
+class HX711Acquisition:
+    """
+    Reads one HX711 continuously on a daemon thread.
+
+    :param hx: HX711 instance (from setup_scale or the driver directly)
+    :param capacity: Ring buffer size in samples
+    :param poll_interval: Sleep after a read that returned no sample (chip not ready or powered down)
+    :param read: Zero-argument callable performing one raw conversion
+                 (resolved from `hx` with select_reader() if None)
+    """
+
+    def __init__(self, hx, capacity=1024, poll_interval=0.002, read=None):
+        self.hx = hx
+        self.ring = SampleRing(capacity)
+        self.name = 'hx711-acquisition'
+        self.poll_interval = poll_interval
+        self._read = read if read is not None else select_reader(hx)
+        self._stop = threading.Event()
+        self._new_sample = threading.Condition()
+        self._thread = None
+        self.errors = 0
+        self.started_at = None
+        self.last_error = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Start the sampling thread (no-op if already running). Returns self.
+        """
+        if self.running:
+            return self
+        self._stop.clear()
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """
+        Stop the sampling thread and wait for it to exit.
+        """
+        self._stop.set()
+        with self._new_sample:
+            self._new_sample.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        read = self._read
+        ring = self.ring
+        while not self._stop.is_set():
+            try:
+                value = read()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+                self._stop.wait(self.poll_interval)
+                continue
+            if value is False or value is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            ring.append(time.monotonic(), value)
+            with self._new_sample:
+                self._new_sample.notify_all()
+
+    def wait_for_samples(self, count, since=None, timeout=None, ring=None):
+        """
+        Block until `count` samples taken at or after `since` are buffered
+        (or `count` samples in total if since is None). Returns True if they arrived.
+        """
+        ring = self.ring if ring is None else ring
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._new_sample:
+            while True:
+                if since is None:
+                    have = len(ring)
+                else:
+                    have = len(ring.latest(count, since)[0])
+                if have >= count:
+                    return True
+                if self._stop.is_set() or not self.running:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._new_sample.wait(remaining)
+
+    def samples(self, count=None, since=None, timeout=None):
+        """
+        Return (timestamps, values) of the newest `count` samples. Returns at
+        once when enough are buffered; otherwise waits up to `timeout` for them.
+        """
+        if count is not None:
+            self.wait_for_samples(count, since, timeout)
+        return self.ring.latest(count, since)
+
+    def rate(self):
+        """
+        Measured sample rate (samples/s) over the buffered window.
+        """
+        t, _ = self.ring.latest()
+        if len(t) < 2 or t[-1] <= t[0]:
+            return 0.0
+        return float((len(t) - 1) / (t[-1] - t[0]))
+
+    def stats(self):
+        return {
+            'samples': self.ring.total,
+            'buffered': len(self.ring),
+            'rate_hz': round(self.rate(), 2),
+            'errors': self.errors,
+            'running': self.running,
+        }
+
+
+class _ChannelTap:
+    """
+    One chip's view of an HX711BankAcquisition, usable wherever an
+    HX711Acquisition is expected for reading (ring, samples, wait_for_samples).
+    """
+
+    def __init__(self, engine, index):
+        self.engine = engine
+        self.index = index
+        self.ring = engine.rings[index]
+
+    @property
+    def running(self):
+        return self.engine.running
+
+    def wait_for_samples(self, count, since=None, timeout=None):
+        return self.engine.wait_for_samples(count, since, timeout, ring=self.ring)
+
+    def samples(self, count=None, since=None, timeout=None):
+        if count is not None:
+            self.wait_for_samples(count, since, timeout)
+        return self.ring.latest(count, since)
+
+
+class HX711BankAcquisition(HX711Acquisition):
+    """
+    Reads an HX711Bank (chips sharing PD_SCK) continuously on a daemon thread.
+
+    bank.read() returns one raw value per chip from a single clocked
+    conversion, or False when the chips are not ready. channel(i) returns a
+    per-chip view for read-side code.
+    """
+
+    def __init__(self, bank, capacity=1024, poll_interval=0.002):
+        self.bank = bank
+        self.rings = [SampleRing(capacity) for _ in bank.dout_pins]
+        # bank.read() clocks every chip at once; select_reader's single-chip forms do not apply
+        super().__init__(bank, capacity, poll_interval, read=bank.read)
+        self.name = 'hx711-bank-acquisition'
+        self.ring = self.rings[0]
+
+    def channel(self, index):
+        return _ChannelTap(self, index)
+
+    def _run(self):
+        read = self._read
+        rings = self.rings
+        while not self._stop.is_set():
+            try:
+                values = read()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+                self._stop.wait(self.poll_interval)
+                continue
+            if values is False or values is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            now = time.monotonic()
+            for ring, value in zip(rings, values):
+                ring.append(now, value)
+            with self._new_sample:
+                self._new_sample.notify_all()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Module: hx711_bank.py
+
+Bit-banged reader for several HX711 amplifiers wired to one shared PD_SCK
+line, each with its own DOUT pin.
+
+Because every chip sees the same clock, one train of 24 pulses reads all of
+them: after each pulse every DOUT pin is sampled, so N channels cost the
+same bus time as one and their samples come from the same conversion.
+Channels that do not share a clock are read by one HX711 driver each
+instead (see load_cell_array.py).
+"""
+
+import time
+
+from modules import backend
+from modules.gpio_manager import get_manager
+
+GPIO = backend.gpio()
+
+__all__ = ['HX711Bank', 'claim_pins']
+
+# Extra clock pulses after the 24 data bits select the next conversion's channel/gain
+_GAIN_PULSES = {128: 1, 64: 3, 32: 2}
+
+
+def claim_pins(pd_sck_pin, dout_pins, owner='hx711'):
+    """
+    Claim an HX711 clock (output, low) and data pins (inputs, no edge
+    detection) through the GPIO manager. Returns the PinClaims; if a pin
+    cannot be claimed, those already taken are released before re-raising.
+    """
+    gpio = get_manager()
+    claims = []
+    try:
+        claims.append(gpio.claim(pd_sck_pin, GPIO.OUT, initial=GPIO.LOW, owner=owner))
+        for pin in dout_pins:
+            claims.append(gpio.claim(pin, GPIO.IN, owner=owner, edges=False))
+    except Exception:
+        for claim in claims:
+            claim.release()
+        raise
+    return claims
+
+
+class HX711Bank:
+    """
+    HX711 chips sharing one PD_SCK pin.
+
+    :param pd_sck_pin: BCM pin of the shared clock
+    :param dout_pins: BCM pins of each chip's data output
+    :param gain: 128 or 64 (channel A) or 32 (channel B), applied to every chip
+
+    The pins are claimed through the GPIO manager; close() releases them.
+    """
+
+    def __init__(self, pd_sck_pin, dout_pins, gain=128):
+        if gain not in _GAIN_PULSES:
+            raise ValueError(f'Unsupported HX711 gain {gain}')
+        self.pd_sck_pin = pd_sck_pin
+        self.dout_pins = list(dout_pins)
+        self.gain = gain
+        self._extra_pulses = _GAIN_PULSES[gain]
+        self._claims = claim_pins(pd_sck_pin, self.dout_pins, owner='hx711-bank')
+        # A common power cycle starts every chip's conversion cycle together
+        self.reset()
+
+    def close(self):
+        """Release the pins (safe to call more than once)."""
+        while self._claims:
+            self._claims.pop().release()
+
+    def ready(self):
+        """
+        True when every chip has a conversion waiting (DOUT low).
+        """
+        return not any(GPIO.input(pin) for pin in self.dout_pins)
+
+    def read(self):
+        """
+        Clock one conversion out of every chip.
+
+        :return: List of signed 24-bit raw values (one per DOUT pin), or
+                 False if the chips are not all ready.
+        """
+        if not self.ready():
+            return False
+        output = GPIO.output
+        read = GPIO.input
+        sck = self.pd_sck_pin
+        douts = self.dout_pins
+        values = [0] * len(douts)
+        for _ in range(24):
+            # SCK must stay high for less than 60 us or the chips power down
+            output(sck, True)
+            output(sck, False)
+            for i, pin in enumerate(douts):
+                values[i] = (values[i] << 1) | read(pin)
+        for _ in range(self._extra_pulses):
+            output(sck, True)
+            output(sck, False)
+        return [v - 0x1000000 if v & 0x800000 else v for v in values]
+
+    def power_down(self):
+        GPIO.output(self.pd_sck_pin, False)
+        GPIO.output(self.pd_sck_pin, True)
+        time.sleep(0.0001)
+
+    def power_up(self):
+        GPIO.output(self.pd_sck_pin, False)
+
+    def reset(self):
+        self.power_down()
+        self.power_up()
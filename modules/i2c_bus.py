@@ -0,0 +1,469 @@
+"""
+i2c_bus.py — Shared, scheduled access to the I2C buses.
+
+One I2CBus per bus number (get_bus()) holds a single pooled SMBus handle,
+opened when the first device handle is taken and closed when the last one
+is released, so drivers never open /dev/i2c-N themselves.
+
+Transactions from every thread are serialized through a fair scheduler
+instead of racing on the handle: when the bus frees up, the waiting
+request with the best priority goes next; within a priority the device
+served least recently wins (round robin), and a request's priority
+improves by one level for every `aging` seconds it has waited, so a
+high-rate poller (the RFID reader) never starves another device and a
+low-priority device is never starved either. Every transaction's queueing
+delay and bus time are recorded per device together with error and NACK
+counts, which keeps contention visible in stats().
+
+Usage:
+    from modules.i2c_bus import get_bus
+    with get_bus(1).device(0x43, name="ups") as ups:
+        regs = ups.read_registers([0x01, 0x02, 0x03, 0x04])
+
+Drivers that expect an SMBus object (they pass the address on every call)
+get one from device.smbus(); its calls go through the same scheduler.
+"""
+import argparse
+import errno
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from modules import backend
+
+SMBus = backend.smbus_class()
+
+__all__ = [
+    "I2CBus",
+    "I2CDevice",
+    "get_bus",
+    "PRIORITY_HIGH",
+    "PRIORITY_NORMAL",
+    "PRIORITY_LOW",
+    "I2C_BLOCK_MAX",
+]
+
+# Lower values are served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Longest SMBus block transfer (bytes)
+I2C_BLOCK_MAX = 32
+
+# errno values the kernel reports when a device does not acknowledge
+_NACK_ERRNOS = {errno.ENXIO, errno.EREMOTEIO}
+
+
+class _Request:
+    __slots__ = ("address", "priority", "enqueued", "seq", "thread", "granted")
+
+    def __init__(self, address: int, priority: int, enqueued: float, seq: int, thread: int) -> None:
+        self.address = address
+        self.priority = priority
+        self.enqueued = enqueued
+        self.seq = seq
+        self.thread = thread
+        self.granted = False
+
+
+class _DeviceStats:
+    def __init__(self, name: str, priority: int, history: int) -> None:
+        self.name = name
+        self.priority = priority
+        self.transactions = 0
+        self.errors = 0
+        self.nacks = 0
+        self.contended = 0
+        self.latency = deque(maxlen=history)
+        self.waits = deque(maxlen=history)
+
+    def to_dict(self) -> dict:
+        latency_ms = np.asarray(self.latency, dtype=np.float64) * 1000.0
+        wait_ms = np.asarray(self.waits, dtype=np.float64) * 1000.0
+        return {
+            "name": self.name,
+            "priority": self.priority,
+            "transactions": self.transactions,
+            "errors": self.errors,
+            "nacks": self.nacks,
+            "contended": self.contended,
+            "latency_ms_mean": round(float(latency_ms.mean()), 3) if len(latency_ms) else None,
+            "latency_ms_p95": round(float(np.percentile(latency_ms, 95)), 3) if len(latency_ms) else None,
+            "wait_ms_mean": round(float(wait_ms.mean()), 3) if len(wait_ms) else None,
+            "wait_ms_p95": round(float(np.percentile(wait_ms, 95)), 3) if len(wait_ms) else None,
+            "wait_ms_max": round(float(wait_ms.max()), 3) if len(wait_ms) else None,
+        }
+
+
+class I2CBus:
+    """
+    Pooled SMBus handle and transaction scheduler for one bus.
+
+    :param bus_id: I2C bus number (/dev/i2c-N)
+    :param aging: Seconds of waiting that raise a request by one priority level
+    :param history: Latency and wait samples kept per device
+    """
+
+    def __init__(self, bus_id: int, aging: float = 0.02, history: int = 1000) -> None:
+        self.bus_id = bus_id
+        self.aging = aging
+        self.history = history
+        # Guards all state below; waiters are woken whenever the bus changes hands
+        self._cond = threading.Condition()
+        self._smbus = None
+        self._refs = 0
+        self._devices = {}
+        self._waiting = []
+        self._holder = None
+        self._depth = 0
+        self._seq = itertools.count()
+        self._turn = itertools.count(1)
+        self._last_served = {}
+        self.busy_s = 0.0
+        self.queue_max = 0
+
+    # --- handles ---------------------------------------------------------
+
+    def device(self, address: int, name: str = None, priority: int = PRIORITY_NORMAL,
+               block_reads: bool = True) -> "I2CDevice":
+        """
+        Take a handle to the device at `address`, opening the pooled SMBus
+        if this is the first handle. Handles to the same address share
+        their statistics. `block_reads` is False for devices that do not
+        support I2C block transfers; read_block() then reads byte by byte.
+        """
+        with self._cond:
+            if self._smbus is None:
+                self._smbus = SMBus(self.bus_id)
+            self._refs += 1
+            stats = self._devices.get(address)
+            if stats is None:
+                stats = self._devices[address] = _DeviceStats(name or f"0x{address:02x}", priority, self.history)
+        return I2CDevice(self, address, stats.name, priority, block_reads)
+
+    def _release_handle(self) -> None:
+        with self._cond:
+            self._refs -= 1
+            if self._refs <= 0 and self._smbus is not None:
+                self._refs = 0
+                try:
+                    self._smbus.close()
+                finally:
+                    self._smbus = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._smbus is not None
+
+    def scan(self, addresses=range(0x03, 0x78)) -> list:
+        """
+        The addresses that acknowledge a one-byte read (like i2cdetect -r),
+        including those claimed by a kernel driver (EBUSY). Each probe is
+        its own low-priority transaction, so a scan never holds the bus for
+        long; probes are not counted in the device stats.
+        """
+        with self._cond:
+            if self._smbus is None:
+                self._smbus = SMBus(self.bus_id)
+            self._refs += 1
+        found = []
+        try:
+            for address in addresses:
+                self._acquire(address, PRIORITY_LOW)
+                try:
+                    self._smbus.read_byte(address)
+                except OSError as e:
+                    if e.errno != errno.EBUSY:
+                        continue
+                finally:
+                    self._release()
+                found.append(address)
+        finally:
+            self._release_handle()
+        return found
+
+    # --- scheduling ------------------------------------------------------
+
+    def _pick(self, now: float) -> _Request:
+        # Caller holds self._cond
+        def key(request):
+            aged = request.priority - (now - request.enqueued) / self.aging if self.aging else request.priority
+            return aged, self._last_served.get(request.address, 0), request.seq
+        return min(self._waiting, key=key)
+
+    def _acquire(self, address: int, priority: int):
+        """
+        Wait for the bus. Returns the seconds spent queueing, or None if
+        this thread already holds the bus (a nested call in a transaction).
+        """
+        me = threading.get_ident()
+        with self._cond:
+            if self._holder == me:
+                self._depth += 1
+                return None
+            if self._smbus is None:
+                raise OSError(errno.EBADF, f"I2C bus {self.bus_id} is not open")
+            enqueued = time.monotonic()
+            if self._holder is None and not self._waiting:
+                self._holder = me
+                self._depth = 1
+                self._last_served[address] = next(self._turn)
+                return 0.0
+            request = _Request(address, priority, enqueued, next(self._seq), me)
+            self._waiting.append(request)
+            self.queue_max = max(self.queue_max, len(self._waiting))
+            while not request.granted:
+                self._cond.wait()
+            return time.monotonic() - enqueued
+
+    def _release(self) -> None:
+        with self._cond:
+            self._depth -= 1
+            if self._depth > 0:
+                return
+            if not self._waiting:
+                self._holder = None
+                return
+            request = self._pick(time.monotonic())
+            self._waiting.remove(request)
+            request.granted = True
+            self._holder = request.thread
+            self._depth = 1
+            self._last_served[request.address] = next(self._turn)
+            self._cond.notify_all()
+
+    @contextmanager
+    def _hold(self, address: int, priority: int):
+        waited = self._acquire(address, priority)
+        if waited is not None:
+            with self._cond:
+                stats = self._devices[address]
+                stats.waits.append(waited)
+                if waited > 0.0:
+                    stats.contended += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _execute(self, address: int, priority: int, method: str, args: tuple):
+        with self._hold(address, priority):
+            started = time.monotonic()
+            error = None
+            try:
+                return getattr(self._smbus, method)(*args)
+            except OSError as e:
+                error = e
+                raise
+            finally:
+                elapsed = time.monotonic() - started
+                with self._cond:
+                    stats = self._devices[address]
+                    stats.transactions += 1
+                    stats.latency.append(elapsed)
+                    self.busy_s += elapsed
+                    if error is not None:
+                        stats.errors += 1
+                        if error.errno in _NACK_ERRNOS:
+                            stats.nacks += 1
+
+    # --- reporting -------------------------------------------------------
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "bus": self.bus_id,
+                "open": self._smbus is not None,
+                "handles": self._refs,
+                "transactions": sum(s.transactions for s in self._devices.values()),
+                "busy_s": round(self.busy_s, 4),
+                "waiting": len(self._waiting),
+                "queue_max": self.queue_max,
+                "devices": {f"0x{address:02x}": s.to_dict() for address, s in self._devices.items()},
+            }
+
+
+class _SMBusProxy:
+    """
+    SMBus look-alike for drivers that keep their own bus object: every
+    method call is scheduled on the pooled handle and counted against the
+    device. close() is a no-op; the owning I2CDevice releases the handle.
+    """
+
+    def __init__(self, device: "I2CDevice") -> None:
+        self._device = device
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        device = self._device
+
+        def call(*args):
+            return device.bus._execute(device.address, device.priority, method, args)
+        return call
+
+    def close(self) -> None:
+        pass
+
+
+class I2CDevice:
+    """
+    One device on a shared bus. The SMBus methods take the register (not
+    the address); every call is one scheduled transaction. Use
+    transaction() to keep the bus for a sequence that must not be
+    interleaved with other devices.
+    """
+
+    def __init__(self, bus: I2CBus, address: int, name: str, priority: int, block_reads: bool) -> None:
+        self.bus = bus
+        self.address = address
+        self.name = name
+        self.priority = priority
+        self.block_reads = block_reads
+        self.closed = False
+
+    def __enter__(self) -> "I2CDevice":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _call(self, method: str, *args):
+        return self.bus._execute(self.address, self.priority, method, (self.address,) + args)
+
+    def transaction(self):
+        """Hold the bus for the calls made inside the `with` block (same thread only)."""
+        return self.bus._hold(self.address, self.priority)
+
+    def smbus(self) -> _SMBusProxy:
+        """An SMBus-compatible object routed through this handle."""
+        return _SMBusProxy(self)
+
+    # --- SMBus operations ------------------------------------------------
+
+    def read_byte(self) -> int:
+        return self._call("read_byte")
+
+    def write_byte(self, value: int) -> None:
+        self._call("write_byte", value)
+
+    def read_byte_data(self, register: int) -> int:
+        return self._call("read_byte_data", register)
+
+    def write_byte_data(self, register: int, value: int) -> None:
+        self._call("write_byte_data", register, value)
+
+    def read_word_data(self, register: int) -> int:
+        return self._call("read_word_data", register)
+
+    def write_word_data(self, register: int, value: int) -> None:
+        self._call("write_word_data", register, value)
+
+    def read_i2c_block_data(self, register: int, length: int = I2C_BLOCK_MAX) -> list:
+        return self._call("read_i2c_block_data", register, length)
+
+    def write_i2c_block_data(self, register: int, data) -> None:
+        self._call("write_i2c_block_data", register, list(data))
+
+    # --- batched reads ---------------------------------------------------
+
+    def read_block(self, register: int, length: int) -> list:
+        """
+        Read `length` consecutive registers starting at `register` in as few
+        transactions as the device allows (32-byte block reads, or single
+        bytes without block support), holding the bus throughout.
+        """
+        data = []
+        with self.transaction():
+            while len(data) < length:
+                if self.block_reads:
+                    count = min(I2C_BLOCK_MAX, length - len(data))
+                    data.extend(self.read_i2c_block_data(register + len(data), count))
+                else:
+                    data.append(self.read_byte_data(register + len(data)))
+        return data
+
+    def read_registers(self, registers) -> dict:
+        """
+        Read several registers in one bus hold: runs of consecutive
+        addresses become single block reads. Returns {register: value}.
+        """
+        registers = sorted(set(registers))
+        values = {}
+        with self.transaction():
+            start = 0
+            while start < len(registers):
+                end = start + 1
+                while end < len(registers) and registers[end] == registers[end - 1] + 1:
+                    end += 1
+                first = registers[start]
+                values.update(zip(registers[start:end], self.read_block(first, end - start)))
+                start = end
+        return values
+
+    def stats(self) -> dict:
+        with self.bus._cond:
+            return self.bus._devices[self.address].to_dict()
+
+    def close(self) -> None:
+        """Release this handle (the pooled SMBus closes with the last one)."""
+        if not self.closed:
+            self.closed = True
+            self.bus._release_handle()
+
+    def __repr__(self) -> str:
+        return f"I2CDevice(bus={self.bus.bus_id}, 0x{self.address:02x}, {self.name!r})"
+
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+
+def get_bus(bus_id: int = 1) -> I2CBus:
+    """The process-wide I2CBus for `bus_id`."""
+    with _buses_lock:
+        bus = _buses.get(bus_id)
+        if bus is None:
+            bus = _buses[bus_id] = I2CBus(bus_id)
+        return bus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise several I2C devices concurrently and report contention")
+    parser.add_argument("--bus", "-b", type=int, default=1, help="I2C bus number")
+    parser.add_argument("--address", "-a", action="append", type=lambda v: int(v, 0),
+                        help="Device address (repeatable; default 0x28 and 0x43)")
+    parser.add_argument("--seconds", "-s", type=float, default=2.0, help="How long each device is polled")
+    args = parser.parse_args()
+
+    bus = get_bus(args.bus)
+    stop = threading.Event()
+
+    def poll(device):
+        while not stop.is_set():
+            try:
+                device.read_block(0x00, 4)
+            except OSError:
+                time.sleep(0.01)
+
+    devices = [bus.device(address) for address in args.address or [0x28, 0x43]]
+    threads = [threading.Thread(target=poll, args=(device,), daemon=True) for device in devices]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    print(json.dumps(bus.stats(), indent=2))
+    for device in devices:
+        device.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 # neopixel_startup.py
 
-import time
-import board
-import neopixel
+import sys
+
+from modules import backend
+from modules.led_animation import ANIMATIONS, PlaybackStats, play, startup_wave
+
+board = backend.board_module()
+neopixel = backend.neopixel_module()
 
 def initialize_strip(
     pin=board.D18,
@@ -21,38 +25,36 @@ def initialize_strip(
     """
     return neopixel.NeoPixel(pin, num_pixels, brightness=brightness, auto_write=auto_write)
 
-def startup_test(strip: neopixel.NeoPixel, wait: float = 0.05) -> None:
+def startup_test(strip: neopixel.NeoPixel, wait: float = 0.05) -> PlaybackStats:
     """
     Runs a colour wave on the strip: red, then green, then blue, then white.
     Each LED lights in sequence with the given delay.
-    
+
+    The wave is precomputed (see led_animation.startup_wave) and played at a
+    fixed rate of one frame per `wait` seconds.
+
     Args:
         strip: NeoPixel object returned by initialize_strip.
         wait:  Delay (in seconds) between each LED update.
+
+    Returns:
+        PlaybackStats with the achieved frame rate and jitter.
     """
-    # Define the sequence of colours
-    colours = [
-        (255, 0, 0),    # red
-        (0, 255, 0),    # green
-        (0, 0, 255),    # blue
-        (255, 255, 255) # white
-    ]
-    
-    for colour in colours:
-        # wave this colour across the strip
-        for i in range(len(strip)):
-            strip.fill((0, 0, 0))   # clear previous
-            strip[i] = colour
-            strip.show()
-            time.sleep(wait)
-        # brief pause before next colour
-        time.sleep(wait * 10)
-    
-    # turn everything off at the end
-    strip.fill((0, 0, 0))
-    strip.show()
+    return play(strip, startup_wave(len(strip), fps=1.0 / wait))
+
+def run_animation(strip: neopixel.NeoPixel, name: str, **kwargs) -> PlaybackStats:
+    """
+    Play one of led_animation.ANIMATIONS ('startup', 'solid', 'breathe', 'rainbow') on the strip.
+
+    Args:
+        strip:  NeoPixel object returned by initialize_strip.
+        name:   Animation name.
+        kwargs: Passed to the animation factory (e.g. fps, colour, seconds).
+    """
+    return play(strip, ANIMATIONS[name](len(strip), **kwargs))
 
 if __name__ == "__main__":
     # Example usage when run as a script
     strip = initialize_strip()
-    startup_test(strip)
+    animation = sys.argv[1] if len(sys.argv) > 1 else "startup"
+    print(run_animation(strip, animation).summary())
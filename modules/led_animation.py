@@ -0,0 +1,222 @@
+# led_animation.py
+#
+# Frame-based NeoPixel animations. An Animation is a precomputed NumPy array
+# of frames (frames x pixels x 3, uint8) plus a frame rate; play() pushes
+# each frame to the strip in one slice assignment against a fixed-rate clock
+# (frame k is due at start + k / fps, so timing errors do not accumulate),
+# skips frames identical to the one already shown, drops frames it is too
+# late for, and reports the achieved FPS and frame-time jitter.
+
+import time
+
+import numpy as np
+
+__all__ = [
+    "Animation",
+    "PlaybackStats",
+    "play",
+    "startup_wave",
+    "solid",
+    "breathe",
+    "rainbow",
+    "ANIMATIONS",
+]
+
+OFF = (0, 0, 0)
+
+
+class Animation:
+    """
+    Precomputed frames and the rate to show them at.
+
+    Args:
+        name:   Label used in reports.
+        frames: Array of shape (frames, pixels, 3), converted to uint8.
+        fps:    Frames per second.
+    """
+
+    def __init__(self, name: str, frames, fps: float):
+        self.name = name
+        self.frames = np.ascontiguousarray(frames, dtype=np.uint8)
+        if self.frames.ndim != 3 or self.frames.shape[2] != 3:
+            raise ValueError(f"Animation frames must have shape (frames, pixels, 3), got {self.frames.shape}")
+        self.fps = float(fps)
+        # changed[k]: frame k differs from frame k - 1 (the first frame always counts)
+        self.changed = np.ones(len(self.frames), dtype=bool)
+        if len(self.frames) > 1:
+            self.changed[1:] = np.any(self.frames[1:] != self.frames[:-1], axis=(1, 2))
+        self._rows = None
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def pixels(self) -> int:
+        return self.frames.shape[1]
+
+    @property
+    def duration(self) -> float:
+        return len(self.frames) / self.fps
+
+    def rows(self) -> list:
+        """Frames as lists of (r, g, b) tuples, ready for slice assignment (computed once)."""
+        if self._rows is None:
+            self._rows = [list(map(tuple, frame.tolist())) for frame in self.frames]
+        return self._rows
+
+    def __add__(self, other: "Animation") -> "Animation":
+        if other.fps != self.fps or other.pixels != self.pixels:
+            raise ValueError("Only animations with the same fps and pixel count can be joined")
+        return Animation(f"{self.name}+{other.name}", np.concatenate([self.frames, other.frames]), self.fps)
+
+    def __repr__(self) -> str:
+        return f"Animation({self.name!r}, {len(self)} frames, {self.pixels} px, {self.fps:g} fps)"
+
+
+class PlaybackStats:
+    """
+    Timing of one play() call.
+
+    `shown` frames were written to the strip, `skipped` were identical to the
+    previous frame, and `dropped` were already late by a whole frame period.
+    `jitter_ms` is the standard deviation of the write-time error and
+    `late_ms_max` the worst lateness of a written frame.
+    """
+
+    def __init__(self, name, frames, shown, skipped, dropped, elapsed_s, target_fps, errors):
+        self.name = name
+        self.frames = frames
+        self.shown = shown
+        self.skipped = skipped
+        self.dropped = dropped
+        self.elapsed_s = elapsed_s
+        self.target_fps = target_fps
+        self.fps = (frames - dropped) / elapsed_s if elapsed_s > 0 else 0.0
+        errors = np.asarray(errors, dtype=np.float64) * 1000.0
+        self.jitter_ms = float(errors.std()) if len(errors) > 1 else 0.0
+        self.late_ms_max = float(errors.max()) if len(errors) else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "frames": self.frames,
+            "shown": self.shown,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+            "elapsed_s": round(self.elapsed_s, 4),
+            "target_fps": self.target_fps,
+            "fps": round(self.fps, 2),
+            "jitter_ms": round(self.jitter_ms, 3),
+            "late_ms_max": round(self.late_ms_max, 3),
+        }
+
+    def summary(self) -> str:
+        return (f"{self.name}: {self.fps:.1f}/{self.target_fps:g} fps over {self.elapsed_s:.2f}s, "
+                f"jitter {self.jitter_ms:.2f} ms (max late {self.late_ms_max:.2f} ms), "
+                f"{self.shown} written, {self.skipped} unchanged, {self.dropped} dropped")
+
+
+def play(strip, animation: Animation, stop_event=None, clear: bool = True) -> PlaybackStats:
+    """
+    Show `animation` on `strip` at its frame rate.
+
+    Args:
+        strip:      NeoPixel object (auto_write should be False).
+        animation:  Animation whose pixel count matches the strip.
+        stop_event: Optional threading.Event that ends playback early.
+        clear:      Turn the strip off afterwards.
+    """
+    if animation.pixels != len(strip):
+        raise ValueError(f"{animation!r} does not match a {len(strip)}-pixel strip")
+    rows = animation.rows()
+    period = 1.0 / animation.fps
+    shown = skipped = dropped = 0
+    errors = []
+    # Index of a frame identical to what the strip currently shows
+    current = None
+    start = time.monotonic()
+    for k, row in enumerate(rows):
+        if stop_event is not None and stop_event.is_set():
+            break
+        due = start + k * period
+        now = time.monotonic()
+        if now < due:
+            time.sleep(due - now)
+            now = time.monotonic()
+        elif now - due >= period and k + 1 < len(rows):
+            # A whole period late: drop this frame rather than slip the schedule
+            dropped += 1
+            continue
+        if current is not None and (not animation.changed[k] if current == k - 1
+                                    else np.array_equal(animation.frames[k], animation.frames[current])):
+            skipped += 1
+            current = k
+            continue
+        strip[:] = row
+        strip.show()
+        errors.append(time.monotonic() - due)
+        shown += 1
+        current = k
+    # The last frame is held for its full period
+    end = start + len(rows) * period
+    now = time.monotonic()
+    if stop_event is None or not stop_event.is_set():
+        if now < end:
+            time.sleep(end - now)
+    elapsed = time.monotonic() - start
+    if clear:
+        strip.fill(OFF)
+        strip.show()
+    return PlaybackStats(animation.name, len(rows), shown, skipped, dropped, elapsed, animation.fps, errors)
+
+
+# --- animations ----------------------------------------------------------
+
+def startup_wave(pixels: int, fps: float = 50.0, colours=None, pause_frames: int = 10) -> Animation:
+    """
+    One lit pixel sweeping the strip in red, then green, blue and white; the
+    last pixel stays lit for `pause_frames` frames between colours.
+    """
+    colours = colours or [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+    per_colour = pixels + pause_frames
+    frames = np.zeros((len(colours) * per_colour, pixels, 3), dtype=np.uint8)
+    sweep = np.arange(pixels)
+    for c, colour in enumerate(colours):
+        base = c * per_colour
+        frames[base + sweep, sweep] = colour
+        frames[base + pixels:base + per_colour, pixels - 1] = colour
+    return Animation("startup", frames, fps)
+
+
+def solid(pixels: int, colour, seconds: float = 1.0, fps: float = 50.0) -> Animation:
+    """The whole strip in one colour."""
+    count = max(1, int(round(seconds * fps)))
+    return Animation("solid", np.broadcast_to(np.asarray(colour, dtype=np.uint8), (count, pixels, 3)), fps)
+
+
+def breathe(pixels: int, colour=(0, 0, 255), period: float = 3.0, cycles: int = 1, fps: float = 50.0,
+            floor: float = 0.05) -> Animation:
+    """Whole-strip brightness following a raised cosine between `floor` and full."""
+    t = np.arange(int(round(period * cycles * fps))) / fps
+    level = floor + (1.0 - floor) * 0.5 * (1.0 - np.cos(2.0 * np.pi * t / period))
+    frames = np.rint(level[:, None, None] * np.asarray(colour, dtype=np.float64)[None, None, :])
+    return Animation("breathe", np.broadcast_to(frames, (len(t), pixels, 3)), fps)
+
+
+def rainbow(pixels: int, seconds: float = 3.0, fps: float = 50.0, speed: float = 1.0) -> Animation:
+    """A hue gradient along the strip, rotating `speed` times per second."""
+    t = np.arange(int(round(seconds * fps)))[:, None] / fps
+    hue = (np.arange(pixels)[None, :] / pixels + speed * t) % 1.0
+    # HSV -> RGB with full saturation and value
+    h6 = hue * 6.0
+    rgb = np.stack([np.abs(h6 - 3.0) - 1.0, 2.0 - np.abs(h6 - 2.0), 2.0 - np.abs(h6 - 4.0)], axis=-1)
+    return Animation("rainbow", np.rint(np.clip(rgb, 0.0, 1.0) * 255.0), fps)
+
+
+# Animation factories by name: ANIMATIONS[name](pixels, ...)
+ANIMATIONS = {
+    "startup": startup_wave,
+    "solid": solid,
+    "breathe": breathe,
+    "rainbow": rainbow,
+}
@@ -0,0 +1,270 @@
+# led_status.py
+#
+# Background status display on the NeoPixel strip. LEDStatusService owns the
+# strip and renders it from its own thread; other threads only enqueue
+# commands (queue.SimpleQueue: put never blocks), so a test never waits on
+# LED I/O. The strip is split into one segment per component, each showing
+# a progress bar, a pass/fail colour or, while unassigned, a slow breathing
+# idle pattern. Commands are coalesced: the strip is written only when the
+# rendered frame changes, and never more often than max_fps. stop() cuts a
+# playing animation short and waits for the thread, so only one thread ever
+# writes the strip.
+
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from modules import backend
+from modules.led_animation import play
+
+board = backend.board_module()
+neopixel = backend.neopixel_module()
+
+__all__ = ["LEDStatusService", "start_service", "get_service", "stop_service"]
+
+PASS_COLOUR = (0, 160, 0)
+FAIL_COLOUR = (200, 0, 0)
+PROGRESS_COLOUR = (0, 60, 255)
+IDLE_COLOUR = (0, 0, 60)
+
+# A time-based progress bar stops here until the component reports a result
+RUNNING_CAP = 0.95
+
+_STOP = object()
+
+
+def split_segments(names, pixels: int) -> dict:
+    """Split `pixels` into contiguous, near-equal segments, one per name: {name: (start, end)}."""
+    names = list(names)
+    bounds = np.linspace(0, pixels, len(names) + 1).round().astype(int)
+    return {name: (int(bounds[i]), int(bounds[i + 1])) for i, name in enumerate(names)}
+
+
+class LEDStatusService:
+    """
+    Thread that owns a NeoPixel strip and shows per-component status.
+
+    Args:
+        names:       Component names; each gets a segment of the strip.
+        strip:       NeoPixel object to own; created on `pin` when None.
+        max_fps:     Upper bound on strip writes per second.
+        pixels:      Strip length (only used when the strip is created here).
+        pin:         Data pin (only used when the strip is created here).
+        brightness:  Global brightness (only used when the strip is created here).
+        idle_period: Seconds per breath of the idle pattern.
+    """
+
+    def __init__(self, names, strip=None, max_fps: float = 30.0, pixels: int = 72, pin=board.D12,
+                 brightness: float = 1.0, idle_period: float = 4.0):
+        self._owns_strip = strip is None
+        if strip is None:
+            strip = neopixel.NeoPixel(pin, pixels, brightness=brightness, auto_write=False)
+        self.strip = strip
+        self.segments = split_segments(names, len(strip))
+        self.max_fps = max_fps
+        self.idle_period = idle_period
+        self._commands = queue.SimpleQueue()
+        # Set by stop(): ends an animation that is playing
+        self._stopping = threading.Event()
+        self._state = {}
+        self._thread = None
+        self._frame = None
+        self.started_at = None
+        self.commands = 0
+        self.frames_shown = 0
+        self.frames_unchanged = 0
+
+    def __enter__(self) -> "LEDStatusService":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    # --- commands (any thread, never block) ------------------------------
+
+    def progress(self, name: str, fraction: float, colour=PROGRESS_COLOUR) -> None:
+        """Fill `fraction` (0..1) of the component's segment."""
+        self._commands.put(("progress", name, max(0.0, min(1.0, fraction)), colour))
+
+    def running(self, name: str, estimate: float, colour=PROGRESS_COLOUR) -> None:
+        """Show a progress bar that advances with time over `estimate` seconds (capped before full)."""
+        self._commands.put(("running", name, time.monotonic(), max(estimate, 1e-3), colour))
+
+    def result(self, name: str, passed: bool) -> None:
+        """Show the component's pass/fail colour across its segment."""
+        self._commands.put(("result", name, bool(passed)))
+
+    def clear(self, name: str = None) -> None:
+        """Return one component (or all) to the idle pattern."""
+        self._commands.put(("clear", name))
+
+    def play(self, animation) -> Future:
+        """
+        Play an Animation over the whole strip, then resume the status
+        display. Commands sent meanwhile are applied afterwards. The returned
+        future resolves to the PlaybackStats.
+        """
+        future = Future()
+        self._commands.put(("play", animation, future))
+        return future
+
+    # --- thread ----------------------------------------------------------
+
+    def start(self) -> "LEDStatusService":
+        if self._thread is None:
+            self.started_at = time.monotonic()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="led-status", daemon=True)
+            self._thread.start()
+        return self
+
+    def healthy(self) -> bool:
+        """True while the render thread runs."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self) -> None:
+        """
+        Finish pending commands (cutting a playing animation short), stop the
+        thread and turn the strip off. Animations queued behind the stop are
+        cancelled.
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._commands.put(_STOP)
+        # The strip is only touched here once the render thread has finished with it
+        self._thread.join()
+        self._thread = None
+        while True:
+            try:
+                command = self._commands.get_nowait()
+            except queue.Empty:
+                break
+            if command is not _STOP and command[0] == "play":
+                command[2].cancel()
+        self.strip.fill((0, 0, 0))
+        self.strip.show()
+        if self._owns_strip and hasattr(self.strip, "deinit"):
+            self.strip.deinit()
+
+    def _apply(self, command) -> bool:
+        """Update the state from one command. Returns False on the stop sentinel."""
+        if command is _STOP:
+            return False
+        self.commands += 1
+        kind = command[0]
+        if kind == "clear":
+            if command[1] is None:
+                self._state.clear()
+            else:
+                self._state.pop(command[1], None)
+        elif kind == "play":
+            _, animation, future = command
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(play(self.strip, animation, stop_event=self._stopping))
+                except Exception as e:
+                    future.set_exception(e)
+                self._frame = None
+        elif command[1] in self.segments:
+            self._state[command[1]] = command
+        return True
+
+    def _animating(self) -> bool:
+        if self.idle_period and len(self._state) < len(self.segments):
+            return True
+        return any(s[0] == "running" for s in self._state.values())
+
+    def _render(self, now: float) -> np.ndarray:
+        frame = np.zeros((len(self.strip), 3), dtype=np.uint8)
+        if self.idle_period:
+            level = 0.15 + 0.85 * 0.5 * (1.0 - math.cos(2.0 * math.pi * (now - self.started_at) / self.idle_period))
+        else:
+            level = 0.0
+        for name, (start, end) in self.segments.items():
+            state = self._state.get(name)
+            if state is None:
+                frame[start:end] = np.rint(np.asarray(IDLE_COLOUR) * level)
+            elif state[0] == "result":
+                frame[start:end] = PASS_COLOUR if state[2] else FAIL_COLOUR
+            else:
+                if state[0] == "progress":
+                    fraction, colour = state[2], state[3]
+                else:
+                    fraction, colour = min(RUNNING_CAP, (now - state[2]) / state[3]), state[4]
+                lit = int(round(fraction * (end - start)))
+                frame[start:end] = np.asarray(colour) // 8
+                frame[start:start + lit] = colour
+        return frame
+
+    def _run(self) -> None:
+        period = 1.0 / self.max_fps
+        next_write = time.monotonic()
+        dirty = True
+        while True:
+            # Block for the first command only as long as the display needs
+            if dirty or self._animating():
+                timeout = max(next_write - time.monotonic(), 0.0)
+            else:
+                timeout = None
+            try:
+                command = self._commands.get(timeout=timeout) if timeout != 0.0 else self._commands.get_nowait()
+                if not self._apply(command):
+                    return
+                dirty = True
+                # Coalesce everything else already queued into this frame
+                while True:
+                    if not self._apply(self._commands.get_nowait()):
+                        return
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            if now < next_write or not (dirty or self._animating()):
+                continue
+            frame = self._render(now)
+            if self._frame is None or not np.array_equal(frame, self._frame):
+                self.strip[:] = list(map(tuple, frame.tolist()))
+                self.strip.show()
+                self._frame = frame
+                self.frames_shown += 1
+            else:
+                self.frames_unchanged += 1
+            dirty = False
+            next_write = now + period
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "commands": self.commands,
+            "frames_shown": self.frames_shown,
+            "frames_unchanged": self.frames_unchanged,
+            "fps": round(self.frames_shown / elapsed, 2) if elapsed > 0 else 0.0,
+            "max_fps": self.max_fps,
+        }
+
+
+_service = None
+
+
+def start_service(names, **kwargs) -> LEDStatusService:
+    """Start the process-wide status service (replacing a running one)."""
+    global _service
+    stop_service()
+    _service = LEDStatusService(names, **kwargs).start()
+    return _service
+
+
+def get_service():
+    """The running status service, or None."""
+    return _service
+
+
+def stop_service() -> None:
+    global _service
+    if _service is not None:
+        _service.stop()
+        _service = None
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Module: load_cell_array.py
+
+Several HX711 load cells (weighing zones) sampled concurrently and read with
+one call.
+
+Channels that share a PD_SCK pin are read as one HX711Bank: a single clock
+train converts all of them, so their samples carry identical timestamps.
+Every other channel gets its own HX711 driver and acquisition thread. A
+read runs the robust estimator on every channel in parallel, so it takes
+as long as the slowest zone rather than the sum of all of them.
+
+Stored calibrations (calibration_store.py) replace the configs' constants
+for channels whose hardware fingerprint matches; those channels get one
+concurrent empty-platform drift check at startup instead of a tare.
+
+Usage:
+    with LoadCellArray([
+        {'name': 'left', 'dout_pin': 5, 'pd_sck_pin': 6, 'reference_unit': -237.63, 'zero_offset': 2230937.88},
+        {'name': 'right', 'dout_pin': 13, 'pd_sck_pin': 6, 'reference_unit': -241.10, 'zero_offset': 2190021.0},
+    ]) as scales:
+        reading = scales.read()
+        print(reading.zones['left'].value, reading.total)
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules import backend
+from modules import load_cells
+from modules.calibration_store import apply_stored_calibration
+from modules.hx711_acquisition import HX711BankAcquisition
+from modules.weight_estimator import RobustWeightEstimator, estimate_buffered
+
+HX711Bank = backend.hx711_bank_class()
+
+__all__ = [
+    'LoadCellChannel',
+    'LoadCellArray',
+    'ArrayReading',
+    'prompt_and_read_array',
+]
+
+
+class LoadCellChannel:
+    """
+    One weighing zone: its config, calibration and sample source.
+    """
+
+    def __init__(self, name, config, engine, hx=None, calibration=None):
+        self.name = name
+        self.config = config
+        self.engine = engine
+        self.hx = hx
+        self.reference_unit = config['reference_unit']
+        self.zero_offset = config.get('zero_offset', 0)
+        self.calibration = calibration
+        self.calibration_status = 'config' if calibration is None else 'stored'
+
+    def __repr__(self):
+        return (f"LoadCellChannel({self.name!r}, dout={self.config['dout_pin']}, "
+                f"sck={self.config['pd_sck_pin']})")
+
+
+class ArrayReading:
+    """
+    One reading of every zone: per-zone WeightEstimates, their total and how
+    far apart in time the zones' newest samples were.
+    """
+
+    def __init__(self, zones, elapsed_s=0.0):
+        self.zones = zones
+        self.elapsed_s = elapsed_s
+        values = [z.value for z in zones.values()]
+        self.total = None if any(v is None for v in values) else sum(values)
+        self.settled = all(z.settled for z in zones.values())
+        stamps = [z.timestamp for z in zones.values() if z.timestamp is not None]
+        self.timestamp = min(stamps) if stamps else None
+        self.skew_s = max(stamps) - min(stamps) if stamps else 0.0
+
+    def to_dict(self):
+        return {
+            'zones': {name: z.to_dict() for name, z in self.zones.items()},
+            'total': self.total,
+            'settled': self.settled,
+            'skew_s': round(self.skew_s, 6),
+            'elapsed_s': round(self.elapsed_s, 4),
+        }
+
+    def summary(self, unit='g'):
+        lines = [f'{name}: {z.summary(unit)}' for name, z in self.zones.items()]
+        total = 'n/a' if self.total is None else f'{self.total:.2f} {unit}'
+        lines.append(f'Total: {total} ({"settled" if self.settled else "not settled"}, '
+                     f'skew {self.skew_s * 1000:.1f} ms, {self.elapsed_s:.2f}s)')
+        return '\n'.join(lines)
+
+
+class LoadCellArray:
+    """
+    Concurrently sampled HX711 channels.
+
+    :param configs: List of channel dicts with 'dout_pin', 'pd_sck_pin',
+                    'reference_unit', 'zero_offset' and optionally 'name'
+                    (defaults to 'zone<N>') and 'gain'.
+    :param capacity: Ring buffer size (samples) per channel
+    :param shared_clock: Read channels sharing a PD_SCK pin as one bank;
+                         if False every channel gets its own driver
+                         (only valid when no two channels share a clock pin)
+    :param use_calibration: Prefer stored calibrations over the configs' constants
+    :param store: CalibrationStore to look in (the default store if None)
+    """
+
+    def __init__(self, configs, capacity=1024, shared_clock=True, use_calibration=True, store=None):
+        if not configs:
+            raise ValueError('LoadCellArray needs at least one channel config')
+        self.configs = [dict(c, name=c.get('name', f'zone{i + 1}')) for i, c in enumerate(configs)]
+        names = [c['name'] for c in self.configs]
+        if len(set(names)) != len(names):
+            raise ValueError(f'Duplicate load cell channel names: {names}')
+        self.capacity = capacity
+        self.shared_clock = shared_clock
+        self.channels = {}
+        self.banks = []
+        self._executor = None
+        self._calibrations = {}
+        if use_calibration:
+            for i, config in enumerate(self.configs):
+                self.configs[i], self._calibrations[config['name']] = apply_stored_calibration(config, store)
+        self._start()
+        calibrated = [name for name, channel in self.channels.items() if channel.calibration is not None]
+        if calibrated:
+            self.check_drift(calibrated)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _start(self):
+        groups = {}
+        for config in self.configs:
+            groups.setdefault(config['pd_sck_pin'], []).append(config)
+        for sck, members in groups.items():
+            if len(members) > 1 and self.shared_clock:
+                bank = HX711Bank(sck, [c['dout_pin'] for c in members], gain=members[0].get('gain', 128))
+                engine = load_cells.register_acquisition(
+                    HX711BankAcquisition(bank, capacity=self.capacity).start())
+                self.banks.append(bank)
+                for i, config in enumerate(members):
+                    self.channels[config['name']] = LoadCellChannel(config['name'], config, engine.channel(i),
+                                                                    calibration=self._calibrations.get(config['name']))
+            else:
+                if len(members) > 1:
+                    raise ValueError(f'Channels {[c["name"] for c in members]} share PD_SCK pin {sck}; '
+                                     f'they can only be read with shared_clock=True')
+                config = members[0]
+                calibration = self._calibrations.get(config['name'])
+                # The stored record (already applied to config) also spares the reset/tare
+                hx = load_cells.setup_scale(config, capacity=self.capacity, use_calibration=False,
+                                            calibration=calibration)
+                self.channels[config['name']] = LoadCellChannel(config['name'], config, hx.acquisition, hx,
+                                                                calibration=calibration)
+        # Keep the configured order regardless of clock grouping
+        self.channels = {c['name']: self.channels[c['name']] for c in self.configs}
+        self._executor = ThreadPoolExecutor(max_workers=len(self.channels), thread_name_prefix='load-cell')
+
+    @property
+    def names(self):
+        return list(self.channels)
+
+    def _measure(self, channel, max_samples, since, tolerance, window, max_time):
+        estimator = RobustWeightEstimator(channel.zero_offset, channel.reference_unit, tolerance=tolerance,
+                                          window=window, max_samples=max_samples)
+        return estimate_buffered(channel.engine, estimator, since, max_time)
+
+    def read(self, max_samples=100, since=None, tolerance=load_cells.SETTLE_TOLERANCE,
+             window=load_cells.SETTLE_WINDOW, max_time=load_cells.READ_TIMEOUT, names=None):
+        """
+        Measure every zone (or only `names`) concurrently.
+
+        :param since: Only use samples taken at or after this time.monotonic() value
+        :param tolerance: Settling tolerance per zone, in grams (counts for uncalibrated channels)
+        :return: ArrayReading with per-zone WeightEstimates and the total
+        """
+        t0 = time.monotonic()
+        selected = [self.channels[n] for n in (names or self.channels)]
+        futures = {c.name: self._executor.submit(self._measure, c, max_samples, since, tolerance, window, max_time)
+                   for c in selected}
+        zones = {name: future.result() for name, future in futures.items()}
+        return ArrayReading(zones, time.monotonic() - t0)
+
+    def tare(self, max_samples=100, tolerance=load_cells.SETTLE_TOLERANCE):
+        """
+        Zero every channel on the current (empty) load. Returns {name: new zero_offset}.
+        """
+        reading = self.read(max_samples=max_samples, tolerance=tolerance)
+        offsets = {}
+        for name, estimate in reading.zones.items():
+            channel = self.channels[name]
+            if estimate.value is None:
+                continue
+            # The estimate is in calibrated units; convert the residual back to counts
+            channel.zero_offset += estimate.value * channel.reference_unit
+            offsets[name] = channel.zero_offset
+        return offsets
+
+    def check_drift(self, names=None, tolerance=load_cells.DRIFT_TOLERANCE):
+        """
+        Weigh the (empty) zones concurrently and re-zero any that read more
+        than `tolerance` grams. Returns the ArrayReading.
+        """
+        reading = self.read(max_samples=3 * load_cells.SETTLE_WINDOW, names=names)
+        for name, estimate in reading.zones.items():
+            if estimate.value is not None and abs(estimate.value) > tolerance:
+                channel = self.channels[name]
+                print(f"❌ Stored calibration of {name} drifted by {estimate.value:.2f} g; re-zeroing.")
+                channel.zero_offset += estimate.value * channel.reference_unit
+                channel.calibration_status = 'retared'
+        return reading
+
+    def healthy(self):
+        """
+        True while every channel's acquisition thread is sampling.
+        """
+        return self._executor is not None and all(c.engine.running for c in self.channels.values())
+
+    def set_calibration(self, name, reference_unit=None, zero_offset=None):
+        channel = self.channels[name]
+        if reference_unit is not None:
+            channel.reference_unit = reference_unit
+        if zero_offset is not None:
+            channel.zero_offset = zero_offset
+
+    def close(self):
+        """
+        Stop sampling and release the banks' pins. Pins of single-chip
+        channels are released by load_cells.cleanup().
+        """
+        stopped = set()
+        for channel in self.channels.values():
+            engine = getattr(channel.engine, 'engine', channel.engine)
+            if id(engine) not in stopped:
+                engine.stop()
+                stopped.add(id(engine))
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for bank in self.banks:
+            bank.close()
+
+
+def prompt_and_read_array(configs, readings=30, scales=None, prompt=True):
+    """
+    Prompt the user to place weight and press Enter, then read every zone once.
+
+    :param configs: Channel configs for LoadCellArray
+    :param readings: Maximum number of samples per zone
+    :param scales: Running LoadCellArray to read (left running); without
+                   it one is set up and cleaned up here. There is no prompt
+                   with `scales` (the hardware daemon has no console): the
+                   weight must already be in place.
+    :param prompt: Wait for Enter before the reading; skipped anyway when
+                   stdin is not a terminal (non-interactive runs), so the
+                   platform is read as it is and the caller must check the
+                   load itself
+    :return: ArrayReading
+    """
+    if scales is not None:
+        reading = scales.read(max_samples=readings, since=time.monotonic())
+        print(reading.summary())
+        return reading
+    scales = LoadCellArray(configs)
+    try:
+        print(scales.read(max_samples=readings).summary())
+        if prompt and sys.stdin.isatty():
+            input("Press Enter when the weight(s) have been placed on the platform...")
+        elif prompt:
+            print("No terminal to prompt on; reading the platform as it is.")
+        reading = scales.read(max_samples=readings, since=time.monotonic())
+        print(reading.summary())
+        return reading
+    finally:
+        scales.close()
+        load_cells.cleanup()
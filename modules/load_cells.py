@@ -5,13 +5,33 @@ Module: hx711_module.py
 Provides importable functions to initialize, read (with zero-offset and calibration), and clean up
 readings from a single HX711 load cell amplifier connected to a Raspberry Pi.
 Handles different HX711 library variants gracefully.
+
+setup_scale starts a background acquisition engine (see hx711_acquisition.py)
+that samples continuously, so read_weight answers from already-buffered
+samples; cleanup() stops every engine before releasing the GPIOs. The
+HX711 pins are claimed and released through the shared GPIO manager, so
+other components' pins stay configured and a conflicting claim is refused.
+
+Readings are robust estimates (see weight_estimator.py): glitch samples and
+outliers are rejected and sampling stops as soon as the scale has settled.
+
+When calibration_store.py holds a calibration for the channel with a
+matching hardware fingerprint, setup_scale uses it instead of the config's
+constants and skips the reset/tare, provided a quick drift check of the
+empty platform passes.
 """
 
 import time
-import RPi.GPIO as GPIO
-from hx711 import HX711
 
-__version__ = "1.4"
+from modules import backend
+from modules.calibration_store import apply_stored_calibration
+from modules.hx711_acquisition import HX711Acquisition, select_reader
+from modules.hx711_bank import claim_pins
+from modules.weight_estimator import RobustWeightEstimator, estimate_buffered, estimate_stream
+
+HX711 = backend.hx711_class()
+
+__version__ = "1.5"
 
 # Default HX711 configuration: BCM pin numbers, calibration factor, and zero offset
 DEFAULT_CONFIG = {
@@ -21,21 +41,55 @@ DEFAULT_CONFIG = {
     "zero_offset": 0,
 }
 
+# Seconds read_weight waits for samples the engine has not produced yet
+READ_TIMEOUT = 5.0
+
+# Settling rule for weight readings: window agreement in grams and window size in samples
+SETTLE_TOLERANCE = 0.5
+SETTLE_WINDOW = 10
 
-def setup_scale(config=None):
+# Largest empty-platform reading (grams) for which a stored calibration is trusted as is
+DRIFT_TOLERANCE = 2.0
+
+# Engines started by setup_scale, stopped by cleanup()
+_engines = []
+# GPIO manager claims on the HX711 pins taken by setup_scale, released by cleanup()
+_claims = []
+
+
+def setup_scale(config=None, acquire=True, capacity=1024, use_calibration=True, store=None, calibration=None):
     """
     Initialize GPIO and an HX711 instance with the given config.
     Attaches zero_offset and reference_unit values for downstream weight calculations.
 
-    :param config: Dict with keys 'dout_pin', 'pd_sck_pin', 'reference_unit', 'zero_offset'.
-                   If None, uses DEFAULT_CONFIG.
-    :return: Initialized HX711 instance with attributes 'reference_unit' and 'zero_offset'.
+    :param config: Dict with keys 'dout_pin', 'pd_sck_pin', 'reference_unit', 'zero_offset'
+                   (and optionally 'name'). If None, uses DEFAULT_CONFIG.
+    :param acquire: Start a background acquisition engine, attached as 'acquisition'
+    :param capacity: Ring buffer size (samples) of the acquisition engine
+    :param use_calibration: Prefer a stored calibration over the config's constants
+    :param store: CalibrationStore to look in (the default store if None)
+    :param calibration: Stored Calibration the caller already applied to `config`
+                        (see apply_stored_calibration); skips reset/tare like a
+                        looked-up one, but the drift check is left to the caller
+    :return: Initialized HX711 instance with attributes 'reference_unit', 'zero_offset',
+             'acquisition' (None when acquire is False), 'calibration' (the stored
+             Calibration or None) and 'calibration_status' ('stored', 'retared' or 'config').
     """
     if config is None:
         config = DEFAULT_CONFIG
+    looked_up = use_calibration and calibration is None
+    if looked_up:
+        config, calibration = apply_stored_calibration(config, store)
 
-    GPIO.setmode(GPIO.BCM)
-    hx = HX711(dout_pin=config['dout_pin'], pd_sck_pin=config['pd_sck_pin'])
+    # Claimed before the driver configures them, so a conflicting claim is refused
+    claims = claim_pins(config['pd_sck_pin'], [config['dout_pin']])
+    try:
+        hx = HX711(dout_pin=config['dout_pin'], pd_sck_pin=config['pd_sck_pin'])
+    except Exception:
+        for claim in claims:
+            claim.release()
+        raise
+    _claims.extend(claims)
 
     # Attempt library-specific setup methods (format & scale) without affecting raw reads
     if hasattr(hx, 'set_reading_format'):
@@ -55,83 +109,134 @@ def setup_scale(config=None):
         except Exception:
             pass
 
-    # Reset/tare if supported
-    for method in ('reset', 'tare'):
-        if hasattr(hx, method):
-            try:
-                getattr(hx, method)()
-            except Exception:
-                pass
+    # Reset/tare if supported (not needed with a stored calibration)
+    if calibration is None:
+        for method in ('reset', 'tare'):
+            if hasattr(hx, method):
+                try:
+                    getattr(hx, method)()
+                except Exception:
+                    pass
 
     # Store calibration parameters for manual weight computation
     setattr(hx, 'reference_unit', config['reference_unit'])
     setattr(hx, 'zero_offset', config.get('zero_offset', 0))
+    setattr(hx, 'calibration', calibration)
+    setattr(hx, 'calibration_status', 'config' if calibration is None else 'stored')
+
+    engine = None
+    if acquire:
+        engine = start_acquisition(hx, capacity)
+    setattr(hx, 'acquisition', engine)
+
+    if looked_up and calibration is not None:
+        check_drift(hx)
 
     return hx
 
 
-def _raw_read(hx):
+def check_drift(hx, tolerance=DRIFT_TOLERANCE):
     """
-    Fallback raw read for HX711 variants.
+    Weigh the (empty) platform and re-zero if it reads more than `tolerance`
+    grams, i.e. if the stored zero_offset no longer holds.
+
+    :return: The empty-platform WeightEstimate
     """
-    if hasattr(hx, '_read'):
-        return hx._read()
-    raise AttributeError('No supported raw read method on HX711 object')
+    estimate = measure_weight(hx, max_samples=3 * SETTLE_WINDOW)
+    if estimate.value is None:
+        return estimate
+    if abs(estimate.value) > tolerance:
+        print(f"❌ Stored calibration drifted by {estimate.value:.2f} g; re-zeroing.")
+        hx.zero_offset += estimate.value * hx.reference_unit
+        hx.calibration_status = 'retared'
+    return estimate
 
 
-def read_weight(hx, readings=20):
+def start_acquisition(hx, capacity=1024):
     """
-    Read an averaged weight measurement (in grams) from the provided HX711 instance,
-    applying zero_offset and reference_unit.
+    Start continuous sampling of `hx` on a background thread.
 
-    :param hx: HX711 instance returned by setup_scale
-    :param readings: Number of raw samples to average
-    :return: Weight in grams (float)
-    """
-    # Read raw counts, preferring bulk average if available
-    # if hasattr(hx, 'read_average'):
-    #     try:
-    #         raw = hx.read_average(readings)
-    #     except Exception:
-    #         raw = sum(_raw_read(hx) for _ in range(readings)) / readings
-    # else:
-    #     values = []
-    #     for _ in range(readings):
-    #         if hasattr(hx, 'read'):
-    #             val = hx.read(1)
-    #         else:
-    #             val = _raw_read(hx)
-    #         values.append(val)
-    #     raw = sum(values) / len(values)
+    :return: The running HX711Acquisition (also stopped by cleanup()).
+    """
+    return register_acquisition(HX711Acquisition(hx, capacity=capacity).start())
+
+
+def register_acquisition(engine):
+    """
+    Have cleanup() stop `engine` (e.g. one started by a LoadCellArray). Returns the engine.
+    """
+    _engines.append(engine)
+    return engine
+
+
+def stop_acquisition(hx):
+    """
+    Stop the background engine attached to `hx` by setup_scale, if any.
+    """
+    engine = getattr(hx, 'acquisition', None)
+    if engine is not None:
+        engine.stop()
+        if engine in _engines:
+            _engines.remove(engine)
+        hx.acquisition = None
+
+
+def read_raw_samples(hx, readings=20, since=None, timeout=READ_TIMEOUT):
+    """
+    Return up to `readings` raw counts, newest last.
+
+    With a running acquisition engine the samples come from its buffer and the
+    call returns at once when enough are buffered. Otherwise they are read
+    synchronously.
 
+    :param since: Only use samples taken at or after this time.monotonic() value
+    """
+    engine = getattr(hx, 'acquisition', None)
+    if engine is not None and engine.running:
+        return engine.samples(readings, since=since, timeout=timeout)[1].tolist()
+    read = select_reader(hx)
     values = []
-    for _ in range(readings):
-        if hasattr(hx, 'read'):
-            val = hx.read(1)
-        else:
-            val = _raw_read(hx)
-        values.append(val)
-        print(val)
-    raw = sum(values) / len(values)
+    while len(values) < readings:
+        value = read()
+        if value is not False and value is not None:
+            values.append(value)
+    return values
 
-    # Apply offset and calibration factor
-    weight = (raw - hx.zero_offset) / hx.reference_unit
 
+def measure_weight(hx, max_samples=100, since=None, tolerance=SETTLE_TOLERANCE,
+                   window=SETTLE_WINDOW, max_time=READ_TIMEOUT):
+    """
+    Measure the weight (in grams) with outlier rejection and early stopping.
+
+    Starts from the newest buffered samples, so a scale that is already
+    steady returns without waiting, and otherwise consumes new samples until
+    the last `window` agree within `tolerance` grams, or until `max_samples`
+    or `max_time` is used up.
+
+    :param hx: HX711 instance returned by setup_scale
+    :param max_samples: Sample budget
+    :param since: Only use samples taken at or after this time.monotonic() value
+    :return: WeightEstimate (value, count, variance, settled, ...)
+    """
+    estimator = RobustWeightEstimator(hx.zero_offset, hx.reference_unit, tolerance=tolerance,
+                                      window=window, max_samples=max_samples)
+    engine = getattr(hx, 'acquisition', None)
+    if engine is None or not engine.running:
+        return estimate_stream(select_reader(hx), estimator, max_time)
+    return estimate_buffered(engine, estimator, since, max_time)
 
-    # Power cycle to save energy if supported
-    if hasattr(hx, 'power_down'):
-        try:
-            hx.power_down()
-        except Exception:
-            pass
-    time.sleep(0.1)
-    if hasattr(hx, 'power_up'):
-        try:
-            hx.power_up()
-        except Exception:
-            pass
 
-    return weight
+def read_weight(hx, readings=20, since=None):
+    """
+    Read a weight measurement (in grams) from the provided HX711 instance,
+    applying zero_offset and reference_unit.
+
+    :param hx: HX711 instance returned by setup_scale
+    :param readings: Maximum number of raw samples to use (fewer once the reading settles)
+    :param since: Only use samples taken at or after this time.monotonic() value
+    :return: Weight in grams (float), or None if no valid samples were available
+    """
+    return measure_weight(hx, max_samples=readings, since=since).value
 
 
 def prompt_and_read(config=None, readings=5):
@@ -139,28 +244,38 @@ def prompt_and_read(config=None, readings=5):
     Prompt the user to place weight and press Enter, then return a single weight reading.
 
     :param config: Optional HX711 config dict including zero_offset and reference_unit
-    :param readings: Number of samples to average
+    :param readings: Maximum number of samples per reading
     :return: Weight reading in grams
     """
     hx = setup_scale(config)
     print(read_weight(hx, readings))
     input("Press Enter when a weight has been placed on the platform...")
-    weight = read_weight(hx, readings)
+    estimate = measure_weight(hx, max_samples=readings, since=time.monotonic())
+    print(f"Weight: {estimate.summary()}")
     cleanup()
-    return weight
+    return estimate.value
 
 
 def cleanup():
     """
-    Clean up GPIO resources.
+    Stop all acquisition engines, then release setup_scale's HX711 pins
+    through the GPIO manager.
     """
-    GPIO.cleanup()
+    while _engines:
+        _engines.pop().stop()
+    while _claims:
+        _claims.pop().release()
 
 
 # Expose only the public API
 __all__ = [
     'setup_scale',
     'read_weight',
+    'measure_weight',
+    'read_raw_samples',
+    'start_acquisition',
+    'stop_acquisition',
+    'register_acquisition',
     'prompt_and_read',
     'cleanup',
     '__version__',
@@ -0,0 +1,175 @@
+"""
+orchestrator.py — Resource-aware parallel scheduler for component tests.
+
+Each test is described by a ``TestSpec`` naming the shared resources it
+needs (e.g. "gpio", "i2c", "camera", "operator"). Tests whose resource sets
+are disjoint run concurrently on their own threads; tests that share a
+resource are serialized. Pending tests are started longest-estimate first,
+so the total run time approaches that of the longest resource chain rather
+than the sum of every test.
+
+Usage:
+    from modules.orchestrator import TestSpec, run_schedule
+    summary = run_schedule([
+        TestSpec("pir", run_pir, resources={"gpio"}, estimate=12.0),
+        TestSpec("rfid", run_rfid, resources={"i2c"}, estimate=5.0),
+    ])
+    print(summary["passed"])
+"""
+
+import threading
+import time
+import traceback
+from contextlib import nullcontext
+
+__all__ = ["TestSpec", "run_schedule"]
+
+
+class TestSpec:
+    """
+    A schedulable test.
+
+    :param name: unique test name used in the summary
+    :param func: callable taking no arguments; a truthy return value means PASS
+    :param resources: names of the shared resources the test holds while it runs
+    :param estimate: expected duration in seconds, used to order the schedule
+    :param timeout: seconds after which the test is reported as failed (None = no limit)
+    :param description: human-readable description
+    """
+
+    def __init__(self, name: str, func, resources=(), estimate: float = 1.0,
+                 timeout: float = None, description: str = ""):
+        self.name = name
+        self.func = func
+        self.resources = frozenset(resources)
+        self.estimate = estimate
+        self.timeout = timeout
+        self.description = description or name
+
+
+class _Run:
+    def __init__(self, spec: TestSpec, origin: float):
+        self.spec = spec
+        self.origin = origin
+        self.started = None
+        self.finished = None
+        self.passed = False
+        self.error = None
+        self.timed_out = False
+        self.thread = None
+
+    def execute(self, done: threading.Condition, thread_context=None) -> None:
+        try:
+            with thread_context() if thread_context is not None else nullcontext():
+                self.passed = bool(self.spec.func())
+        except BaseException as e:  # a failing test must never take the runner down
+            self.passed = False
+            self.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        with done:
+            if self.finished is None:
+                self.finished = time.monotonic()
+            done.notify_all()
+
+    def result(self) -> dict:
+        end = self.finished if self.finished is not None else time.monotonic()
+        return {
+            "name": self.spec.name,
+            "description": self.spec.description,
+            "passed": self.passed and not self.timed_out,
+            "error": self.error,
+            "timed_out": self.timed_out,
+            "resources": sorted(self.spec.resources),
+            "started": None if self.started is None else round(self.started - self.origin, 3),
+            "duration": None if self.started is None else round(end - self.started, 3),
+        }
+
+
+def _notify(on_event, *args) -> None:
+    if on_event is None:
+        return
+    try:
+        on_event(*args)
+    except Exception:  # progress reporting must never stop the schedule
+        traceback.print_exc()
+
+
+def run_schedule(specs, max_workers: int = None, on_event=None, thread_context=None) -> dict:
+    """
+    Run `specs` concurrently, serializing tests that share a resource.
+
+    :param specs: iterable of TestSpec
+    :param max_workers: cap on simultaneously running tests (None = no cap)
+    :param on_event: optional callback, called from the scheduler thread as
+                     on_event("start", spec) and on_event("finish", spec, passed)
+    :param thread_context: optional callable returning a context manager that
+                           each test thread runs its test inside (e.g. to
+                           capture the test's output)
+    :return: summary dict with overall 'passed', 'duration', 'failed' names
+             and a per-test 'tests' list (in the order given)
+    """
+    specs = list(specs)
+    names = [s.name for s in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("Test names must be unique")
+
+    origin = time.monotonic()
+    done = threading.Condition()
+    runs = [_Run(s, origin) for s in specs]
+    pending = sorted(runs, key=lambda r: -r.spec.estimate)
+    running = []
+    held = set()
+
+    with done:
+        while pending or running:
+            # Retire finished and timed-out tests. A timed-out test keeps its
+            # resources: its thread is still touching the hardware.
+            now = time.monotonic()
+            for run in list(running):
+                if run.finished is not None:
+                    running.remove(run)
+                    held.difference_update(run.spec.resources)
+                    _notify(on_event, "finish", run.spec, run.passed)
+                elif run.spec.timeout is not None and now - run.started >= run.spec.timeout:
+                    run.timed_out = True
+                    run.finished = now
+                    run.error = f"Timed out after {run.spec.timeout}s"
+                    running.remove(run)
+                    _notify(on_event, "finish", run.spec, False)
+
+            for run in list(pending):
+                if max_workers is not None and len(running) >= max_workers:
+                    break
+                if run.spec.resources & held:
+                    continue
+                pending.remove(run)
+                held.update(run.spec.resources)
+                run.started = time.monotonic()
+                run.thread = threading.Thread(
+                    target=run.execute, args=(done, thread_context), name=f"test-{run.spec.name}", daemon=True
+                )
+                running.append(run)
+                run.thread.start()
+                _notify(on_event, "start", run.spec)
+
+            if not running and pending:
+                # Everything left is blocked on resources held by hung tests
+                for run in pending:
+                    run.error = "Not run: required resource held by a timed-out test"
+                break
+
+            deadlines = [r.started + r.spec.timeout for r in running if r.spec.timeout is not None]
+            wait = max(min(deadlines) - time.monotonic(), 0.0) if deadlines else None
+            if running and all(r.finished is None for r in running):
+                done.wait(wait)
+
+    results = [r.result() for r in runs]
+    failed = [r["name"] for r in results if not r["passed"]]
+    return {
+        "passed": not failed,
+        "total": len(results),
+        "failed": failed,
+        "duration": round(time.monotonic() - origin, 3),
+        "serial_duration": round(sum(r["duration"] or 0.0 for r in results), 3),
+        "tests": results,
+    }
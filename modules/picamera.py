@@ -1,72 +1,286 @@
 #!/usr/bin/env python3
 import os
-import glob
 import time
-from picamera2 import Picamera2
 
-__all__ = ["test_picamera"]
+from modules import backend
+from modules.frame_analysis import FrameAnalyzer, FrameMetrics
+from modules.snapshot_writer import SnapshotWriter
+from modules.v4l2_discovery import csi_sensor_nodes
 
-def _find_picamera2():
+Picamera2 = backend.picamera2_class()
+
+__all__ = ["PiCameraSession", "test_picamera"]
+
+# libcamera names formats by word order, so "BGR888" arrays are RGB in memory
+_ARRAY_COLORSPACE = {
+    "BGR888": "RGB",
+    "RGB888": "BGR",
+    "XBGR8888": "RGBX",
+    "XRGB8888": "BGRX",
+}
+
+# Shared so consecutive calls can detect a frozen sensor
+_analyzer = FrameAnalyzer()
+
+def _find_picamera2(camera_num: int = None):
     """
-    Scan /dev/video* for a camera, and return a Picamera2 instance
-    for the first device found (or None if none).
+    Return a Picamera2 instance for the first CSI camera sensor (or None if none).
+
+    V4L2 discovery confirms a CSI sensor node exists without opening any
+    stream; the camera is then selected by its position in libcamera's
+    camera list, which is what Picamera2's camera_num means (it is not a
+    /dev/video number). USB cameras in that list are skipped. A known
+    `camera_num` (e.g. from the hardware inventory) skips the discovery.
     """
-    video_devs = sorted(glob.glob("/dev/video*"))
-    if not video_devs:
+    if camera_num is not None:
+        try:
+            return Picamera2(camera_num=camera_num)
+        except Exception:
+            return None
+    if not csi_sensor_nodes():
         return None
 
-    idx = int(os.path.basename(video_devs[0]).replace("video", ""))
-    try:
-        return Picamera2(camera_num=idx)
-    except Exception:
-        return None
+    cameras = Picamera2.global_camera_info()
+    for position, info in enumerate(cameras):
+        if "usb" in str(info.get("Id", "")).lower():
+            continue
+        try:
+            return Picamera2(camera_num=info.get("Num", position))
+        except Exception:
+            return None
+    return None
+
+
+def _relative_change(a, b) -> float:
+    if isinstance(a, (tuple, list)):
+        return max((_relative_change(x, y) for x, y in zip(a, b)), default=0.0)
+    if a is None or b is None:
+        return 0.0
+    return abs(a - b) / max(abs(b), 1e-6)
+
 
-def test_picamera(output_path: str = "./snapshots/picamera2.jpg") -> bool:
+class PiCameraSession:
+    """
+    A started Picamera2 camera that captures into memory.
+
+    Instead of a fixed sleep, wait_for_convergence() polls the per-frame
+    metadata and returns as soon as exposure and gains stop moving (or AE
+    reports locked), capped at `max_wait`. The camera stays started between
+    captures, so once converged each capture costs about one frame time;
+    JPEG encoding happens only when a path is given.
+
+    Usage:
+        with PiCameraSession() as session:
+            frame = session.capture()                           # in-memory array
+            session.capture("snapshots/picamera2.jpg")          # also encode
+    """
+
+    # Metadata fields that must settle before a frame is representative
+    CONVERGENCE_KEYS = ("ExposureTime", "AnalogueGain", "ColourGains")
+
+    def __init__(self, camera=None, mode: str = "still", main: dict = None,
+                 tolerance: float = 0.02, stable_frames: int = 3, max_wait: float = 2.0):
+        """
+        Args:
+            camera:        Picamera2 instance or libcamera camera number (the first CSI camera if None).
+            mode:          "still", "preview" or "video" configuration.
+            main:          optional overrides for the main stream (e.g. {"size": (1920, 1080)}).
+            tolerance:     max relative frame-to-frame change still counted as stable.
+            stable_frames: consecutive stable frames required for convergence.
+            max_wait:      cap, in seconds, on the convergence wait.
+        """
+        self.camera = camera if camera is not None and not isinstance(camera, int) else _find_picamera2(camera)
+        if self.camera is None:
+            raise RuntimeError("No Picamera2-compatible camera found.")
+        self.mode = mode
+        self.main = main
+        self.tolerance = tolerance
+        self.stable_frames = stable_frames
+        self.max_wait = max_wait
+        self.config = None
+        self.converged = False
+        self.last_convergence = None
+
+    def __enter__(self) -> "PiCameraSession":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def colorspace(self) -> str:
+        return _ARRAY_COLORSPACE.get(self.config["main"].get("format"), "RGB")
+
+    def start(self) -> None:
+        if self.config is not None and self.camera.started:
+            return
+        create = {
+            "still": self.camera.create_still_configuration,
+            "preview": self.camera.create_preview_configuration,
+            "video": self.camera.create_video_configuration,
+        }[self.mode]
+        self.config = create(main=self.main) if self.main else create()
+        self.camera.configure(self.config)
+        self.camera.start()
+        self.converged = False
+        self.last_convergence = None
+
+    def wait_for_convergence(self) -> dict:
+        """
+        Block until AE/AWB have settled or `max_wait` elapses.
+
+        Returns a dict with 'converged', 'elapsed_s', 'frames' and the final 'metadata'.
+        """
+        self.start()
+        t0 = time.monotonic()
+        previous = None
+        stable = 0
+        frames = 0
+        metadata = {}
+        while True:
+            metadata = self.camera.capture_metadata()
+            frames += 1
+            if metadata.get("AeLocked"):
+                stable = self.stable_frames
+            elif previous is not None:
+                change = max(_relative_change(metadata.get(k), previous.get(k)) for k in self.CONVERGENCE_KEYS)
+                stable = stable + 1 if change <= self.tolerance else 0
+            previous = metadata
+            elapsed = time.monotonic() - t0
+            if stable >= self.stable_frames or elapsed >= self.max_wait:
+                break
+        self.converged = stable >= self.stable_frames
+        self.last_convergence = {
+            "converged": self.converged,
+            "elapsed_s": elapsed,
+            "frames": frames,
+            "metadata": metadata,
+        }
+        return self.last_convergence
+
+    def capture(self, output_path: str = None, writer: SnapshotWriter = None):
+        """
+        Capture one frame into memory. The first capture after start() waits
+        for convergence; later ones reuse the settled AE/AWB state.
+
+        Args:
+            output_path: if given, the frame is also encoded to this JPEG path.
+            writer:      SnapshotWriter for the encode (a private one is used if None).
+
+        Returns:
+            The frame; the JPEG, if requested, has been written on return.
+        """
+        if self.last_convergence is None:
+            self.wait_for_convergence()
+        frame = self.camera.capture_array("main")
+        if output_path:
+            own_writer = writer is None
+            if own_writer:
+                writer = SnapshotWriter(max_queue=1, workers=1)
+            try:
+                writer.submit(frame, output_path, colorspace=self.colorspace).result()
+            finally:
+                if own_writer:
+                    writer.close()
+        return frame
+
+    def healthy(self) -> bool:
+        """True if the camera is started and still delivers frame metadata."""
+        try:
+            return bool(self.camera.started and self.camera.capture_metadata())
+        except Exception:
+            return False
+
+    def stop(self) -> None:
+        self.camera.stop()
+        self.converged = False
+        self.last_convergence = None
+
+    def close(self) -> None:
+        self.stop()
+        self.camera.close()
+
+
+def test_picamera(output_path: str = "./snapshots/picamera2.jpg", writer: SnapshotWriter = None,
+                  analyzer: FrameAnalyzer = None, session: PiCameraSession = None,
+                  camera_num: int = None) -> FrameMetrics:
     """
     Capture a still image from the first Picamera2 device and save it.
 
+    The frame is captured into memory once AE/AWB have converged. With a
+    `session`, the camera is left started for the next call; otherwise a
+    temporary session is opened and closed before the JPEG is encoded.
+
     Args:
-        output_path: full path (including filename) where the JPEG will be written.
+        output_path: full path (including filename) where the JPEG will be written,
+                     or None to skip encoding.
+        writer:      SnapshotWriter to encode with (a private one is used if None).
+        analyzer:    FrameAnalyzer whose thresholds the frame must meet.
+        session:     PiCameraSession to capture from (kept open).
+        camera_num:  libcamera camera number to open without discovery (ignored with a session).
 
     Returns:
-        True if capture succeeded and file exists, False otherwise.
+        FrameMetrics for the captured frame; truthy only if the frame passed
+        the quality checks and the file was written.
     """
     # Ensure directory exists
-    snapshots_dir = os.path.dirname(output_path) or "."
-    os.makedirs(snapshots_dir, exist_ok=True)
-
-    # Find and initialize camera
-    camera = _find_picamera2()
-    if camera is None:
-        print("❌ No Picamera2-compatible camera found.")
-        return False
-
-    # Configure for full‑res still capture
-    config = camera.create_still_configuration()
-    camera.configure(config)
+    if output_path:
+        snapshots_dir = os.path.dirname(output_path) or "."
+        os.makedirs(snapshots_dir, exist_ok=True)
 
-    # Start camera, let auto‑exposure/whitebalance settle
-    camera.start()
-    time.sleep(2)
+    own_session = session is None
+    if own_session:
+        camera = _find_picamera2(camera_num)
+        if camera is None:
+            print("❌ No Picamera2-compatible camera found.")
+            return FrameMetrics.failed("no camera")
+        session = PiCameraSession(camera)
 
-    # Capture and write
+    t0 = time.monotonic()
     try:
-        camera.capture_file(output_path)
+        session.start()
+        if session.last_convergence is None:
+            result = session.wait_for_convergence()
+            state = "converged" if result["converged"] else "did not converge"
+            print(f"AE/AWB {state} after {result['elapsed_s']:.2f}s ({result['frames']} frames)")
+        frame = session.capture()
     except Exception as e:
         print(f"❌ Failed to capture image: {e}")
-        camera.stop()
-        camera.close()
-        return False
+        if own_session:
+            session.close()
+        return FrameMetrics.failed(f"capture failed: {e}")
+    print(f"Captured {frame.shape[1]}x{frame.shape[0]} frame in {time.monotonic() - t0:.3f}s")
 
-    camera.stop()
-    camera.close()
+    colorspace = session.colorspace
+    if own_session:
+        # Release the camera before encoding
+        session.close()
+
+    metrics = (analyzer or _analyzer).analyze(frame, source="picamera", colorspace=colorspace)
+    print(f"{'✅' if metrics else '❌'} Frame quality {metrics.summary()}")
+    if not output_path:
+        return metrics
+
+    own_writer = writer is None
+    if own_writer:
+        writer = SnapshotWriter(max_queue=1, workers=1)
+    try:
+        writer.submit(frame, output_path, colorspace=colorspace).result()
+    except Exception as e:
+        print(f"❌ Failed to write image: {e}")
+        metrics.failures.append(f"write failed: {e}")
+        return metrics
+    finally:
+        if own_writer:
+            writer.close()
 
     if os.path.isfile(output_path):
         print(f"✅ Image saved to {output_path}")
-        return True
     else:
         print("❌ Capture reported success, but file not found.")
-        return False
+        metrics.failures.append("file not found")
+    return metrics
 
 if __name__ == "__main__":
     # If run as a script, use default path
@@ -1,7 +1,206 @@
 # pir_sensor_test.py
+#
+# PIRSensor warms up in the background (its `ready` future resolves once the
+# sensor has stabilized) and records motion pulses from GPIO edges: start
+# time, end time and width of every pulse, and the event rate over a window
+# for soak testing. PIRSensorTest keeps the original blocking API on top.
 
-import RPi.GPIO as GPIO
+import argparse
+import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from modules import backend
+from modules.gpio_manager import get_manager
+
+GPIO = backend.gpio()
+
+__all__ = ["PIRPulse", "PIRSensor", "PIRSensorTest", "get_sensor", "release_sensor"]
+
+
+class PIRPulse:
+    """
+    One HIGH pulse of the PIR output. `end` and `width` stay None while the
+    pulse is still in progress.
+    """
+
+    def __init__(self, start: float):
+        self.start = start
+        self.end = None
+
+    @property
+    def width(self):
+        return None if self.end is None else self.end - self.start
+
+    def to_dict(self) -> dict:
+        return {"start": self.start, "end": self.end, "width": self.width}
+
+    def __repr__(self) -> str:
+        width = "open" if self.end is None else f"{self.width:.3f}s"
+        return f"PIRPulse(start={self.start:.3f}, width={width})"
+
+
+class PIRSensor:
+    """
+    Non-blocking PIR motion sensor.
+
+    Construction claims the pin and starts the warm-up; nothing blocks until
+    `ready.result()` / wait_ready() is called, so other work can overlap the
+    stabilisation delay. At the end of the warm-up the output must read LOW,
+    otherwise `ready` fails with a RuntimeError (not connected or stuck HIGH).
+
+    :param pin: BCM pin number where PIR OUT is wired.
+    :param warmup: how long the PIR needs to stabilize on power-up (seconds).
+    :param history: number of pulses kept.
+    """
+
+    def __init__(self, pin: int, warmup: float = 2.0, history: int = 1000):
+        self.pin = pin
+        self.warmup = warmup
+        self.pulses = deque(maxlen=history)
+        self.ready = Future()
+        self.ready_at = None
+        self.started_at = time.monotonic()
+        self._cond = threading.Condition()
+        self._gpio = get_manager()
+        # use an internal pull-down so floating = LOW
+        self._claim = self._gpio.claim(self.pin, GPIO.IN, pull=GPIO.PUD_DOWN, owner="pir")
+        self._gpio.subscribe(self.pin, self._on_edge)
+        self._warmup_timer = self._gpio.call_later(warmup, self._finish_warmup)
+        self._closed = False
+
+    def __enter__(self) -> "PIRSensor":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _finish_warmup(self) -> None:
+        if self._claim.read():
+            self.ready.set_exception(RuntimeError(
+                f"PIR output stuck HIGH after {self.warmup}s on pin {self.pin} — "
+                "check your wiring or that the sensor is plugged in."
+            ))
+            return
+        with self._cond:
+            self.ready_at = time.monotonic()
+            self._cond.notify_all()
+        self.ready.set_result(True)
+
+    def _on_edge(self, edge) -> None:
+        with self._cond:
+            open_pulse = self.pulses[-1] if self.pulses and self.pulses[-1].end is None else None
+            if edge.level and open_pulse is None:
+                self.pulses.append(PIRPulse(edge.t))
+            elif not edge.level and open_pulse is not None:
+                open_pulse.end = edge.t
+            self._cond.notify_all()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """
+        Block until the warm-up has finished. Raises RuntimeError if the
+        sensor is stuck HIGH; returns False if `timeout` passes first.
+        """
+        try:
+            return self.ready.result(timeout)
+        except FutureTimeout:
+            return False
+
+    @property
+    def motion(self) -> bool:
+        """True while the PIR output is HIGH."""
+        return bool(self._claim.read())
+
+    def wait_for_motion(self, timeout: float = 10.0, since: float = None):
+        """
+        Wait for a pulse starting at or after `since` (time.monotonic(); by
+        default now, or the end of the warm-up if that is later).
+
+        The timeout includes any remaining warm-up time.
+        :return: the PIRPulse (its width is filled in when it ends), or None
+        """
+        deadline = time.monotonic() + timeout
+        if not self.wait_ready(timeout):
+            return None
+        since = max(time.monotonic() if since is None else since, self.ready_at)
+        with self._cond:
+            while True:
+                found = next((p for p in self.pulses if p.start >= since), None)
+                if found is not None:
+                    return found
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def event_rate(self, window: float = 60.0) -> dict:
+        """
+        Motion events that started in the last `window` seconds after warm-up.
+
+        :return: dict with the event count, events per minute and pulse widths
+        """
+        now = time.monotonic()
+        start = max(now - window, self.ready_at if self.ready_at is not None else now)
+        with self._cond:
+            pulses = [p for p in self.pulses if p.start >= start]
+        span = max(now - start, 1e-9)
+        widths = [p.width for p in pulses if p.width is not None]
+        return {
+            "events": len(pulses),
+            "window_s": round(span, 3),
+            "per_minute": round(60.0 * len(pulses) / span, 3) if now > start else 0.0,
+            "mean_width_s": round(sum(widths) / len(widths), 4) if widths else None,
+            "max_width_s": round(max(widths), 4) if widths else None,
+        }
+
+    def healthy(self) -> bool:
+        """False once closed or if the warm-up failed (output stuck HIGH)."""
+        if self._closed:
+            return False
+        if not self.ready.done():
+            return True
+        return not self.ready.cancelled() and self.ready.exception() is None
+
+    def close(self) -> None:
+        """
+        Stop watching and release this sensor's GPIO pin.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._warmup_timer.cancel()
+        if not self.ready.done():
+            self.ready.cancel()
+        self._gpio.unsubscribe(self.pin, self._on_edge)
+        self._claim.release()
+
+
+# Sensors started by get_sensor(), keyed by pin
+_sensors = {}
+_sensors_lock = threading.Lock()
+
+
+def get_sensor(pin: int, warmup: float = 2.0) -> PIRSensor:
+    """
+    Return the shared PIRSensor on `pin`, starting its warm-up if needed, so
+    a caller can begin warming the sensor long before it tests it.
+    """
+    with _sensors_lock:
+        sensor = _sensors.get(pin)
+        if sensor is None or sensor._closed:
+            sensor = _sensors[pin] = PIRSensor(pin, warmup)
+        return sensor
+
+
+def release_sensor(pin: int) -> None:
+    """Close the shared sensor on `pin`, if any."""
+    with _sensors_lock:
+        sensor = _sensors.pop(pin, None)
+    if sensor is not None:
+        sensor.close()
+
 
 class PIRSensorTest:
     """
@@ -14,41 +213,58 @@ class PIRSensorTest:
 
     def __init__(self, pin: int, calibration_delay: float = 2.0):
         """
-        Initialize the PIR sensor on the given BCM pin.
+        Initialize the PIR sensor on the given BCM pin and wait for it to warm up.
 
         :param pin: BCM pin number where PIR OUT is wired.
         :param calibration_delay: how long the PIR needs to stabilize on power-up.
         """
         self.pin = pin
-        GPIO.setmode(GPIO.BCM)
-        # use an internal pull-down so floating = LOW
-        GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-
-        # Give the sensor time to calibrate, then verify it ever goes LOW.
-        time.sleep(calibration_delay)
-        if GPIO.input(self.pin):
-            raise RuntimeError(
-                f"PIR output stuck HIGH after {calibration_delay}s on pin {self.pin} — "
-                "check your wiring or that the sensor is plugged in."
-            )
+        self.sensor = PIRSensor(pin, calibration_delay)
+        try:
+            self.sensor.wait_ready()
+        except RuntimeError:
+            self.sensor.close()
+            raise
 
-    def detect_motion(self, timeout: float = 10.0, poll_interval: float = 0.1) -> bool:
+    def detect_motion(self, timeout: float = 10.0, poll_interval: float = None) -> bool:
         """
         Block until motion is detected or timeout is reached.
 
+        Edge-triggered: a pulse shorter than any polling interval is still seen.
+
         :param timeout: max seconds to wait for motion
-        :param poll_interval: how often to sample the sensor
+        :param poll_interval: unused, kept for backwards compatibility
         :return: True if motion was detected, False otherwise
         """
-        deadline = time.time() + timeout
-        while time.time() < deadline:
-            if GPIO.input(self.pin):
-                return True
-            time.sleep(poll_interval)
-        return False
+        if self.sensor.motion:
+            return True
+        return self.sensor.wait_for_motion(timeout) is not None
 
     def cleanup(self):
         """
-        Clean up this sensor's GPIO pin.
+        Release this sensor's GPIO pin.
         """
-        GPIO.cleanup(self.pin)
+        self.sensor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PIR motion sensor test / soak test")
+    parser.add_argument("--pin", "-p", type=int, default=17, help="BCM pin of PIR OUT")
+    parser.add_argument("--warmup", "-w", type=float, default=10.0, help="Stabilisation delay in seconds")
+    parser.add_argument("--timeout", "-t", type=float, default=15.0, help="Seconds to wait for motion")
+    parser.add_argument("--soak", "-s", type=float, default=0.0,
+                        help="Keep recording for this many seconds and report the motion-event rate")
+    args = parser.parse_args()
+
+    with PIRSensor(args.pin, args.warmup) as sensor:
+        sensor.wait_ready()
+        pulse = sensor.wait_for_motion(args.timeout)
+        print(f"Motion: {pulse}" if pulse else "No motion detected.")
+        if args.soak > 0:
+            time.sleep(args.soak)
+            print(f"Motion-event rate over {args.soak}s: {sensor.event_rate(args.soak)}")
+    sys.exit(0 if pulse else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,387 @@
-import serial
+# modules/qr_reader.py
+#
+# Serial QR scanner service. Nothing is opened at import: QRScanner opens
+# the port on first use (auto-detecting the scanner when no port is given)
+# and reads it on its own thread, taking whatever bytes are waiting in one
+# read(in_waiting) call. The byte stream is framed into messages on CR/LF
+# (or on a pause, for scanners configured without a suffix), repeats of a
+# code within the dedup window are dropped, and messages wait in a bounded
+# queue (oldest dropped first) for a blocking read with a timeout, a
+# Future, or iteration. Each scan records the time from its first byte to
+# its delivery. open_scanner() falls back to decoding from a camera
+# (modules.qr_vision, same API) when no serial scanner can be opened.
 
-ser = serial.Serial(
-    port='/dev/ttyACM0',
-    baudrate=9600,
-    timeout=1
-)
+import abc
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
 
-def prompt_and_wait_for_qr() -> str:
+import numpy as np
+
+from modules import backend
+
+serial = backend.serial_module()
+
+__all__ = ["QRScan", "ScanQueue", "QRScanner", "find_scanner_port", "open_scanner", "prompt_and_wait_for_qr"]
+
+DEFAULT_PORT = "/dev/ttyACM0"
+# Overrides auto-detection, e.g. ARCULUS_QR_PORT=/dev/serial/by-id/usb-...
+PORT_ENV = "ARCULUS_QR_PORT"
+
+# Words in a port's description that identify the scanner
+_SCANNER_HINTS = ("scan", "barcode", "qr")
+
+
+def find_scanner_port(ports=None):
+    """
+    Return the device path of the QR scanner, or None if none is attached:
+    $ARCULUS_QR_PORT if set, else /dev/ttyACM0 if present, else the first
+    port whose description looks like a scanner, else the first ttyACM port.
+    `ports` (comports()-like descriptors) skips enumerating the ports.
+    """
+    if os.environ.get(PORT_ENV):
+        return os.environ[PORT_ENV]
+    ports = backend.serial_ports() if ports is None else ports
+    devices = [p.device for p in ports]
+    if DEFAULT_PORT in devices:
+        return DEFAULT_PORT
+    for p in ports:
+        text = " ".join(str(v) for v in (p.description, p.product, p.manufacturer) if v).lower()
+        if any(hint in text for hint in _SCANNER_HINTS):
+            return p.device
+    acm = [d for d in devices if "ttyACM" in d]
+    return acm[0] if acm else None
+
+
+class QRScan:
+    """
+    One decoded message. `t` is time.monotonic() when its first byte was
+    read; `latency_s` is the time from then until a consumer received it.
+    """
+
+    def __init__(self, seq: int, data: str, t: float):
+        self.seq = seq
+        self.data = data
+        self.t = t
+        self.latency_s = None
+
+    def to_dict(self) -> dict:
+        return {"seq": self.seq, "data": self.data, "t": self.t, "latency_s": self.latency_s}
+
+    def __repr__(self) -> str:
+        return f"QRScan(#{self.seq} {self.data!r})"
+
+
+class ScanQueue(abc.ABC):
+    """
+    Consumer side shared by the QR scanners: deduplication, the bounded
+    queue, futures and delivery latency. Subclasses implement open(),
+    close() and _running(), and hand decoded text to _publish().
+
+    :param maxsize: messages kept until read (oldest dropped when full)
+    :param dedup_window: a code seen again within this many seconds is dropped
+    :param history: number of latency samples kept
+    """
+
+    def __init__(self, maxsize: int = 64, dedup_window: float = 2.0, history: int = 1000):
+        self.dedup_window = dedup_window
+        self.queue = deque(maxlen=maxsize)
+        self.latencies = deque(maxlen=history)
+        self.received = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.error = None
+        self._seen = {}
+        self._futures = deque()
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @abc.abstractmethod
+    def open(self):
+        """Start the producer; returns self."""
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        """Stop the producer and release its device."""
+
+    @abc.abstractmethod
+    def _running(self) -> bool:
+        """True while the producer thread is alive."""
+
+    def healthy(self) -> bool:
+        """True while the producer runs without an error."""
+        with self._cond:
+            return self._running() and self.error is None
+
+    # --- producer side ---------------------------------------------------
+
+    def _deliver(self, scan: QRScan) -> QRScan:
+        # Caller holds self._cond
+        scan.latency_s = time.monotonic() - scan.t
+        self.latencies.append(scan.latency_s)
+        return scan
+
+    def _publish(self, text: str, t: float) -> bool:
+        """Queue `text`, first seen at `t`, unless it repeats a recent code. Returns True if queued."""
+        with self._cond:
+            self.received += 1
+            last = self._seen.get(text)
+            self._seen[text] = t
+            if len(self._seen) > 256:
+                self._seen = {k: v for k, v in self._seen.items() if t - v < self.dedup_window}
+            if last is not None and t - last < self.dedup_window:
+                self.duplicates += 1
+                return False
+            self._seq += 1
+            scan = QRScan(self._seq, text, t)
+            while self._futures:
+                future = self._futures.popleft()
+                if future.set_running_or_notify_cancel():
+                    future.set_result(self._deliver(scan))
+                    return True
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(scan)
+            self._cond.notify_all()
+            return True
+
+    def _fail(self, error: Exception) -> None:
+        # The producer stopped: wake readers so they do not wait out their timeouts
+        with self._cond:
+            self.error = error
+            while self._futures:
+                self._futures.popleft().set_exception(error)
+            self._cond.notify_all()
+
+    def _cancel_waiters(self) -> None:
+        with self._cond:
+            while self._futures:
+                self._futures.popleft().cancel()
+            self._cond.notify_all()
+
+    # --- consumers -------------------------------------------------------
+
+    def read(self, timeout: float = None):
+        """
+        Return the next scan, waiting up to `timeout` seconds (forever if
+        None). Returns None on timeout; raises the producer's error if it
+        has stopped with nothing left to deliver.
+        """
+        self.open()
+        with self._cond:
+            def ready():
+                return self.queue or self.error is not None or not self._running()
+            self._cond.wait_for(ready, timeout)
+            if self.queue:
+                return self._deliver(self.queue.popleft())
+            if self.error is not None:
+                raise self.error
+            return None
+
+    def read_async(self) -> Future:
+        """A Future resolved with the next scan (at once if one is queued)."""
+        self.open()
+        future = Future()
+        with self._cond:
+            if self.queue:
+                future.set_running_or_notify_cancel()
+                future.set_result(self._deliver(self.queue.popleft()))
+            elif self.error is not None:
+                future.set_exception(self.error)
+            else:
+                self._futures.append(future)
+        return future
+
+    def scans(self, timeout: float = None):
+        """Yield scans as they arrive; stops after `timeout` seconds without one."""
+        while True:
+            scan = self.read(timeout)
+            if scan is None:
+                return
+            yield scan
+
+    def __iter__(self):
+        return self.scans()
+
+    def clear(self) -> None:
+        """Drop queued scans and forget recent codes, so the next scan of any code is delivered."""
+        with self._cond:
+            self.queue.clear()
+            self._seen.clear()
+
+    def stats(self) -> dict:
+        with self._cond:
+            latency_ms = np.asarray(self.latencies, dtype=np.float64) * 1000.0
+            return {
+                "received": self.received,
+                "delivered": len(self.latencies),
+                "duplicates": self.duplicates,
+                "dropped": self.dropped,
+                "queued": len(self.queue),
+                "error": None if self.error is None else str(self.error),
+                "latency_ms_mean": round(float(latency_ms.mean()), 3) if len(latency_ms) else None,
+                "latency_ms_max": round(float(latency_ms.max()), 3) if len(latency_ms) else None,
+            }
+
+
+class QRScanner(ScanQueue):
+    """
+    Background reader for a serial QR scanner.
+
+    :param port: serial device; auto-detected on open if None
+    :param baudrate: scanner baud rate
+    :param maxsize: messages kept until read (oldest dropped when full)
+    :param dedup_window: a code seen again within this many seconds is dropped
+    :param idle_flush: end an unterminated message after this many seconds without bytes
+    :param history: number of latency samples kept
+    """
+
+    def __init__(self, port: str = None, baudrate: int = 9600, maxsize: int = 64,
+                 dedup_window: float = 2.0, idle_flush: float = 0.1, history: int = 1000):
+        super().__init__(maxsize, dedup_window, history)
+        self.port = port
+        self.baudrate = baudrate
+        self.idle_flush = idle_flush
+        self._ser = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def open(self) -> "QRScanner":
+        """
+        Open the port and start the reader thread (done by the read methods
+        if needed, which also reconnects after a port error). Raises
+        serial.SerialException if no scanner is found.
+        """
+        with self._cond:
+            if self._thread is not None:
+                if self._thread.is_alive():
+                    return self
+                # The reader stopped on a port error: reconnect
+                self._ser.close()
+                self._thread = None
+            port = self.port or find_scanner_port()
+            if port is None:
+                raise serial.SerialException("No QR scanner found (set ARCULUS_QR_PORT to choose a port)")
+            # The short timeout only bounds how long read(1) waits while idle
+            self._ser = serial.Serial(port=port, baudrate=self.baudrate, timeout=0.05)
+            self.port = port
+            self.error = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="qr-reader", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Stop the reader thread, close the port and cancel pending futures."""
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+        with self._cond:
+            self._thread = None
+            if self._ser is not None:
+                self._ser.close()
+                self._ser = None
+        self._cancel_waiters()
+
+    def _running(self) -> bool:
+        return self._thread is not None
+
+    # --- reader thread ---------------------------------------------------
+
+    def _frame(self, data: bytes, t: float) -> None:
+        text = data.decode("utf-8", errors="replace").strip()
+        if text:
+            self._publish(text, t)
+
+    def _run(self) -> None:
+        buffer = bytearray()
+        started = last_byte = None
+        try:
+            while not self._stop.is_set():
+                # One bulk read of everything waiting; read(1) blocks briefly when idle
+                chunk = self._ser.read(self._ser.in_waiting or 1)
+                now = time.monotonic()
+                if chunk:
+                    if not buffer:
+                        started = now
+                    buffer += chunk
+                    last_byte = now
+                    while True:
+                        cut = min((i for i in (buffer.find(b"\r"), buffer.find(b"\n")) if i >= 0), default=-1)
+                        if cut < 0:
+                            break
+                        self._frame(bytes(buffer[:cut]), started)
+                        del buffer[:cut + 1]
+                        started = now
+                elif buffer and now - last_byte >= self.idle_flush:
+                    self._frame(bytes(buffer), started)
+                    buffer.clear()
+        except (serial.SerialException, OSError) as e:
+            # Unplugged or failed
+            self._fail(e)
+
+    def stats(self) -> dict:
+        return {"port": self.port, **super().stats()}
+
+
+def open_scanner(port: str = None, fallback: bool = True) -> ScanQueue:
+    """
+    Open the serial QR scanner, or, if none can be opened and `fallback` is
+    set, a camera-based scanner (modules.qr_vision) with the same API.
+    """
+    try:
+        return QRScanner(port).open()
+    except serial.SerialException as e:
+        if not fallback:
+            raise
+        from modules.qr_vision import camera_scanner
+        print(f"Serial QR scanner unavailable ({e}); decoding QR codes from the camera instead.")
+        return camera_scanner().open()
+
+
+def prompt_and_wait_for_qr(timeout: float = 30.0, scanner: ScanQueue = None):
+    """
+    Wait up to `timeout` seconds for a QR code and return its text, or None.
+    Uses `scanner` if given, otherwise opens (and closes) one with
+    open_scanner(), falling back to the camera without a serial scanner.
+    """
     print("Waiting for QR code...")
-    while(1):
-        readData = ser.readline().decode('utf-8').strip()
-        if readData:
-            return readData
+    if scanner is not None:
+        scan = scanner.read(timeout)
+    else:
+        with open_scanner() as scanner:
+            scan = scanner.read(timeout)
+    return scan.data if scan is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read QR codes from the serial scanner")
+    parser.add_argument("--port", "-p", help="Serial port (auto-detected by default)")
+    parser.add_argument("--timeout", "-t", type=float, default=30.0, help="Seconds to wait for a scan")
+    parser.add_argument("--count", "-n", type=int, default=1, help="Number of scans to read")
+    args = parser.parse_args()
+
+    with QRScanner(args.port) as scanner:
+        scans = []
+        for scan in scanner.scans(args.timeout):
+            print(f"Scanned QR code data: {scan.data} ({1000 * scan.latency_s:.1f} ms)")
+            scans.append(scan)
+            if len(scans) >= args.count:
+                break
+        print(f"Scanner stats: {scanner.stats()}")
+    sys.exit(0 if scans else 1)
+
 
 if __name__ == "__main__":
-    scanned_data = prompt_and_wait_for_qr()
-    print(f"Scanned QR code data: {scanned_data}")
\ No newline at end of file
+    main()
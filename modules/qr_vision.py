@@ -0,0 +1,321 @@
+# Camera-based QR code decoding, used when the serial scanner is missing.
+
+import argparse
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from modules import backend
+from modules import v4l2_discovery
+from modules.camera_pool import CapturePool
+from modules.qr_reader import ScanQueue
+
+cv2 = backend.cv2_module()
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['CaptureSource', 'PiCameraSource', 'VisionQRScanner', 'camera_scanner']
+
+
+class CaptureSource:
+    '''
+    Frames from a USB camera, kept open in a CapturePool.
+    '''
+
+    def __init__(self, index: int, width: int = 1280, height: int = 720, pool: Optional[CapturePool] = None):
+        self.index = index
+        self.width = width
+        self.height = height
+        self._owns_pool = pool is None
+        self.pool = pool if pool is not None else CapturePool()
+
+    def open(self) -> None:
+        if self.pool.acquire(self.index, self.width, self.height) is None:
+            raise RuntimeError(f'Camera {self.index} could not be opened.')
+
+    def read(self) -> Optional[np.ndarray]:
+        ret, frame = self.pool.read(self.index, self.width, self.height)
+        return frame if ret else None
+
+    def close(self) -> None:
+        if self._owns_pool:
+            self.pool.close()
+
+    def __repr__(self) -> str:
+        return f'CaptureSource({self.index}, {self.width}x{self.height})'
+
+
+class PiCameraSource:
+    '''
+    Frames from the CSI camera through a started PiCameraSession (video
+    configuration, so captures run at the sensor's frame rate).
+    '''
+
+    def __init__(self, session=None):
+        self._owns_session = session is None
+        self.session = session
+
+    def open(self) -> None:
+        if self.session is None:
+            from modules.picamera import PiCameraSession
+            self.session = PiCameraSession(mode='video')
+        self.session.start()
+
+    def read(self) -> Optional[np.ndarray]:
+        return self.session.capture()
+
+    def close(self) -> None:
+        if self._owns_session and self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def __repr__(self) -> str:
+        return 'PiCameraSource()'
+
+
+class VisionQRScanner(ScanQueue):
+    '''
+    Decodes QR codes from a stream of camera frames with the same consumer
+    API as the serial QRScanner (read(timeout), read_async(), iteration).
+
+    A capture thread reads frames at the camera's rate and hands each to a
+    worker pool; when every worker is busy the frame is dropped rather than
+    queued, so decoding never falls behind the camera. While no code is
+    known, a frame is searched downscaled by `search_scale` (codes found but
+    too small to decode there are re-decoded from the full-resolution crop,
+    and every `full_search_every`-th frame is also searched at full
+    resolution). Once a code is decoded its bounding box, grown by
+    `roi_margin`, becomes the region of interest and later frames decode
+    only that crop, until it misses `max_misses` frames in a row.
+
+    Scan timestamps are the frame's capture time, so latency covers
+    decoding and delivery.
+    '''
+
+    def __init__(self, source, workers: int = 2, search_scale: float = 0.5, full_search_every: int = 4,
+                 roi_margin: float = 0.25, max_misses: int = 5, maxsize: int = 64,
+                 dedup_window: float = 2.0, history: int = 1000):
+        super().__init__(maxsize, dedup_window, history)
+        self.source = source
+        self.workers = workers
+        self.search_scale = search_scale
+        self.full_search_every = full_search_every
+        self.roi_margin = roi_margin
+        self.max_misses = max_misses
+        self.roi: Optional[Tuple[int, int, int, int]] = None
+        self.frames = 0
+        self.frames_dropped = 0
+        self.frames_decoded = 0
+        self.decode_times: Dict[str, deque] = {mode: deque(maxlen=history) for mode in ('roi', 'search', 'full')}
+        self._roi_frame = 0
+        self._misses = 0
+        self._in_flight = 0
+        self._detectors = threading.local()
+        self._executor = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+
+    def open(self) -> 'VisionQRScanner':
+        '''
+        Open the camera and start capturing (done by the read methods if needed).
+        '''
+        with self._cond:
+            if self._thread is not None:
+                return self
+            self.source.open()
+            self.error = None
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='qr-decode')
+            self._started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._capture, name='qr-capture', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout: float = 2.0) -> None:
+        '''
+        Stop capturing, wait for in-flight decodes and release the camera.
+        '''
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+        with self._cond:
+            executor, self._executor = self._executor, None
+            self._thread = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+            self.source.close()
+        self._cancel_waiters()
+
+    def _running(self) -> bool:
+        return self._thread is not None
+
+    # --- capture thread --------------------------------------------------
+
+    def _capture(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                frame = self.source.read()
+            except Exception as e:
+                frame = None
+                logger.warning(f'QR camera read failed: {e}')
+            t = time.monotonic()
+            if frame is None:
+                failures += 1
+                if failures >= 10:
+                    self._fail(RuntimeError(f'{self.source!r} stopped delivering frames'))
+                    return
+                continue
+            failures = 0
+            with self._cond:
+                self.frames += 1
+                if self._in_flight >= self.workers:
+                    self.frames_dropped += 1
+                    continue
+                self._in_flight += 1
+                frame_no = self.frames
+            self._executor.submit(self._decode, frame_no, frame, t)
+
+    # --- decoding (worker threads) ---------------------------------------
+
+    def _detect(self, image: np.ndarray) -> List[Tuple[str, np.ndarray]]:
+        '''
+        (text, corners) for every code found in `image`; text is empty when
+        a code was located but could not be decoded.
+        '''
+        detector = getattr(self._detectors, 'detector', None)
+        if detector is None:
+            # QRCodeDetector is not thread-safe: one per worker
+            detector = self._detectors.detector = cv2.QRCodeDetector()
+        found, texts, points = detector.detectAndDecodeMulti(image)[:3]
+        if not found or points is None:
+            return []
+        return list(zip(texts, points.reshape(-1, 4, 2)))
+
+    def _crop_box(self, corners: np.ndarray, shape: Tuple[int, ...]) -> Tuple[int, int, int, int]:
+        x0, y0 = corners.min(axis=0)
+        x1, y1 = corners.max(axis=0)
+        pad = self.roi_margin * max(x1 - x0, y1 - y0)
+        height, width = shape[:2]
+        return (max(int(x0 - pad), 0), max(int(y0 - pad), 0),
+                min(int(np.ceil(x1 + pad)), width), min(int(np.ceil(y1 + pad)), height))
+
+    def _decode_crop(self, gray: np.ndarray, box: Tuple[int, int, int, int]) -> List[Tuple[str, np.ndarray]]:
+        x0, y0, x1, y1 = box
+        return [(text, corners + (x0, y0)) for text, corners in self._detect(gray[y0:y1, x0:x1])]
+
+    def _search(self, gray: np.ndarray, frame_no: int) -> Tuple[str, List[Tuple[str, np.ndarray]]]:
+        scale = self.search_scale
+        if scale < 1.0:
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            located = [(text, corners / scale) for text, corners in self._detect(small)]
+            if located:
+                # Re-decode codes that were too small to read at the reduced size
+                results = []
+                for text, corners in located:
+                    if text:
+                        results.append((text, corners))
+                    else:
+                        results.extend(self._decode_crop(gray, self._crop_box(corners, gray.shape)))
+                return 'search', results
+            if self.full_search_every <= 0 or frame_no % self.full_search_every:
+                return 'search', []
+        return 'full', self._detect(gray)
+
+    def _decode(self, frame_no: int, frame: np.ndarray, t: float) -> None:
+        try:
+            started = time.monotonic()
+            gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            with self._cond:
+                roi = self.roi
+            results = []
+            mode = 'roi'
+            if roi is not None:
+                results = [r for r in self._decode_crop(gray, roi) if r[0]]
+            if not results:
+                mode, results = self._search(gray, frame_no)
+                results = [r for r in results if r[0]]
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self.decode_times[mode].append(elapsed)
+                self.frames_decoded += 1
+                if results:
+                    if frame_no > self._roi_frame:
+                        corners = np.concatenate([c for _, c in results])
+                        self.roi = self._crop_box(corners, gray.shape)
+                        self._roi_frame = frame_no
+                    self._misses = 0
+                elif roi is not None:
+                    self._misses += 1
+                    if self._misses >= self.max_misses:
+                        self.roi = None
+            for text, _ in results:
+                self._publish(text, t)
+        except Exception:
+            logger.exception('QR decode failed')
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+
+    # --- reporting -------------------------------------------------------
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._cond:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            stats.update({
+                'source': repr(self.source),
+                'frames': self.frames,
+                'frames_decoded': self.frames_decoded,
+                'frames_dropped': self.frames_dropped,
+                'capture_fps': round(self.frames / elapsed, 2) if elapsed > 0 else 0.0,
+                'decode_fps': round(self.frames_decoded / elapsed, 2) if elapsed > 0 else 0.0,
+                'roi': self.roi,
+            })
+            for mode, times in self.decode_times.items():
+                ms = np.asarray(times, dtype=np.float64) * 1000.0
+                stats[f'{mode}_decodes'] = len(ms)
+                stats[f'{mode}_ms_mean'] = round(float(ms.mean()), 3) if len(ms) else None
+        return stats
+
+
+def camera_scanner(camera: Union[int, str, None] = None, **kwargs) -> VisionQRScanner:
+    '''
+    A VisionQRScanner (not yet opened) on `camera`: a USB capture index,
+    'picamera' for the CSI camera, or None for the first USB camera found
+    (the CSI camera if there is none). Extra arguments go to VisionQRScanner.
+    '''
+    if camera is None:
+        indices = v4l2_discovery.usb_capture_indices()
+        camera = indices[0] if indices else 'picamera'
+    source = PiCameraSource() if camera == 'picamera' else CaptureSource(int(camera))
+    return VisionQRScanner(source, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode QR codes from a camera')
+    parser.add_argument('--camera', '-c', help="USB capture index or 'picamera' (default: first USB camera)")
+    parser.add_argument('--timeout', '-t', type=float, default=30.0, help='Seconds to wait for a code')
+    parser.add_argument('--workers', '-w', type=int, default=2, help='Decode threads')
+    args = parser.parse_args()
+
+    camera = args.camera
+    if camera is not None and camera != 'picamera':
+        camera = int(camera)
+    with camera_scanner(camera, workers=args.workers) as scanner:
+        scan = scanner.read(args.timeout)
+        print(f'Scanned QR code data: {scan.data}' if scan else 'No QR code found.')
+        print(f'Scanner stats: {scanner.stats()}')
+    sys.exit(0 if scan else 1)
+
+
+if __name__ == '__main__':
+    main()
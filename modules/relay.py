@@ -1,10 +1,23 @@
 """
 relay.py — Importable module for Raspberry Pi relay control
+
+Relay drives one channel directly. RelayController drives several channels
+from timed, non-blocking schedules (pulses and on/off patterns, which may
+overlap across channels) run on the GPIO manager's event thread, and
+enforces safety interlocks: a maximum on-time per channel and groups of
+channels (e.g. the two locks) of which at most one may be on at a time.
 """
-import RPi.GPIO as GPIO
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, wait as wait_futures
+
+from modules import backend
+from modules.gpio_manager import get_manager
 
-__all__ = ["Relay"]
+GPIO = backend.gpio()
+
+__all__ = ["Relay", "RelayController", "RelayAction", "InterlockError", "MaxOnError"]
 
 class Relay:
     """
@@ -18,8 +31,7 @@ class Relay:
     """
     def __init__(self, pin: int) -> None:
         self.pin = pin
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.pin, GPIO.OUT, initial=GPIO.HIGH)
+        self._claim = get_manager().claim(self.pin, GPIO.OUT, initial=GPIO.HIGH, owner="relay")
 
     def __enter__(self) -> "Relay":
         return self
@@ -28,13 +40,13 @@ class Relay:
         """
         Energize the relay (close the circuit).
         """
-        GPIO.output(self.pin, GPIO.LOW)
+        self._claim.write(GPIO.LOW)
 
     def off(self) -> None:
         """
         De-energize the relay (open the circuit).
         """
-        GPIO.output(self.pin, GPIO.HIGH)
+        self._claim.write(GPIO.HIGH)
 
     def test(self, duration: float = 2.0) -> None:
         """
@@ -45,8 +57,280 @@ class Relay:
         time.sleep(duration)
         self.off()
 
+    def close(self) -> None:
+        """
+        Release this relay's pin (cleaned up once no one else holds it).
+        """
+        self._claim.release()
+
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         """
-        Cleanup GPIO settings on context exit.
+        Release the pin on context exit.
         """
-        GPIO.cleanup()
+        self.close()
+
+
+class InterlockError(RuntimeError):
+    """Switching a relay on would violate one of the controller's interlocks."""
+
+
+class MaxOnError(InterlockError):
+    """A relay was switched off by its maximum on-time before its action finished."""
+
+
+class RelayAction:
+    """
+    A scheduled pulse or pattern on one channel. `future` resolves to True
+    when the last step has run, or fails with InterlockError if a step was
+    refused, MaxOnError if the max-on limit cut the relay off, or KeyError
+    if the channel was released first (the remaining steps are then
+    cancelled and the relay left off). `ends_at` is the time.monotonic()
+    at which it is due to finish.
+    """
+
+    def __init__(self, controller: "RelayController", name: str) -> None:
+        self.controller = controller
+        self.name = name
+        self.future = Future()
+        self.ends_at = None
+        self._timers = []
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: float = None):
+        return self.future.result(timeout)
+
+    def cancel(self) -> None:
+        """Drop the remaining steps and switch the channel off."""
+        for timer in self._timers:
+            timer.cancel()
+        if not self.future.done():
+            self.future.cancel()
+            self.controller.off(self.name)
+
+    def _fail(self, error: Exception) -> None:
+        for timer in self._timers:
+            timer.cancel()
+        self.controller.off(self.name)
+        if not self.future.done():
+            self.future.set_exception(error)
+
+    def __repr__(self) -> str:
+        state = "done" if self.future.done() else "pending"
+        return f"RelayAction({self.name!r}, {state})"
+
+
+class RelayController:
+    """
+    Non-blocking controller for several active-low relay channels.
+
+    Usage:
+        with RelayController({"Left Lock": 18, "Right Lock": 27, "Buzzer": 22},
+                             max_on=5.0, interlocks=[("Left Lock", "Right Lock")]) as relays:
+            actions = [relays.pulse("Buzzer", 0.2), relays.pattern("Left Lock", [(0.5, 0.5)] * 3)]
+            relays.wait(actions, timeout=5)
+
+    :param channels: {name: BCM pin}
+    :param max_on: Longest a channel may stay on before it is switched off
+                   automatically (seconds); one value for every channel or a
+                   {name: seconds} dict. None means no limit.
+    :param interlocks: Groups of channel names of which at most one may be on
+    :param interlock_gap: Dead time after one member of a group switches off
+                          before another may switch on (seconds)
+    """
+
+    def __init__(self, channels: dict, max_on=None, interlocks=(), interlock_gap: float = 0.1) -> None:
+        self._gpio = get_manager()
+        self._lock = threading.RLock()
+        self.channels = dict(channels)
+        if not isinstance(max_on, dict):
+            max_on = {name: max_on for name in self.channels}
+        self.max_on = {name: max_on.get(name) for name in self.channels}
+        self.interlocks = [frozenset(group) & set(self.channels) for group in interlocks]
+        self.interlock_gap = interlock_gap
+        # (time.monotonic(), channel, event): event is "on", "off", "max-on" or "interlock"
+        self.log = deque(maxlen=1000)
+        self._on_since = {}
+        self._off_at = {name: float("-inf") for name in self.channels}
+        self._expiry = {}
+        # Unfinished actions per channel, failed when the channel is cut off or released
+        self._actions = {name: set() for name in self.channels}
+        self._claims = {}
+        try:
+            for name, pin in self.channels.items():
+                self._claims[name] = self._gpio.claim(pin, GPIO.OUT, initial=GPIO.HIGH, owner=f"relay:{name}")
+        except Exception:
+            # close() never runs when the constructor fails: release the relays claimed so far
+            for claim in self._claims.values():
+                claim.release()
+            self._claims.clear()
+            raise
+
+    def __enter__(self) -> "RelayController":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    # --- immediate switching ---------------------------------------------
+
+    def is_on(self, name: str) -> bool:
+        return name in self._on_since
+
+    def on(self, name: str) -> None:
+        """
+        Energize `name` now. Raises InterlockError if another channel of one
+        of its interlock groups is on or switched off less than
+        `interlock_gap` seconds ago.
+        """
+        with self._lock:
+            claim = self._claims[name]
+            if name in self._on_since:
+                return
+            now = time.monotonic()
+            for group in self.interlocks:
+                if name not in group:
+                    continue
+                for other in group - {name}:
+                    if other in self._on_since or now - self._off_at[other] < self.interlock_gap:
+                        self.log.append((now, name, "interlock"))
+                        raise InterlockError(f"Relay {name!r} may not switch on while {other!r} is on "
+                                             f"(or within {self.interlock_gap}s of it switching off)")
+            claim.write(GPIO.LOW)
+            self._on_since[name] = now
+            self.log.append((now, name, "on"))
+            if self.max_on[name] is not None:
+                self._expiry[name] = self._gpio.call_later(self.max_on[name], self._expire, name, now)
+
+    def off(self, name: str) -> None:
+        """De-energize `name` now."""
+        with self._lock:
+            if self._on_since.pop(name, None) is None:
+                return
+            self._claims[name].write(GPIO.HIGH)
+            now = time.monotonic()
+            self._off_at[name] = now
+            self.log.append((now, name, "off"))
+            timer = self._expiry.pop(name, None)
+            if timer is not None:
+                timer.cancel()
+
+    def _expire(self, name: str, since: float) -> None:
+        with self._lock:
+            # Ignore a timer left over from an earlier on-period
+            if self._on_since.get(name) == since:
+                self.log.append((time.monotonic(), name, "max-on"))
+                self.off(name)
+                error = MaxOnError(f"Relay {name!r} was switched off after its {self.max_on[name]}s maximum on-time")
+                for action in list(self._actions.get(name, ())):
+                    action._fail(error)
+
+    def all_off(self) -> None:
+        for name in list(self._on_since):
+            self.off(name)
+
+    # --- schedules -------------------------------------------------------
+
+    def pattern(self, name: str, steps, delay: float = 0.0, repeat: int = 1) -> RelayAction:
+        """
+        Run `steps`, a list of (on_seconds, off_seconds), `repeat` times on
+        `name`, starting `delay` seconds from now. Step times are fixed
+        relative to the start, so they do not drift. Returns at once.
+        """
+        if name not in self._claims:
+            raise KeyError(f"Unknown relay channel {name!r}")
+        action = RelayAction(self, name)
+        start = time.monotonic() + delay
+        offset = 0.0
+        transitions = []
+        for _ in range(repeat):
+            for on_s, off_s in steps:
+                transitions.append((offset, True))
+                offset += on_s
+                transitions.append((offset, False))
+                offset += off_s
+        action.ends_at = start + offset
+        with self._lock:
+            self._actions[name].add(action)
+            action.future.add_done_callback(lambda _: self._forget(action))
+            for at, state in transitions:
+                action._timers.append(self._gpio.call_at(start + at, self._step, action, state))
+            # Completes after the last step (and any trailing off-time)
+            action._timers.append(self._gpio.call_at(start + offset, self._finish, action))
+        return action
+
+    def _forget(self, action: RelayAction) -> None:
+        with self._lock:
+            self._actions.get(action.name, set()).discard(action)
+
+    def pulse(self, name: str, duration: float, delay: float = 0.0) -> RelayAction:
+        """Switch `name` on for `duration` seconds, starting `delay` seconds from now."""
+        return self.pattern(name, [(duration, 0.0)], delay)
+
+    def _step(self, action: RelayAction, state: bool) -> None:
+        if action.future.done():
+            return
+        try:
+            if action.name not in self._claims:
+                raise KeyError(f"Relay channel {action.name!r} was released")
+            if state:
+                self.on(action.name)
+            else:
+                self.off(action.name)
+        except (InterlockError, KeyError) as e:
+            action._fail(e)
+
+    def _finish(self, action: RelayAction) -> None:
+        if not action.future.done():
+            action.future.set_result(True)
+
+    def verify(self, duration: float = 3.0) -> list:
+        """
+        Switch every channel on for `duration` seconds, all starting now
+        except the members of an interlock group, which take consecutive
+        `duration` slots separated by twice the interlock gap (the margin
+        absorbs timer jitter). Returns the RelayActions; the last finishes
+        at max(a.ends_at for a in actions).
+        """
+        actions = []
+        grouped = set()
+        spacing = 2 * self.interlock_gap
+        for group in self.interlocks:
+            members = [name for name in self.channels if name in group and name not in grouped]
+            for i, name in enumerate(members):
+                actions.append(self.pulse(name, duration, delay=i * (duration + spacing)))
+            grouped.update(members)
+        for name in self.channels:
+            if name not in grouped:
+                actions.append(self.pulse(name, duration))
+        return actions
+
+    def wait(self, actions, timeout: float = None) -> bool:
+        """
+        Wait for `actions` to finish. Returns True if all completed without
+        an interlock refusal within `timeout`.
+        """
+        done, pending = wait_futures([a.future for a in actions], timeout)
+        return not pending and all(not f.cancelled() and f.exception() is None for f in done)
+
+    # --- pins ------------------------------------------------------------
+
+    def release(self, name: str) -> None:
+        """
+        Switch `name` off and release its pin, failing its unfinished actions
+        with KeyError; other channels keep running.
+        """
+        with self._lock:
+            self.off(name)
+            claim = self._claims.pop(name, None)
+            error = KeyError(f"Relay channel {name!r} was released")
+            for action in list(self._actions.get(name, ())):
+                action._fail(error)
+        if claim is not None:
+            claim.release()
+
+    def close(self) -> None:
+        """Switch every channel off and release all pins."""
+        for name in list(self._claims):
+            self.release(name)
@@ -1,12 +1,42 @@
 # modules/rfid.py
 
-import time
-from mfrc522_i2c.mfrc522_i2c import MFRC522 as Reader
+from modules import backend
+from modules.i2c_bus import PRIORITY_LOW, get_bus
+
+Reader = backend.mfrc522_class()
+
+
+class _PooledReader(Reader):
+    """
+    The MFRC522 driver on a bus handle it is given. The driver's own
+    constructor opens a private SMBus(bus) and initialises the chip through
+    it; this one does the same initialisation on the pooled handle.
+    """
+
+    def __init__(self, i2c_bus, address):
+        self.i2cBus = i2c_bus
+        self.i2cAddress = address
+        # MFRC522.__init__ without its SMBus(); the init method is name-mangled
+        self._MFRC522__MFRC522_init()
+
 
 class RFID2:
-    def __init__(self, bus_id=1, address=0x28):
-        # Reader will open SMBus(bus_id) internally
-        self.reader = Reader(bus_id, address)
+    """
+    MFRC522 reader on I2C. Use as a context manager (or call close()) so the
+    bus handle is released even when a scan raises.
+
+    The reader's transactions go through the shared bus manager (at low
+    priority, since it is polled continuously) instead of a private SMBus.
+    """
+
+    def __init__(self, bus_id=1, address=0x28, priority=PRIORITY_LOW):
+        self.device = get_bus(bus_id).device(address, name="rfid", priority=priority)
+        try:
+            # Initialisation and every scan go through the scheduler
+            self.reader = _PooledReader(self.device.smbus(), address)
+        except Exception:
+            self.device.close()
+            raise
 
     def inventory(self):
         """Returns the UID (list of bytes) or None if no tag."""
@@ -16,6 +46,12 @@ class RFID2:
             return scan_res[1]
         return None
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def close(self):
-        # cleanly close the underlying SMBus
-        self.reader.i2cBus.close()
+        # Release the pooled bus handle (safe to call more than once)
+        self.device.close()
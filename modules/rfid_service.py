@@ -0,0 +1,222 @@
+# modules/rfid_service.py
+#
+# Background RFID scanning. RFIDService polls an RFID2 reader on its own
+# thread with an adaptive interval: fast while a tag is present, right after
+# one leaves, or while a caller expects a tap (expect()), and backing off
+# geometrically to the idle interval otherwise. Repeat reads of a tag that
+# is still in the field are deduplicated through a TTL cache of UIDs; the
+# service publishes timestamped arrival and departure events and records
+# the I2C time of every scan and the presence-to-detection latency bound.
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from modules.rfid import RFID2
+
+__all__ = ["TagEvent", "RFIDService"]
+
+ARRIVAL = "arrival"
+DEPARTURE = "departure"
+
+
+class TagEvent:
+    """
+    A tag arriving in or leaving the field.
+
+    `t` is time.monotonic() of the scan that detected the arrival, or of the
+    last scan that still saw the tag for a departure. For arrivals
+    `latency_s` bounds how long the tag was present before it was reported:
+    the time since the start of the previous (empty) scan.
+    """
+
+    def __init__(self, seq: int, kind: str, uid: tuple, t: float, latency_s: float = None):
+        self.seq = seq
+        self.kind = kind
+        self.uid = uid
+        self.t = t
+        self.latency_s = latency_s
+
+    @property
+    def uid_hex(self) -> str:
+        return ":".join(f"{b:02X}" for b in self.uid)
+
+    def to_dict(self) -> dict:
+        return {"seq": self.seq, "kind": self.kind, "uid": self.uid_hex, "t": self.t, "latency_s": self.latency_s}
+
+    def __repr__(self) -> str:
+        return f"TagEvent({self.kind} {self.uid_hex} at {self.t:.3f})"
+
+
+class RFIDService:
+    """
+    Adaptive-rate RFID scan loop with tag deduplication.
+
+    :param reader: RFID2 to poll; one is created (and closed on stop) if None
+    :param fast_interval: seconds between scans while a tag is likely
+    :param idle_interval: longest gap between scans while idle
+    :param backoff: factor the interval grows by after each empty scan
+    :param ttl: a tag not seen for this long has departed
+    :param linger: keep scanning fast this long after a departure (re-taps)
+    :param history: number of events and scan timings kept
+    """
+
+    def __init__(self, reader=None, fast_interval: float = 0.02, idle_interval: float = 0.25,
+                 backoff: float = 1.5, ttl: float = 0.5, linger: float = 2.0, history: int = 1000):
+        self._owns_reader = reader is None
+        self.reader = reader if reader is not None else RFID2()
+        self.fast_interval = fast_interval
+        self.idle_interval = idle_interval
+        self.backoff = backoff
+        self.ttl = ttl
+        self.linger = linger
+        self.events = deque(maxlen=history)
+        self.scan_times = deque(maxlen=history)
+        self.interval = fast_interval
+        self.scans = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.duplicates = 0
+        self._present = {}
+        self._fast_until = 0.0
+        self._last_miss = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        # Set to cut the current wait between scans short
+        self._wake = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> "RFIDService":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def start(self) -> "RFIDService":
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="rfid-scan", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Stop scanning; closes the reader if the service created it."""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+        if self._owns_reader:
+            self.reader.close()
+
+    def healthy(self, max_errors: int = 5) -> bool:
+        """True while the scan thread runs and the last `max_errors` scans have not all failed."""
+        return self._thread is not None and self._thread.is_alive() and self.consecutive_errors < max_errors
+
+    def expect(self, seconds: float) -> None:
+        """Scan at the fast rate for the next `seconds` (e.g. while prompting for a tap)."""
+        with self._cond:
+            self._fast_until = max(self._fast_until, time.monotonic() + seconds)
+            self.interval = self.fast_interval
+        self._wake.set()
+
+    # --- scan loop -------------------------------------------------------
+
+    def _publish(self, kind: str, uid: tuple, t: float, latency_s: float = None) -> None:
+        # Caller holds self._cond
+        self._seq += 1
+        self.events.append(TagEvent(self._seq, kind, uid, t, latency_s))
+        self._cond.notify_all()
+
+    def _scan_once(self) -> None:
+        started = time.monotonic()
+        try:
+            uid = self.reader.inventory()
+        except OSError:
+            # Bus glitches (NACK, timeout) count as an empty scan
+            uid = None
+            self.errors += 1
+            self.consecutive_errors += 1
+        else:
+            self.consecutive_errors = 0
+        now = time.monotonic()
+        self.scans += 1
+        self.scan_times.append(now - started)
+        with self._cond:
+            if uid:
+                uid = tuple(uid)
+                if uid in self._present:
+                    self.duplicates += 1
+                else:
+                    latency = None if self._last_miss is None else now - self._last_miss
+                    self._publish(ARRIVAL, uid, now, latency)
+                self._present[uid] = now
+            else:
+                self._last_miss = started
+            for tag, seen in list(self._present.items()):
+                if now - seen > self.ttl:
+                    del self._present[tag]
+                    self._fast_until = max(self._fast_until, now + self.linger)
+                    self._publish(DEPARTURE, tag, seen)
+            if self._present or now < self._fast_until:
+                self.interval = self.fast_interval
+            else:
+                self.interval = min(self.interval * self.backoff, self.idle_interval)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._scan_once()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    # --- consumers -------------------------------------------------------
+
+    def present(self) -> list:
+        """UIDs currently in the field."""
+        with self._cond:
+            return list(self._present)
+
+    def wait_for_event(self, kind: str = ARRIVAL, since: int = None, timeout: float = None):
+        """
+        Wait for an event of `kind` newer than sequence number `since`
+        (default: now). Returns the TagEvent or None on timeout.
+        """
+        with self._cond:
+            cursor = self._seq if since is None else since
+
+            def match():
+                return next((e for e in self.events if e.seq > cursor and e.kind == kind), None)
+
+            return self._cond.wait_for(match, timeout)
+
+    def wait_for_tag(self, timeout: float = None):
+        """
+        Return the arrival event of a tag already in the field, or wait up
+        to `timeout` seconds for the next one. Scans fast while waiting.
+        """
+        self.expect(timeout if timeout is not None else self.linger)
+        with self._cond:
+            for event in reversed(self.events):
+                if event.kind == ARRIVAL and event.uid in self._present:
+                    return event
+            return self.wait_for_event(ARRIVAL, self._seq, timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            scan_ms = np.asarray(self.scan_times, dtype=np.float64) * 1000.0
+            latencies = [e.latency_s for e in self.events if e.kind == ARRIVAL and e.latency_s is not None]
+            return {
+                "scans": self.scans,
+                "errors": self.errors,
+                "duplicates": self.duplicates,
+                "arrivals": sum(e.kind == ARRIVAL for e in self.events),
+                "departures": sum(e.kind == DEPARTURE for e in self.events),
+                "interval_s": round(self.interval, 4),
+                "scan_ms_mean": round(float(scan_ms.mean()), 3) if len(scan_ms) else None,
+                "scan_ms_p95": round(float(np.percentile(scan_ms, 95)), 3) if len(scan_ms) else None,
+                "latency_ms_mean": round(1000 * float(np.mean(latencies)), 3) if latencies else None,
+                "latency_ms_max": round(1000 * max(latencies), 3) if latencies else None,
+            }
@@ -0,0 +1,6 @@
+"""
+Deterministic simulators for every piece of station hardware.
+
+These are selected through ``modules.backend`` (``ARCULUS_BACKEND=sim``) and
+configured by the scenario in ``modules.sim.scenario``.
+"""
@@ -0,0 +1,305 @@
+"""
+gpio.py — Deterministic stand-in for RPi.GPIO.
+
+``GPIO`` mirrors the parts of the RPi.GPIO module the test suite uses
+(setmode/setup/input/output/cleanup and the edge-detection API). Input pins
+follow a script of timed level changes taken from the scenario, relative to
+the moment the pin was set up; everything else sits at its pull level.
+Scripts can also be extended at runtime with ``GPIO.script()`` or
+``GPIO.drive()``, and every output write is recorded in ``GPIO.output_log``.
+"""
+
+import bisect
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+from modules.sim.scenario import get_scenario
+
+__all__ = ["GPIO", "SimGPIO"]
+
+
+class _Channel:
+    def __init__(self, pin: int, direction: int, idle: int, origin: float):
+        self.pin = pin
+        self.direction = direction
+        self.origin = origin
+        self.times = [origin]
+        self.levels = [idle]
+        self.detect = None          # (edge, bouncetime_s) when event detection is on
+        self.callbacks = []
+        self.event_flag = False
+        self.last_fired = None
+
+    def level_at(self, t: float) -> int:
+        i = bisect.bisect_right(self.times, t) - 1
+        return self.levels[max(i, 0)]
+
+    def add_edge(self, t: float, level: int) -> None:
+        i = bisect.bisect_right(self.times, t)
+        self.times.insert(i, t)
+        self.levels.insert(i, level)
+
+    def next_edge(self, after: float, edge: int, const):
+        """Return (time, level) of the first transition after `after` that matches `edge`."""
+        i = bisect.bisect_right(self.times, after)
+        prev = self.levels[i - 1] if i > 0 else self.levels[0]
+        for t, level in zip(self.times[i:], self.levels[i:]):
+            if level != prev and _matches(edge, level, const):
+                return t, level
+            prev = level
+        return None
+
+
+def _matches(edge: int, level: int, const) -> bool:
+    if edge == const.BOTH:
+        return True
+    return (edge == const.RISING) == bool(level)
+
+
+class SimGPIO:
+    """Module-like object exposing the RPi.GPIO API."""
+
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    HIGH = 1
+    LOW = 0
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+    VERSION = "0.7.1-sim"
+    RPI_INFO = {"TYPE": "Simulated", "P1_REVISION": 3, "RAM": "Simulated"}
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._mode = None
+        self._channels = {}
+        self._events = []
+        self._seq = itertools.count()
+        self._dispatcher = None
+        self.output_log = deque(maxlen=10000)
+
+    # --- configuration -------------------------------------------------
+
+    def setwarnings(self, flag: bool) -> None:
+        pass
+
+    def setmode(self, mode: int) -> None:
+        with self._lock:
+            if self._mode is not None and self._mode != mode:
+                raise ValueError("A different mode has already been set!")
+            self._mode = mode
+
+    def getmode(self):
+        return self._mode
+
+    def setup(self, channel, direction: int, pull_up_down: int = PUD_OFF, initial: int = -1) -> None:
+        if isinstance(channel, (list, tuple)):
+            for ch in channel:
+                self.setup(ch, direction, pull_up_down, initial)
+            return
+        with self._lock:
+            if self._mode is None:
+                raise RuntimeError("Please set pin numbering mode using GPIO.setmode(GPIO.BOARD) or GPIO.setmode(GPIO.BCM)")
+            existing = self._channels.get(channel)
+            if existing is not None and existing.direction == direction:
+                return
+            now = time.monotonic()
+            if direction == self.OUT:
+                idle = self.HIGH if initial == self.HIGH else self.LOW
+                ch = _Channel(channel, direction, idle, now)
+                self.output_log.append((now, channel, idle))
+            else:
+                idle = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+                ch = _Channel(channel, direction, idle, now)
+                self._load_script(ch)
+            self._channels[channel] = ch
+            self._changed.notify_all()
+
+    def _load_script(self, ch: _Channel) -> None:
+        spec = get_scenario().get("gpio", {}).get(str(ch.pin))
+        if not spec:
+            return
+        for offset, level in spec.get("edges", []):
+            ch.add_edge(ch.origin + float(offset), int(level))
+        pulses = spec.get("pulses")
+        if pulses:
+            active = 1 - ch.levels[0]
+            start = float(pulses.get("start", 0.0))
+            width = float(pulses["width"])
+            period = float(pulses["period"])
+            for k in range(int(pulses.get("count", 1))):
+                t0 = ch.origin + start + k * period
+                ch.add_edge(t0, active)
+                ch.add_edge(t0 + width, 1 - active)
+
+    def cleanup(self, channel=None) -> None:
+        with self._lock:
+            if channel is None:
+                pins = list(self._channels)
+                self._mode = None
+            elif isinstance(channel, (list, tuple)):
+                pins = list(channel)
+            else:
+                pins = [channel]
+            for pin in pins:
+                self._channels.pop(pin, None)
+            self._changed.notify_all()
+
+    def gpio_function(self, channel: int) -> int:
+        ch = self._channels.get(channel)
+        return ch.direction if ch is not None else self.IN
+
+    # --- level access --------------------------------------------------
+
+    def _channel(self, channel: int) -> _Channel:
+        ch = self._channels.get(channel)
+        if ch is None:
+            raise RuntimeError("You must setup() the GPIO channel first")
+        return ch
+
+    def input(self, channel: int) -> int:
+        with self._lock:
+            return self._channel(channel).level_at(time.monotonic())
+
+    def output(self, channel, value) -> None:
+        if isinstance(channel, (list, tuple)):
+            values = value if isinstance(value, (list, tuple)) else [value] * len(channel)
+            for ch, v in zip(channel, values):
+                self.output(ch, v)
+            return
+        with self._lock:
+            ch = self._channel(channel)
+            if ch.direction != self.OUT:
+                raise RuntimeError("The GPIO channel has not been set up as an OUTPUT")
+            now = time.monotonic()
+            level = self.HIGH if value else self.LOW
+            ch.add_edge(now, level)
+            self.output_log.append((now, channel, level))
+
+    # --- simulation hooks ----------------------------------------------
+
+    def drive(self, channel: int, level: int, at: float = None) -> None:
+        """Force an input pin to `level`, now or at monotonic time `at`."""
+        self.script(channel, [(0.0 if at is None else at - time.monotonic(), level)])
+
+    def script(self, channel: int, edges) -> None:
+        """Append level changes, given as (seconds_from_now, level) pairs, to an input pin."""
+        with self._lock:
+            ch = self._channel(channel)
+            now = time.monotonic()
+            for offset, level in edges:
+                t = now + max(float(offset), 0.0)
+                ch.add_edge(t, int(level))
+                if ch.detect is not None:
+                    self._push(t, ch)
+            self._changed.notify_all()
+
+    def reset(self) -> None:
+        """Forget every channel, mode and logged output."""
+        with self._lock:
+            self._channels.clear()
+            self._events.clear()
+            self._mode = None
+            self.output_log.clear()
+            self._changed.notify_all()
+
+    # --- edge detection ------------------------------------------------
+
+    def add_event_detect(self, channel: int, edge: int, callback=None, bouncetime: int = None) -> None:
+        with self._lock:
+            ch = self._channel(channel)
+            if ch.direction != self.IN:
+                raise RuntimeError("You must setup() the GPIO channel as an input first")
+            if ch.detect is not None:
+                raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+            ch.detect = (edge, (bouncetime or 0) / 1000.0)
+            ch.callbacks = [callback] if callback else []
+            ch.event_flag = False
+            ch.last_fired = None
+            now = time.monotonic()
+            for t in ch.times:
+                if t > now:
+                    self._push(t, ch)
+            self._ensure_dispatcher()
+            self._changed.notify_all()
+
+    def add_event_callback(self, channel: int, callback) -> None:
+        with self._lock:
+            ch = self._channel(channel)
+            if ch.detect is None:
+                raise RuntimeError("Add event detection using add_event_detect first before adding a callback")
+            ch.callbacks.append(callback)
+
+    def remove_event_detect(self, channel: int) -> None:
+        with self._lock:
+            ch = self._channels.get(channel)
+            if ch is not None:
+                ch.detect = None
+                ch.callbacks = []
+
+    def event_detected(self, channel: int) -> bool:
+        with self._lock:
+            ch = self._channel(channel)
+            flag, ch.event_flag = ch.event_flag, False
+            return flag
+
+    def wait_for_edge(self, channel: int, edge: int, bouncetime: int = None, timeout: int = None):
+        deadline = None if timeout is None else time.monotonic() + timeout / 1000.0
+        with self._lock:
+            after = time.monotonic()
+            while True:
+                ch = self._channel(channel)
+                hit = ch.next_edge(after, edge, self)
+                now = time.monotonic()
+                if hit is not None and hit[0] <= now:
+                    return channel
+                wake = hit[0] if hit is not None else None
+                if deadline is not None:
+                    if now >= deadline:
+                        return None
+                    wake = deadline if wake is None else min(wake, deadline)
+                self._changed.wait(None if wake is None else max(wake - now, 0.0))
+
+    def _push(self, t: float, ch: _Channel) -> None:
+        heapq.heappush(self._events, (t, next(self._seq), ch))
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch, name="sim-gpio-events", daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._lock:
+                while True:
+                    now = time.monotonic()
+                    if self._events and self._events[0][0] <= now:
+                        t, _, ch = heapq.heappop(self._events)
+                        break
+                    timeout = self._events[0][0] - now if self._events else None
+                    self._changed.wait(timeout)
+                if ch.detect is None or self._channels.get(ch.pin) is not ch:
+                    continue
+                edge, bounce = ch.detect
+                level = ch.level_at(t)
+                if level == ch.level_at(t - 1e-9) or not _matches(edge, level, self):
+                    continue
+                if ch.last_fired is not None and t - ch.last_fired < bounce:
+                    continue
+                ch.last_fired = t
+                ch.event_flag = True
+                callbacks = list(ch.callbacks)
+            for cb in callbacks:
+                cb(ch.pin)
+
+
+GPIO = SimGPIO()
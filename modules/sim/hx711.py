@@ -0,0 +1,168 @@
+"""
+hx711.py — Simulated HX711 load cell amplifier.
+
+Mirrors the subset of the ``hx711`` package API used by the suite
+(``_read``, ``get_raw_data_mean``, ``reset``, ``zero``, ``power_down``,
+``power_up``). Raw counts are generated as
+
+    zero_offset + load_grams * counts_per_gram + drift_per_s * t + noise
+
+with seeded Gaussian noise, occasional glitch samples (0 or the saturated
+-1 the real chip returns on a bad clock) and conversions paced at
+``data_rate`` samples per second (0 disables pacing). Per-channel overrides
+live under ``scenario["hx711"]["pins"][str(dout_pin)]``.
+
+``HX711Bank`` mirrors ``modules.hx711_bank.HX711Bank`` (several chips on one
+shared clock) on top of one simulated chip per DOUT pin.
+"""
+
+import random
+import threading
+import time
+
+from modules.sim.scenario import get_scenario
+
+__all__ = ["HX711", "HX711Bank"]
+
+
+class HX711:
+    def __init__(self, dout_pin: int, pd_sck_pin: int, gain_channel_A: int = 128, select_channel: str = "A"):
+        self._dout = dout_pin
+        self._pd_sck = pd_sck_pin
+        self._gain_channel_A = gain_channel_A
+        self._channel = select_channel
+
+        spec = dict(get_scenario().get("hx711", {}))
+        spec.update(spec.pop("pins", {}).get(str(dout_pin), {}))
+        self.sim_zero_offset = float(spec.get("zero_offset", 0.0))
+        self.sim_counts_per_gram = float(spec.get("counts_per_gram", 1.0))
+        self.sim_load_grams = float(spec.get("load_grams", 0.0))
+        self.sim_noise = float(spec.get("noise", 0.0))
+        self.sim_drift_per_s = float(spec.get("drift_per_s", 0.0))
+        self.sim_glitch_rate = float(spec.get("glitch_rate", 0.0))
+        self.sim_data_rate = float(spec.get("data_rate", 0.0))
+
+        seed = get_scenario().get("seed", 0)
+        self._rng = random.Random(f"{seed}:hx711:{dout_pin}")
+        self._lock = threading.Lock()
+        self._origin = time.monotonic()
+        self._next_ready = self._origin
+        self._powered = True
+        self._offset = 0.0
+        self._scale_ratio = 1.0
+        self.sample_count = 0
+
+    # --- simulation hooks ----------------------------------------------
+
+    def set_load(self, grams: float) -> None:
+        """Change the simulated load on the platform."""
+        self.sim_load_grams = float(grams)
+
+    def expected_raw(self) -> float:
+        """Noise-free raw count for the current load and drift."""
+        t = time.monotonic() - self._origin
+        return self.sim_zero_offset + self.sim_load_grams * self.sim_counts_per_gram + self.sim_drift_per_s * t
+
+    # --- hx711 API -------------------------------------------------------
+
+    def _read(self):
+        with self._lock:
+            if not self._powered:
+                return False
+            if self.sim_data_rate > 0:
+                now = time.monotonic()
+                if now < self._next_ready:
+                    time.sleep(self._next_ready - now)
+                self._next_ready = max(now, self._next_ready) + 1.0 / self.sim_data_rate
+            self.sample_count += 1
+            if self.sim_glitch_rate and self._rng.random() < self.sim_glitch_rate:
+                return self._rng.choice((0, -1))
+            value = self.expected_raw()
+            if self.sim_noise:
+                value += self._rng.gauss(0.0, self.sim_noise)
+            return int(round(value))
+
+    def get_raw_data(self, readings: int = 30):
+        return [self._read() for _ in range(readings)]
+
+    def get_raw_data_mean(self, readings: int = 30):
+        values = [v for v in self.get_raw_data(readings) if v is not False]
+        if not values:
+            return False
+        return sum(values) / len(values)
+
+    def get_data_mean(self, readings: int = 30):
+        raw = self.get_raw_data_mean(readings)
+        return False if raw is False else raw - self._offset
+
+    def get_weight_mean(self, readings: int = 30):
+        data = self.get_data_mean(readings)
+        return False if data is False else data / self._scale_ratio
+
+    def set_scale_ratio(self, scale_ratio: float) -> None:
+        self._scale_ratio = scale_ratio
+
+    def zero(self, readings: int = 30) -> bool:
+        raw = self.get_raw_data_mean(readings)
+        if raw is False:
+            return True
+        self._offset = raw
+        return False
+
+    def reset(self) -> bool:
+        self.power_down()
+        self.power_up()
+        return False
+
+    def power_down(self) -> None:
+        with self._lock:
+            self._powered = False
+
+    def power_up(self) -> None:
+        with self._lock:
+            self._powered = True
+            # The chip needs one conversion period to settle after power-up
+            if self.sim_data_rate > 0:
+                self._next_ready = time.monotonic() + 1.0 / self.sim_data_rate
+
+
+class HX711Bank:
+    """
+    Simulated HX711 chips sharing one PD_SCK line (mirrors modules.hx711_bank.HX711Bank).
+
+    Each DOUT pin is backed by a simulated HX711 with that pin's scenario
+    overrides; read() returns one sample per chip from the same conversion.
+    """
+
+    def __init__(self, pd_sck_pin: int, dout_pins, gain: int = 128):
+        self.pd_sck_pin = pd_sck_pin
+        self.dout_pins = list(dout_pins)
+        self.gain = gain
+        self.chips = [HX711(pin, pd_sck_pin, gain_channel_A=gain) for pin in self.dout_pins]
+        from modules.hx711_bank import claim_pins
+        self._claims = claim_pins(pd_sck_pin, self.dout_pins, owner='hx711-bank')
+
+    def close(self) -> None:
+        while self._claims:
+            self._claims.pop().release()
+
+    def ready(self) -> bool:
+        return all(chip._powered for chip in self.chips)
+
+    def read(self):
+        values = [chip._read() for chip in self.chips]
+        if any(v is False for v in values):
+            return False
+        return values
+
+    def power_down(self) -> None:
+        for chip in self.chips:
+            chip.power_down()
+
+    def power_up(self) -> None:
+        for chip in self.chips:
+            chip.power_up()
+
+    def reset(self) -> None:
+        self.power_down()
+        self.power_up()
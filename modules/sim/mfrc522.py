@@ -0,0 +1,58 @@
+"""
+mfrc522.py — Simulated MFRC522 reader on I2C.
+
+Mirrors the ``mfrc522_i2c.MFRC522`` surface used by ``modules.rfid``:
+the constructor opens its own bus as ``i2cBus``, stores ``i2cAddress`` and
+initialises the chip through the private ``__MFRC522_init()``, and
+``scan()`` returns ``(status, uid_bytes)``. Tags are presented according to
+``scenario["rfid"]["tags"]``, a list of ``[start_s, end_s, uid]`` windows
+measured from the moment the reader is created.
+"""
+
+import time
+
+from modules.sim.scenario import get_scenario
+from modules.sim.smbus import SMBus
+
+__all__ = ["MFRC522"]
+
+# Transactions one REQA + anticollision round takes on the real chip
+_SCAN_TRANSACTIONS = 6
+
+
+class MFRC522:
+    MI_OK = 0
+    MI_NOTAGERR = 1
+    MI_ERR = 2
+
+    def __init__(self, Bus: int = 1, Address: int = 0x28):
+        self.i2cBus = SMBus(Bus)
+        self.i2cAddress = Address
+        self.__MFRC522_init()
+
+    def __MFRC522_init(self) -> None:
+        # Soft reset, like the real driver's first register write
+        self.i2cBus.write_byte_data(self.i2cAddress, 0x01, 0x0F)
+        origin = time.monotonic()
+        self._tags = [
+            (origin + float(start), origin + float(end), [int(b) for b in uid])
+            for start, end, uid in get_scenario().get("rfid", {}).get("tags", [])
+        ]
+
+    # --- simulation hooks ----------------------------------------------
+
+    def present(self, uid, duration: float, delay: float = 0.0) -> None:
+        """Hold tag `uid` in the field for `duration` seconds, starting after `delay`."""
+        start = time.monotonic() + delay
+        self._tags.append((start, start + duration, list(uid)))
+
+    # --- reader API ------------------------------------------------------
+
+    def scan(self):
+        for _ in range(_SCAN_TRANSACTIONS):
+            self.i2cBus.read_byte_data(self.i2cAddress, 0x04)
+        now = time.monotonic()
+        for start, end, uid in self._tags:
+            if start <= now < end:
+                return self.MI_OK, list(uid)
+        return self.MI_NOTAGERR, []
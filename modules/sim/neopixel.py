@@ -0,0 +1,80 @@
+"""
+neopixel.py — Simulated NeoPixel strip and Blinka ``board`` pins.
+
+``NeoPixel`` keeps the pixel values in a plain list and copies them into
+``frame`` on every ``show()``, counting writes in ``show_count`` and the
+time of each in ``show_times`` so animation timing can be inspected without
+a strip attached.
+"""
+
+import time
+from collections import deque
+
+__all__ = ["NeoPixel", "board", "RGB", "GRB", "RGBW", "GRBW"]
+
+RGB = "RGB"
+GRB = "GRB"
+RGBW = "RGBW"
+GRBW = "GRBW"
+
+
+class _Board:
+    """Stand-in for Blinka's ``board`` module: any ``D<n>`` attribute is a pin name."""
+
+    def __getattr__(self, name: str) -> str:
+        if name.startswith("D") and name[1:].isdigit():
+            return name
+        if name in ("SCL", "SDA", "MOSI", "MISO", "SCK"):
+            return name
+        raise AttributeError(name)
+
+
+board = _Board()
+
+
+class NeoPixel:
+    def __init__(self, pin, n: int, *, bpp: int = 3, brightness: float = 1.0,
+                 auto_write: bool = True, pixel_order: str = None):
+        self.pin = pin
+        self.n = n
+        self.bpp = bpp
+        self.brightness = brightness
+        self.auto_write = auto_write
+        self.pixel_order = pixel_order or GRB
+        self._pixels = [(0,) * bpp] * n
+        self.frame = list(self._pixels)
+        self.show_count = 0
+        self.show_times = deque(maxlen=10000)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _normalise(self, value):
+        if isinstance(value, int):
+            value = ((value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF)
+        return tuple(int(c) for c in value)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            for i, v in zip(range(*index.indices(self.n)), value):
+                self._pixels[i] = self._normalise(v)
+        else:
+            self._pixels[index] = self._normalise(value)
+        if self.auto_write:
+            self.show()
+
+    def __getitem__(self, index):
+        return self._pixels[index]
+
+    def fill(self, color) -> None:
+        self._pixels = [self._normalise(color)] * self.n
+        if self.auto_write:
+            self.show()
+
+    def show(self) -> None:
+        self.frame = list(self._pixels)
+        self.show_count += 1
+        self.show_times.append(time.monotonic())
+
+    def deinit(self) -> None:
+        self.fill((0,) * self.bpp)
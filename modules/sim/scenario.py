@@ -0,0 +1,112 @@
+"""
+scenario.py — Configuration for the simulated hardware backend.
+
+A scenario describes what the simulated station "sees": scripted GPIO edges,
+the load on each HX711, the QR codes arriving on each serial port, the RFID
+tags presented to the reader and which cameras exist. All times are seconds
+relative to the moment the simulated device was set up or opened.
+
+The defaults below match the wiring used by main.py, so every menu entry
+passes without any operator involvement. Override any part of it with a JSON
+file named by ``ARCULUS_SIM_SCENARIO``; the file is deep-merged over the
+defaults, e.g.:
+
+    {"gpio": {"23": {"edges": [[1.0, 0], [1.5, 1]]}},
+     "hx711": {"load_grams": 500.0, "noise": 40.0}}
+"""
+
+import copy
+import json
+import os
+import threading
+
+__all__ = ["SCENARIO_ENV", "DEFAULT_SCENARIO", "get_scenario", "set_scenario"]
+
+SCENARIO_ENV = "ARCULUS_SIM_SCENARIO"
+
+DEFAULT_SCENARIO = {
+    "seed": 1234,
+    "gpio": {
+        # Endstops (pull-up): press then release shortly after setup
+        "23": {"edges": [[0.20, 0], [0.35, 1]]},
+        "24": {"edges": [[0.50, 0], [0.65, 1]]},
+        # PIR (pull-down): first pulse after main.py's 10 s calibration window,
+        # then one pulse every 4 s
+        "17": {"pulses": {"start": 10.5, "width": 0.5, "period": 4.0, "count": 100}},
+    },
+    "hx711": {
+        "zero_offset": 2230937.88,
+        "counts_per_gram": -237.63,
+        # A test weight already on the platform, so the weight test has a load to find
+        "load_grams": 500.0,
+        "noise": 25.0,
+        "drift_per_s": 0.0,
+        "glitch_rate": 0.0,
+        "data_rate": 80.0,
+        "pins": {},
+    },
+    "serial": {
+        "/dev/ttyACM0": {
+            "description": "Simulated QR scanner",
+            "serial_number": "SIMQR0001",
+            "messages": [[0.2, "ARCULUS-SIM-0001"]],
+        },
+    },
+    "rfid": {
+        "tags": [[0.3, 5.0, [0x04, 0xA2, 0x1B, 0x3C]]],
+    },
+    "i2c": {
+        # bus -> responding 7-bit addresses and per-transaction latency
+        "1": {"devices": ["0x28", "0x43"], "latency": 0.0},
+    },
+    "cameras": {
+        "indices": [0, 1],
+        "open_delay": 0.0,
+        "negotiate_delay": 0.0,
+        "fps": 0.0,
+        # e.g. {"text": "BOX-0042", "size": 0.3, "drift": 3} paints a QR code into every frame
+        "qr": None,
+    },
+    "picamera": {
+        "count": 1,
+        "sensor_resolution": [2028, 1520],
+        "ae_settle_time": 0.3,
+    },
+}
+
+_lock = threading.Lock()
+_scenario = None
+
+
+def _merge(base: dict, override: dict) -> dict:
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def get_scenario() -> dict:
+    """Return the active scenario, loading ``ARCULUS_SIM_SCENARIO`` on first use."""
+    global _scenario
+    with _lock:
+        if _scenario is None:
+            scenario = copy.deepcopy(DEFAULT_SCENARIO)
+            path = os.environ.get(SCENARIO_ENV)
+            if path:
+                with open(path) as fh:
+                    _merge(scenario, json.load(fh))
+            _scenario = scenario
+        return _scenario
+
+
+def set_scenario(overrides: dict = None) -> dict:
+    """
+    Replace the active scenario with the defaults merged with ``overrides``.
+    Only devices created afterwards pick up the change.
+    """
+    global _scenario
+    with _lock:
+        _scenario = _merge(copy.deepcopy(DEFAULT_SCENARIO), overrides or {})
+        return _scenario
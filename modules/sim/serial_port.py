@@ -0,0 +1,153 @@
+"""
+serial_port.py — Simulated pyserial module for the QR scanner.
+
+Exposes ``Serial``, ``SerialException`` and ``comports()``. Each port listed
+under ``scenario["serial"]`` delivers its scripted messages (CR/LF
+terminated, like the scanner) at the given offsets after the port is opened.
+Opening any other port raises ``SerialException`` just as pyserial does.
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+from modules.sim.scenario import get_scenario
+
+__all__ = ["Serial", "SerialException", "SerialTimeoutException", "comports"]
+
+
+class SerialException(IOError):
+    pass
+
+
+class SerialTimeoutException(SerialException):
+    pass
+
+
+def comports():
+    """Return port descriptors shaped like ``serial.tools.list_ports.comports()``."""
+    ports = []
+    for device, spec in sorted(get_scenario().get("serial", {}).items()):
+        ports.append(SimpleNamespace(
+            device=device,
+            name=device.rsplit("/", 1)[-1],
+            description=spec.get("description", "Simulated serial port"),
+            hwid=spec.get("hwid", "SIM"),
+            vid=spec.get("vid"),
+            pid=spec.get("pid"),
+            serial_number=spec.get("serial_number"),
+            manufacturer=spec.get("manufacturer", "Simulated"),
+            product=spec.get("product"),
+            location=spec.get("location"),
+        ))
+    return ports
+
+
+class Serial:
+    def __init__(self, port: str = None, baudrate: int = 9600, timeout: float = None, **kwargs):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._buffer = bytearray()
+        self._pending = []
+        self.is_open = False
+        self.written = bytearray()
+        if port is not None:
+            self.open()
+
+    def open(self) -> None:
+        spec = get_scenario().get("serial", {}).get(self.port)
+        if spec is None:
+            raise SerialException(f"[Errno 2] could not open port {self.port}: No such file or directory")
+        origin = time.monotonic()
+        self._pending = sorted(
+            (origin + float(offset), (text if isinstance(text, bytes) else text.encode("utf-8")) + b"\r\n")
+            for offset, text in spec.get("messages", [])
+        )
+        self.is_open = True
+
+    def close(self) -> None:
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- simulation hooks ----------------------------------------------
+
+    def inject(self, data, delay: float = 0.0) -> None:
+        """Queue `data` to arrive after `delay` seconds."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self._cond:
+            self._pending.append((time.monotonic() + delay, bytes(data)))
+            self._pending.sort()
+            self._cond.notify_all()
+
+    # --- pyserial API ----------------------------------------------------
+
+    def _arrive(self) -> float:
+        """Move due messages into the buffer; return the next arrival time or None."""
+        now = time.monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            self._buffer += self._pending.pop(0)[1]
+        return self._pending[0][0] if self._pending else None
+
+    def _check_open(self) -> None:
+        if not self.is_open:
+            raise SerialException("Attempting to use a port that is not open")
+
+    @property
+    def in_waiting(self) -> int:
+        with self._cond:
+            self._check_open()
+            self._arrive()
+            return len(self._buffer)
+
+    def _read_until(self, done, size=None) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                self._check_open()
+                nxt = self._arrive()
+                cut = done(self._buffer)
+                if cut is not None:
+                    break
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    cut = len(self._buffer) if size is None else min(size, len(self._buffer))
+                    break
+                wake = nxt
+                if deadline is not None:
+                    wake = deadline if wake is None else min(wake, deadline)
+                self._cond.wait(None if wake is None else max(wake - now, 0.0))
+            data = bytes(self._buffer[:cut])
+            del self._buffer[:cut]
+            return data
+
+    def read(self, size: int = 1) -> bytes:
+        return self._read_until(lambda buf: size if len(buf) >= size else None, size)
+
+    def readline(self) -> bytes:
+        def done(buf):
+            i = buf.find(b"\n")
+            return None if i < 0 else i + 1
+        return self._read_until(done)
+
+    def write(self, data) -> int:
+        self._check_open()
+        self.written += data
+        return len(data)
+
+    def reset_input_buffer(self) -> None:
+        with self._cond:
+            self._arrive()
+            self._buffer.clear()
+
+    def flush(self) -> None:
+        pass
@@ -0,0 +1,94 @@
+"""
+smbus.py — Simulated SMBus handle.
+
+Devices listed under ``scenario["i2c"][str(bus)]["devices"]`` acknowledge
+and behave as plain 256-byte register files; any other address NACKs with
+the same ``OSError(121)`` the kernel driver raises. Every transaction costs
+the configured ``latency`` and is counted in ``SMBus.transactions``.
+"""
+
+import errno
+import threading
+import time
+
+from modules.sim.scenario import get_scenario
+
+__all__ = ["SMBus"]
+
+_registers = {}
+_registers_lock = threading.Lock()
+
+
+def _parse_address(addr) -> int:
+    return int(addr, 0) if isinstance(addr, str) else int(addr)
+
+
+class SMBus:
+    def __init__(self, bus: int = None):
+        self.bus = bus
+        self.transactions = 0
+        self._open = False
+        if bus is not None:
+            self.open(bus)
+
+    def open(self, bus: int) -> None:
+        spec = get_scenario().get("i2c", {}).get(str(bus))
+        if spec is None:
+            raise FileNotFoundError(errno.ENOENT, f"No such file or directory: '/dev/i2c-{bus}'")
+        self.bus = bus
+        self._devices = {_parse_address(a) for a in spec.get("devices", [])}
+        self._latency = float(spec.get("latency", 0.0))
+        self._open = True
+
+    def close(self) -> None:
+        self._open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _transact(self, addr: int) -> bytearray:
+        if not self._open:
+            raise OSError(errno.EBADF, "Bad file descriptor")
+        self.transactions += 1
+        if self._latency:
+            time.sleep(self._latency)
+        if addr not in self._devices:
+            raise OSError(errno.EREMOTEIO, "Remote I/O error")
+        with _registers_lock:
+            return _registers.setdefault((self.bus, addr), bytearray(256))
+
+    def write_quick(self, addr: int) -> None:
+        self._transact(addr)
+
+    def read_byte(self, addr: int) -> int:
+        return self._transact(addr)[0]
+
+    def write_byte(self, addr: int, value: int) -> None:
+        self._transact(addr)[0] = value & 0xFF
+
+    def read_byte_data(self, addr: int, register: int) -> int:
+        return self._transact(addr)[register & 0xFF]
+
+    def write_byte_data(self, addr: int, register: int, value: int) -> None:
+        self._transact(addr)[register & 0xFF] = value & 0xFF
+
+    def read_word_data(self, addr: int, register: int) -> int:
+        regs = self._transact(addr)
+        return regs[register & 0xFF] | (regs[(register + 1) & 0xFF] << 8)
+
+    def write_word_data(self, addr: int, register: int, value: int) -> None:
+        regs = self._transact(addr)
+        regs[register & 0xFF] = value & 0xFF
+        regs[(register + 1) & 0xFF] = (value >> 8) & 0xFF
+
+    def read_i2c_block_data(self, addr: int, register: int, length: int = 32) -> list:
+        regs = self._transact(addr)
+        return [regs[(register + i) & 0xFF] for i in range(length)]
+
+    def write_i2c_block_data(self, addr: int, register: int, data) -> None:
+        regs = self._transact(addr)
+        for i, value in enumerate(data):
+            regs[(register + i) & 0xFF] = value & 0xFF
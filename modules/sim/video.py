@@ -0,0 +1,389 @@
+"""
+video.py — Synthetic frame sources standing in for cv2.VideoCapture and Picamera2.
+
+``cv2`` is a module that re-exports the real OpenCV (when installed) with
+``VideoCapture`` swapped for a synthetic capture. Without OpenCV it falls
+back to NumPy/Pillow implementations of the handful of functions the suite
+calls. Frames are a seeded noise texture over a gradient that scrolls by a
+few pixels per frame, so consecutive frames differ and are reproducible.
+
+Cameras listed in ``scenario["cameras"]["indices"]`` open; the others fail
+like an absent /dev/video node. ``open_delay`` and ``negotiate_delay``
+model the V4L2 open and format negotiation cost, and a non-zero ``fps``
+paces ``grab()`` like a real sensor. An optional ``qr`` entry paints a QR
+code into every frame (see overlay_qr()).
+"""
+
+import os
+import threading
+import time
+import types
+
+import numpy as np
+
+try:
+    import cv2 as _real_cv2
+except ImportError:
+    _real_cv2 = None
+
+from modules.sim.scenario import get_scenario
+
+__all__ = ["cv2", "VideoCapture", "Picamera2", "video_nodes", "v4l2_nodes", "synthetic_frame", "overlay_qr"]
+
+_textures = {}
+_textures_lock = threading.Lock()
+
+
+def _texture(width: int, height: int, seed: int) -> np.ndarray:
+    key = (width, height, seed)
+    with _textures_lock:
+        tex = _textures.get(key)
+        if tex is None:
+            rng = np.random.default_rng(seed)
+            x = np.linspace(0, 200, width, dtype=np.float32)[None, :, None]
+            y = np.linspace(0, 55, height, dtype=np.float32)[:, None, None]
+            tex = (x + y + rng.integers(0, 48, (height, width, 3), dtype=np.uint8)).clip(0, 255).astype(np.uint8)
+            _textures[key] = tex
+        return tex
+
+
+def synthetic_frame(width: int, height: int, frame_no: int, seed: int = 0, out: np.ndarray = None) -> np.ndarray:
+    """Render frame `frame_no` of the synthetic sequence, into `out` when given."""
+    tex = _texture(width, height, seed)
+    shift = (frame_no * 8) % width
+    if out is None:
+        out = np.empty_like(tex)
+    out[:, :width - shift] = tex[:, shift:]
+    out[:, width - shift:] = tex[:, :shift]
+    return out
+
+
+def _qr_code(text: str, side: int) -> np.ndarray:
+    key = (text, side)
+    with _textures_lock:
+        code = _textures.get(key)
+        if code is None:
+            modules = _real_cv2.QRCodeEncoder.create().encode(text)
+            scale = max(1, side // modules.shape[0])
+            code = _textures[key] = np.kron(modules, np.ones((scale, scale), dtype=np.uint8))
+        return code
+
+
+def overlay_qr(frame: np.ndarray, frame_no: int) -> np.ndarray:
+    """
+    Paint the scenario's QR code (``scenario["cameras"]["qr"]``) into `frame`.
+    The code covers `size` of the frame height and moves `drift` pixels per
+    frame, bouncing between the frame edges. Needs OpenCV's QR encoder;
+    without it frames are left unchanged.
+    """
+    spec = get_scenario().get("cameras", {}).get("qr")
+    if not spec or _real_cv2 is None:
+        return frame
+    height, width = frame.shape[:2]
+    code = _qr_code(str(spec["text"]), int(height * float(spec.get("size", 0.3))))
+    side = code.shape[0]
+    travel = max(width - side, 1)
+    x = int(spec.get("x", travel // 2) + frame_no * float(spec.get("drift", 0.0))) % (2 * travel)
+    x = x if x < travel else 2 * travel - x
+    y = (height - side) // 2
+    frame[y:y + side, x:x + side] = code[..., None]
+    return frame
+
+
+def _write_image(path: str, image: np.ndarray, quality: int = 95) -> bool:
+    if _real_cv2 is not None:
+        return bool(_real_cv2.imwrite(path, image))
+    from PIL import Image
+    Image.fromarray(np.ascontiguousarray(image[..., ::-1])).save(path, quality=quality)
+    return True
+
+
+class VideoCapture:
+    def __init__(self, index=0, api_preference: int = None):
+        spec = get_scenario().get("cameras", {})
+        self.index = index
+        self._fps = float(spec.get("fps", 0.0))
+        self._negotiate_delay = float(spec.get("negotiate_delay", 0.0))
+        self._seed = int(get_scenario().get("seed", 0)) + (index if isinstance(index, int) else 0)
+        self._width = 640
+        self._height = 480
+        self._frame_no = 0
+        self._grabbed = False
+        self._next_frame = 0.0
+        time.sleep(float(spec.get("open_delay", 0.0)))
+        self._opened = index in spec.get("indices", [])
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def set(self, prop: int, value) -> bool:
+        if not self._opened:
+            return False
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self._width = int(value)
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self._height = int(value)
+        elif prop == cv2.CAP_PROP_FPS:
+            self._fps = float(value)
+        else:
+            return True
+        if self._negotiate_delay:
+            time.sleep(self._negotiate_delay)
+        return True
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self._width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self._height)
+        if prop == cv2.CAP_PROP_FPS:
+            return self._fps
+        return 0.0
+
+    def grab(self) -> bool:
+        if not self._opened:
+            return False
+        if self._fps > 0:
+            now = time.monotonic()
+            if now < self._next_frame:
+                time.sleep(self._next_frame - now)
+            self._next_frame = max(now, self._next_frame) + 1.0 / self._fps
+        self._frame_no += 1
+        self._grabbed = True
+        return True
+
+    def retrieve(self, image: np.ndarray = None, flag: int = 0):
+        if not self._grabbed:
+            return False, None
+        if image is not None and image.shape != (self._height, self._width, 3):
+            image = None
+        frame = synthetic_frame(self._width, self._height, self._frame_no, self._seed, image)
+        return True, overlay_qr(frame, self._frame_no)
+
+    def read(self, image: np.ndarray = None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def release(self) -> None:
+        self._opened = False
+        self._grabbed = False
+
+
+def _build_cv2() -> types.ModuleType:
+    mod = types.ModuleType("cv2", "OpenCV with a synthetic VideoCapture (simulated backend)")
+    if _real_cv2 is not None:
+        mod.__dict__.update({k: v for k, v in vars(_real_cv2).items() if not k.startswith("__")})
+    else:
+        mod.CAP_ANY = 0
+        mod.CAP_V4L2 = 200
+        mod.CAP_PROP_FRAME_WIDTH = 3
+        mod.CAP_PROP_FRAME_HEIGHT = 4
+        mod.CAP_PROP_FPS = 5
+        mod.CAP_PROP_FOURCC = 6
+        mod.CAP_PROP_BUFFERSIZE = 38
+        mod.ROTATE_90_CLOCKWISE = 0
+        mod.ROTATE_180 = 1
+        mod.ROTATE_90_COUNTERCLOCKWISE = 2
+        mod.IMWRITE_JPEG_QUALITY = 1
+        mod.COLOR_BGR2RGB = 4
+        mod.COLOR_RGB2BGR = 4
+        mod.COLOR_BGR2GRAY = 6
+        mod.COLOR_RGB2GRAY = 7
+
+        def rotate(src, code, dst=None):
+            if code == mod.ROTATE_180:
+                out = src[::-1, ::-1]
+            elif code == mod.ROTATE_90_CLOCKWISE:
+                out = np.rot90(src, -1)
+            else:
+                out = np.rot90(src, 1)
+            if dst is not None:
+                np.copyto(dst, out)
+                return dst
+            return np.ascontiguousarray(out)
+
+        def flip(src, code, dst=None):
+            out = src[::-1] if code == 0 else src[:, ::-1] if code > 0 else src[::-1, ::-1]
+            if dst is not None:
+                np.copyto(dst, out)
+                return dst
+            return np.ascontiguousarray(out)
+
+        def cvtColor(src, code):
+            if code == mod.COLOR_BGR2RGB:
+                return np.ascontiguousarray(src[..., ::-1])
+            weights = (0.114, 0.587, 0.299) if code == mod.COLOR_BGR2GRAY else (0.299, 0.587, 0.114)
+            return (src[..., :3] @ np.array(weights, dtype=np.float32)).astype(np.uint8)
+
+        def imwrite(path, image, params=None):
+            return _write_image(path, image)
+
+        def imencode(ext, image, params=None):
+            import io
+            from PIL import Image
+            buf = io.BytesIO()
+            Image.fromarray(np.ascontiguousarray(image[..., ::-1])).save(buf, format=ext.lstrip(".").upper().replace("JPG", "JPEG"))
+            return True, np.frombuffer(buf.getvalue(), dtype=np.uint8)
+
+        mod.rotate = rotate
+        mod.flip = flip
+        mod.cvtColor = cvtColor
+        mod.imwrite = imwrite
+        mod.imencode = imencode
+    mod.VideoCapture = VideoCapture
+    return mod
+
+
+cv2 = _build_cv2()
+
+
+def v4l2_nodes():
+    """
+    VIDIOC_QUERYCAP-style descriptions of the simulated video nodes: a
+    capture and a metadata node per USB camera (like uvcvideo), a unicam
+    capture node per Picamera2 sensor and one codec node.
+    """
+    indices = sorted(get_scenario().get("cameras", {}).get("indices", []))
+    sensors = int(get_scenario().get("picamera", {}).get("count", 0))
+    nodes = []
+    meta_index = max(indices, default=-1) + 1
+    for i in indices:
+        bus = f"usb-sim-1.{i}"
+        device = f"/sys/devices/platform/sim-xhci/usb1/1-{i}/1-{i}:1.0"
+        nodes.append({"path": f"/dev/video{i}", "driver": "uvcvideo", "card": f"Sim USB Camera {i}",
+                      "bus_info": bus, "caps": 0x04200001, "device_path": device})
+        nodes.append({"path": f"/dev/video{meta_index}", "driver": "uvcvideo", "card": f"Sim USB Camera {i}",
+                      "bus_info": bus, "caps": 0x04A00000, "device_path": device})
+        meta_index += 1
+    for n in range(sensors):
+        nodes.append({"path": f"/dev/video{20 + n}", "driver": "unicam", "card": "unicam",
+                      "bus_info": f"platform:fe80{n}000.csi", "caps": 0x24200001,
+                      "device_path": f"/sys/devices/platform/soc/fe80{n}000.csi"})
+    nodes.append({"path": "/dev/video30", "driver": "bcm2835-codec", "card": "bcm2835-codec-decode",
+                  "bus_info": "platform:bcm2835-codec", "caps": 0x04204000,
+                  "device_path": "/sys/devices/platform/soc/bcm2835-codec"})
+    return sorted(nodes, key=lambda n: int(n["path"][len("/dev/video"):]))
+
+
+def video_nodes():
+    """The /dev/video* nodes the simulated devices would occupy."""
+    return [n["path"] for n in v4l2_nodes()]
+
+
+class Picamera2:
+    """
+    Simulated Picamera2. Metadata reports exposure and gains that converge
+    exponentially after ``start()`` with time constant ``ae_settle_time``.
+    """
+
+    def __init__(self, camera_num: int = 0):
+        spec = get_scenario().get("picamera", {})
+        if camera_num >= int(spec.get("count", 0)):
+            raise IndexError("list index out of range")
+        self.camera_num = camera_num
+        self.sensor_resolution = tuple(spec.get("sensor_resolution", (2028, 1520)))
+        self._settle = float(spec.get("ae_settle_time", 0.3))
+        self._frame_duration_us = int(1e6 / float(spec.get("fps", 30)))
+        self._seed = int(get_scenario().get("seed", 0)) + 100 + camera_num
+        self.camera_properties = {
+            "Model": "sim_imx477",
+            "PixelArraySize": self.sensor_resolution,
+            "Location": 2,
+        }
+        self.camera_config = None
+        self.started = False
+        self._started_at = None
+        self._frame_no = 0
+        self._closed = False
+
+    @staticmethod
+    def global_camera_info():
+        count = int(get_scenario().get("picamera", {}).get("count", 0))
+        return [
+            {"Model": "sim_imx477", "Location": 2, "Rotation": 0,
+             "Id": f"/base/soc/i2c0mux/i2c@1/imx477@1a/sim{n}", "Num": n}
+            for n in range(count)
+        ]
+
+    def _configuration(self, size, main=None, buffer_count=1, **kwargs) -> dict:
+        main = dict(main or {})
+        main.setdefault("size", tuple(size))
+        main.setdefault("format", "BGR888")
+        return {"main": main, "buffer_count": buffer_count, "controls": kwargs.get("controls", {})}
+
+    def create_still_configuration(self, main=None, **kwargs) -> dict:
+        return self._configuration(self.sensor_resolution, main, **kwargs)
+
+    def create_preview_configuration(self, main=None, **kwargs) -> dict:
+        return self._configuration((640, 480), main, buffer_count=4, **kwargs)
+
+    def create_video_configuration(self, main=None, **kwargs) -> dict:
+        return self._configuration((1280, 720), main, buffer_count=6, **kwargs)
+
+    def configure(self, config=None) -> None:
+        if self.started:
+            raise RuntimeError("Camera must be stopped before configuring")
+        self.camera_config = config or self.create_preview_configuration()
+
+    def start(self, config=None, show_preview=False) -> None:
+        if config is not None:
+            self.configure(config)
+        if self.camera_config is None:
+            self.configure()
+        self.started = True
+        self._started_at = time.monotonic()
+
+    def stop(self) -> None:
+        self.started = False
+
+    def close(self) -> None:
+        self.stop()
+        self._closed = True
+
+    def _convergence(self) -> float:
+        elapsed = time.monotonic() - self._started_at
+        if self._settle <= 0:
+            return 1.0
+        return 1.0 - float(np.exp(-elapsed / self._settle))
+
+    def _next_frame(self) -> None:
+        # Like libcamera, block until the next frame boundary
+        now = time.monotonic()
+        period = self._frame_duration_us / 1e6
+        frames = int((now - self._started_at) / period) + 1
+        time.sleep(max(0.0, self._started_at + frames * period - now))
+
+    def capture_metadata(self) -> dict:
+        if not self.started:
+            raise RuntimeError("Camera is not running")
+        self._next_frame()
+        c = self._convergence()
+        return {
+            "ExposureTime": int(10000 + 20000 * c),
+            "AnalogueGain": 1.0 + 3.0 * c,
+            "DigitalGain": 1.0,
+            "ColourGains": (1.2 + 0.6 * c, 1.1 + 0.5 * c),
+            "Lux": 40.0 + 360.0 * c,
+            "AeLocked": c > 0.99,
+            "SensorTimestamp": int(time.monotonic() * 1e9),
+            "FrameDuration": self._frame_duration_us,
+        }
+
+    def capture_array(self, name: str = "main") -> np.ndarray:
+        if not self.started:
+            raise RuntimeError("Camera is not running")
+        width, height = self.camera_config[name]["size"]
+        self._next_frame()
+        self._frame_no += 1
+        return overlay_qr(synthetic_frame(width, height, self._frame_no, self._seed), self._frame_no)
+
+    def capture_file(self, file_output, name: str = "main", format=None) -> dict:
+        frame = self.capture_array(name)
+        if isinstance(file_output, (str, os.PathLike)):
+            if not _write_image(os.fspath(file_output), frame):
+                raise RuntimeError(f"Failed to write {file_output}")
+        else:
+            ok, data = cv2.imencode(".jpg", frame)
+            file_output.write(data.tobytes())
+        return self.capture_metadata()
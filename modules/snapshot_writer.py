@@ -0,0 +1,238 @@
+# Background JPEG encode-and-write pipeline for camera snapshots.
+
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+from modules import backend
+
+try:
+    import simplejpeg
+except ImportError:  # cv2.imencode is used instead
+    simplejpeg = None
+
+cv2 = backend.cv2_module()
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['SnapshotWriter', 'SnapshotDropped', 'encode_jpeg']
+
+BLOCK = 'block'
+DROP_NEW = 'drop_new'
+DROP_OLDEST = 'drop_oldest'
+
+
+class SnapshotDropped(RuntimeError):
+    '''
+    Set on a snapshot's future when the drop policy discarded it.
+    '''
+
+
+def encode_jpeg(frame, quality: int = 90, colorspace: str = 'BGR') -> bytes:
+    '''
+    Encodes a frame to JPEG, with simplejpeg when available and cv2 otherwise.
+    `colorspace` names the channel order of `frame` ('BGR', 'RGB', 'BGRX', 'RGBX', 'GRAY').
+    '''
+    if simplejpeg is not None:
+        if frame.ndim == 2:
+            frame, colorspace = frame[..., None], 'GRAY'
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = frame.copy()
+        return simplejpeg.encode_jpeg(frame, quality=quality, colorspace=colorspace)
+    if colorspace in ('RGB', 'RGBX'):
+        frame = frame[..., 2::-1]
+    elif colorspace == 'BGRX':
+        frame = frame[..., :3]
+    ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError('cv2.imencode failed')
+    return buf.tobytes()
+
+
+class _Job:
+    __slots__ = ('frame', 'path', 'quality', 'colorspace', 'future', 'queued_at')
+
+    def __init__(self, frame, path, quality, colorspace):
+        self.frame = frame
+        self.path = path
+        self.quality = quality
+        self.colorspace = colorspace
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+
+class SnapshotWriter:
+    '''
+    Encodes and writes snapshots on worker threads so capture threads never
+    wait on JPEG encoding or SD-card I/O.
+
+    Frames go through a bounded queue. When it is full, `policy` decides:
+    'block' waits for space (backpressure, up to `put_timeout`), 'drop_new'
+    rejects the new frame and 'drop_oldest' discards the oldest queued one.
+    Dropped snapshots fail their future with SnapshotDropped.
+
+    Files are written atomically: encoded into a temporary file in the same
+    directory and renamed over `path`, so readers never see a partial JPEG.
+
+    Usage:
+        with SnapshotWriter() as writer:
+            future = writer.submit(frame, 'snapshots/camera_0.jpg')
+            ...
+            path = future.result()    # or: await asyncio.wrap_future(future)
+    '''
+
+    def __init__(self, max_queue: int = 8, workers: int = 2, quality: int = 90, policy: str = BLOCK,
+                 put_timeout: Optional[float] = None, fsync: bool = False):
+        if policy not in (BLOCK, DROP_NEW, DROP_OLDEST):
+            raise ValueError(f'Unknown queue policy {policy!r}')
+        self.quality = quality
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._tmp_seq = itertools.count()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.encode_s = 0.0
+        self.write_s = 0.0
+        self._workers = [
+            threading.Thread(target=self._work, name=f'snapshot-writer-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._workers:
+            t.start()
+
+    def __enter__(self) -> 'SnapshotWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def submit(self, frame, path: str, quality: Optional[int] = None, colorspace: str = 'BGR') -> Future:
+        '''
+        Queues `frame` for encoding to `path`. The returned future resolves to
+        the saved path. The frame must not be modified until the future is done.
+        '''
+        if self._closed:
+            raise RuntimeError('SnapshotWriter is closed')
+        job = _Job(frame, path, self.quality if quality is None else quality, colorspace)
+        with self._stats_lock:
+            self.submitted += 1
+        if self.policy == BLOCK:
+            try:
+                self._queue.put(job, timeout=self.put_timeout)
+            except queue.Full:
+                self._drop(job, 'queue full')
+            return job.future
+        while True:
+            try:
+                self._queue.put_nowait(job)
+                return job.future
+            except queue.Full:
+                if self.policy == DROP_NEW:
+                    self._drop(job, 'queue full')
+                    return job.future
+                try:
+                    self._drop(self._queue.get_nowait(), 'replaced by a newer snapshot')
+                    self._queue.task_done()
+                except queue.Empty:
+                    pass
+
+    def _drop(self, job: _Job, reason: str) -> None:
+        with self._stats_lock:
+            self.dropped += 1
+        logger.warning(f'Dropped snapshot {job.path}: {reason}')
+        job.future.set_exception(SnapshotDropped(f'{job.path}: {reason}'))
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    job.future.set_result(self._write(job))
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed += 1
+                logger.error(f'Failed to write snapshot {job.path}: {e}')
+                job.future.set_exception(e)
+            finally:
+                job.frame = None
+                self._queue.task_done()
+
+    def _write(self, job: _Job) -> str:
+        t0 = time.monotonic()
+        data = encode_jpeg(job.frame, job.quality, job.colorspace)
+        t1 = time.monotonic()
+        dirname = os.path.dirname(job.path) or '.'
+        os.makedirs(dirname, exist_ok=True)
+        tmp = os.path.join(dirname, f'.{os.path.basename(job.path)}.{os.getpid()}.{next(self._tmp_seq)}.tmp')
+        try:
+            with open(tmp, 'wb') as fh:
+                fh.write(data)
+                if self.fsync:
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            os.replace(tmp, job.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        t2 = time.monotonic()
+        with self._stats_lock:
+            self.written += 1
+            self.encode_s += t1 - t0
+            self.write_s += t2 - t1
+        logger.info(f'Saved snapshot to {job.path} ({len(data) / 1024:.0f} KiB, '
+                    f'encode {(t1 - t0) * 1000:.1f} ms, write {(t2 - t1) * 1000:.1f} ms)')
+        return job.path
+
+    def flush(self) -> None:
+        '''
+        Blocks until every queued snapshot has been written or has failed.
+        '''
+        self._queue.join()
+
+    def close(self, wait: bool = True) -> None:
+        '''
+        Stops accepting snapshots; with `wait`, finishes the queued ones first.
+        '''
+        if self._closed:
+            return
+        self._closed = True
+        if not wait:
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                job.future.cancel()
+                self._queue.task_done()
+        for _ in self._workers:
+            self._queue.put(None)
+        if wait:
+            for t in self._workers:
+                t.join()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                'submitted': self.submitted,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'queued': self._queue.qsize(),
+                'encode_mean_s': round(self.encode_s / self.written, 4) if self.written else None,
+                'write_mean_s': round(self.write_s / self.written, 4) if self.written else None,
+            }
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+v4l2_discovery.py — Fast camera discovery through V4L2 capability queries.
+
+Enumerates /dev/video* and issues one VIDIOC_QUERYCAP ioctl per node. No
+format is negotiated and no stream is started, so discovering every camera
+takes milliseconds instead of the seconds a cv2.VideoCapture probe costs.
+
+Each node is classified from its device capabilities as 'capture',
+'metadata', 'codec' (memory-to-memory), 'output' or 'other', and grouped
+with its sibling nodes under the physical device it belongs to (via
+/sys/class/video4linux/videoN/device). A USB webcam, for example, exposes a
+capture node and a metadata node that share one physical device; only the
+capture node can deliver frames.
+
+Importable API:
+    from modules.v4l2_discovery import discover, usb_capture_indices, csi_sensor_nodes
+    nodes = discover()
+    indices = usb_capture_indices()     # cv2.VideoCapture indices, one per USB camera
+"""
+
+import ctypes
+import fcntl
+import glob
+import os
+import re
+import time
+
+from modules import backend
+
+try:
+    import videodev2
+except ImportError:  # the structure and ioctl number are defined below
+    videodev2 = None
+
+__all__ = [
+    "VideoNode",
+    "discover",
+    "physical_devices",
+    "usb_capture_indices",
+    "csi_sensor_nodes",
+    "CAPTURE",
+    "METADATA",
+    "CODEC",
+    "OUTPUT",
+    "OTHER",
+]
+
+CAPTURE = "capture"
+METADATA = "metadata"
+CODEC = "codec"
+OUTPUT = "output"
+OTHER = "other"
+
+# Capability flags from linux/videodev2.h
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_VIDEO_OUTPUT = 0x00000002
+V4L2_CAP_VIDEO_CAPTURE_MPLANE = 0x00001000
+V4L2_CAP_VIDEO_OUTPUT_MPLANE = 0x00002000
+V4L2_CAP_VIDEO_M2M_MPLANE = 0x00004000
+V4L2_CAP_VIDEO_M2M = 0x00008000
+V4L2_CAP_META_CAPTURE = 0x00800000
+V4L2_CAP_META_OUTPUT = 0x08000000
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+# Drivers of the Raspberry Pi's CSI receivers (raw sensor nodes owned by libcamera)
+CSI_DRIVERS = {"unicam", "rp1-cfe"}
+# On-chip ISP/codec drivers that expose capture-capable nodes but are not cameras
+PLATFORM_DRIVERS = {"bcm2835-isp", "bcm2835-codec", "pispbe", "rpi-hevc-dec", "bcm2835-v4l2"}
+
+
+class _Capability(ctypes.Structure):
+    _fields_ = [
+        ("driver", ctypes.c_char * 16),
+        ("card", ctypes.c_char * 32),
+        ("bus_info", ctypes.c_char * 32),
+        ("version", ctypes.c_uint32),
+        ("capabilities", ctypes.c_uint32),
+        ("device_caps", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 3),
+    ]
+
+
+if videodev2 is not None and hasattr(videodev2, "v4l2_capability"):
+    _Capability = videodev2.v4l2_capability
+VIDIOC_QUERYCAP = getattr(videodev2, "VIDIOC_QUERYCAP", 0x80685600)
+
+
+class VideoNode:
+    """
+    One /dev/video* node and what it can do.
+    """
+
+    def __init__(self, path: str, driver: str, card: str, bus_info: str, caps: int, device_path: str = None):
+        self.path = path
+        self.index = int(re.sub(r"\D", "", os.path.basename(path)) or -1)
+        self.driver = driver
+        self.card = card
+        self.bus_info = bus_info
+        self.caps = caps
+        self.device_path = device_path or bus_info
+        self.kind = classify(caps)
+
+    @property
+    def is_usb(self) -> bool:
+        return self.bus_info.startswith("usb-") or "/usb" in self.device_path
+
+    @property
+    def is_csi_sensor(self) -> bool:
+        return self.kind == CAPTURE and self.driver in CSI_DRIVERS
+
+    @property
+    def is_platform(self) -> bool:
+        return self.driver in PLATFORM_DRIVERS
+
+    def to_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "index": self.index,
+            "kind": self.kind,
+            "driver": self.driver,
+            "card": self.card,
+            "bus_info": self.bus_info,
+            "caps": self.caps,
+            "device_path": self.device_path,
+        }
+
+    def __repr__(self) -> str:
+        return f"VideoNode({self.path}, {self.kind}, driver={self.driver!r}, card={self.card!r})"
+
+
+def classify(caps: int) -> str:
+    """Map V4L2 device capabilities to a node kind."""
+    if caps & (V4L2_CAP_VIDEO_M2M | V4L2_CAP_VIDEO_M2M_MPLANE):
+        return CODEC
+    if caps & (V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_VIDEO_CAPTURE_MPLANE):
+        if caps & (V4L2_CAP_VIDEO_OUTPUT | V4L2_CAP_VIDEO_OUTPUT_MPLANE):
+            return CODEC
+        return CAPTURE
+    if caps & V4L2_CAP_META_CAPTURE:
+        return METADATA
+    if caps & (V4L2_CAP_VIDEO_OUTPUT | V4L2_CAP_VIDEO_OUTPUT_MPLANE | V4L2_CAP_META_OUTPUT):
+        return OUTPUT
+    return OTHER
+
+
+def _decode(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode("utf-8", "replace")
+
+
+def query_node(path: str):
+    """
+    Issue VIDIOC_QUERYCAP on `path`. Returns a VideoNode, or None if the node
+    cannot be opened or is not a V4L2 device. Never starts streaming.
+    """
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    except PermissionError:
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        except OSError:
+            return None
+    except OSError:
+        return None
+    try:
+        cap = _Capability()
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, cap)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+    caps = cap.device_caps if cap.capabilities & V4L2_CAP_DEVICE_CAPS else cap.capabilities
+    sysfs = os.path.join("/sys/class/video4linux", os.path.basename(path), "device")
+    device_path = os.path.realpath(sysfs) if os.path.exists(sysfs) else None
+    return VideoNode(path, _decode(cap.driver), _decode(cap.card), _decode(cap.bus_info), caps, device_path)
+
+
+def _node_sort_key(path: str) -> int:
+    digits = re.sub(r"\D", "", os.path.basename(path))
+    return int(digits) if digits else -1
+
+
+def discover(dev_glob: str = "/dev/video*"):
+    """
+    Query every video node and return the VideoNodes sorted by index.
+    """
+    if backend.is_simulated():
+        from modules.sim.video import v4l2_nodes
+        return [VideoNode(**spec) for spec in v4l2_nodes()]
+    nodes = []
+    for path in sorted(glob.glob(dev_glob), key=_node_sort_key):
+        node = query_node(path)
+        if node is not None:
+            nodes.append(node)
+    return nodes
+
+
+def physical_devices(nodes=None) -> dict:
+    """
+    Group nodes by the physical device they belong to: {device_path: [VideoNode, ...]}.
+    """
+    groups = {}
+    for node in discover() if nodes is None else nodes:
+        groups.setdefault(node.device_path, []).append(node)
+    return groups
+
+
+def usb_capture_indices(nodes=None, max_index: int = None):
+    """
+    Return one cv2.VideoCapture index per USB camera: the lowest-numbered
+    capture node of each physical device, skipping metadata nodes.
+    """
+    indices = []
+    for members in physical_devices(nodes).values():
+        capture = [n for n in members if n.kind == CAPTURE and n.is_usb and not n.is_platform]
+        if capture:
+            idx = min(n.index for n in capture)
+            if max_index is None or idx <= max_index:
+                indices.append(idx)
+    return sorted(indices)
+
+
+def csi_sensor_nodes(nodes=None):
+    """
+    Return the raw capture nodes of CSI sensors (the cameras libcamera/Picamera2 drives).
+    """
+    return [n for n in (discover() if nodes is None else nodes) if n.is_csi_sensor]
+
+
+if __name__ == "__main__":
+    t0 = time.monotonic()
+    found = discover()
+    elapsed = time.monotonic() - t0
+    for device, members in physical_devices(found).items():
+        print(device)
+        for node in members:
+            print(f"  {node.path:<14} {node.kind:<9} {node.driver:<14} {node.card}")
+    print(f"USB capture indices: {usb_capture_indices(found)}")
+    print(f"CSI sensor nodes: {[n.path for n in csi_sensor_nodes(found)]}")
+    print(f"Discovered {len(found)} node(s) in {elapsed * 1000:.2f} ms")
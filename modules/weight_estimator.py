@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Module: weight_estimator.py
+
+Streaming, outlier-resistant weight estimation with early stopping.
+
+Samples are fed one at a time. Glitch values (0, -1 and the saturated
+24-bit extremes the HX711 returns on a bad clock) are dropped outright;
+the rest are gated against the median/MAD of the recent window, so a
+single spike cannot move the result. A run of consecutive "outliers" is
+treated as a genuine load change and restarts the window at the new level.
+
+The reading is settled once the last `window` samples agree: their
+standard error is within half the tolerance and the means of the window's
+two halves differ by no more than the tolerance (no trend). Estimation
+stops there, or when the sample/time budget runs out.
+
+Usage:
+    estimator = RobustWeightEstimator(zero_offset, reference_unit, tolerance=0.5)
+    for raw in samples:
+        estimator.add(raw)
+        if estimator.settled:
+            break
+    result = estimator.result()     # WeightEstimate
+"""
+
+import math
+import time
+
+import numpy as np
+
+__all__ = [
+    'GLITCH_VALUES',
+    'WeightEstimate',
+    'RobustWeightEstimator',
+    'estimate_stream',
+    'estimate_buffered',
+]
+
+# Raw values the HX711 (or its driver) returns instead of a real conversion
+GLITCH_VALUES = frozenset((0, -1, 0x7FFFFF, -0x800000))
+
+# Scales a median absolute deviation to a Gaussian standard deviation
+MAD_TO_STD = 1.4826
+
+
+class WeightEstimate:
+    """
+    Result of one robust weight measurement.
+
+    float(estimate) gives the weight itself (NaN when there was no valid sample).
+    """
+
+    def __init__(self, value, count=0, used=0, rejected=0, variance=float('nan'),
+                 settled=False, elapsed_s=0.0, reason='', timestamp=None):
+        self.value = value
+        self.count = count
+        self.used = used
+        self.rejected = rejected
+        self.variance = variance
+        self.settled = settled
+        self.elapsed_s = elapsed_s
+        self.reason = reason
+        # time.monotonic() of the newest sample consumed
+        self.timestamp = timestamp
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.variance == self.variance else float('nan')
+
+    def __float__(self):
+        return float('nan') if self.value is None else float(self.value)
+
+    def to_dict(self):
+        return {
+            'value': self.value,
+            'count': self.count,
+            'used': self.used,
+            'rejected': self.rejected,
+            'variance': self.variance,
+            'settled': self.settled,
+            'elapsed_s': round(self.elapsed_s, 4),
+            'reason': self.reason,
+            'timestamp': self.timestamp,
+        }
+
+    def summary(self, unit='g'):
+        if self.value is None:
+            return f'no reading ({self.reason})'
+        state = 'settled' if self.settled else f'not settled: {self.reason}'
+        return (f'{self.value:.2f} {unit} ± {self.std:.2f} ({state}; {self.used}/{self.count} samples, '
+                f'{self.rejected} rejected, {self.elapsed_s:.2f}s)')
+
+    def __repr__(self):
+        return f'WeightEstimate({self.summary()})'
+
+
+class RobustWeightEstimator:
+    """
+    Incremental median/MAD-gated estimator with stability detection.
+
+    Values are converted as (raw - zero_offset) / reference_unit before
+    gating, so `tolerance` is in output units (grams for a calibrated scale,
+    counts with zero_offset=0 and reference_unit=1).
+
+    :param tolerance: Required agreement of the settled window, in output units
+    :param window: Samples in the sliding stability window
+    :param max_samples: Stop after this many samples (accepted or not)
+    :param mad_k: Samples further than mad_k robust standard deviations from the window median are outliers
+    :param noise_floor: Minimum robust std used for gating (defaults to tolerance / 4)
+    """
+
+    def __init__(self, zero_offset=0.0, reference_unit=1.0, tolerance=0.5, window=10,
+                 max_samples=100, mad_k=3.5, noise_floor=None):
+        if window < 4:
+            raise ValueError('window must be at least 4 samples')
+        self.zero_offset = zero_offset
+        self.reference_unit = reference_unit
+        self.tolerance = tolerance
+        self.window = window
+        self.max_samples = max_samples
+        self.mad_k = mad_k
+        self.noise_floor = tolerance / 4.0 if noise_floor is None else noise_floor
+        self.started_at = time.monotonic()
+        self.count = 0
+        self.rejected = 0
+        self.level_shifts = 0
+        self._accepted = []
+        self._pending = []
+        self._settled = False
+        self.last_timestamp = None
+
+    def add(self, raw, timestamp=None):
+        """
+        Feed one raw sample (taken at `timestamp`, default now). Returns True
+        if it was accepted into the window.
+        """
+        self.count += 1
+        self.last_timestamp = time.monotonic() if timestamp is None else timestamp
+        if raw is False or raw is None or raw in GLITCH_VALUES:
+            self.rejected += 1
+            return False
+        value = (raw - self.zero_offset) / self.reference_unit
+        recent = self._accepted[-self.window:]
+        if len(recent) >= 3:
+            median = float(np.median(recent))
+            spread = max(MAD_TO_STD * float(np.median(np.abs(np.asarray(recent) - median))), self.noise_floor)
+            if abs(value - median) > self.mad_k * spread:
+                self._pending.append(value)
+                if len(self._pending) < max(3, self.window // 2):
+                    self.rejected += 1
+                    return False
+                # Consistent "outliers" mean the load changed: restart at the new level
+                self.rejected += 1 - len(self._pending)
+                self._accepted = self._pending
+                self._pending = []
+                self.level_shifts += 1
+                self._settled = False
+                return True
+        self._pending = []
+        self._accepted.append(value)
+        self._settled = self._check_settled()
+        return True
+
+    def _check_settled(self):
+        if len(self._accepted) < self.window:
+            return False
+        w = np.asarray(self._accepted[-self.window:])
+        half = self.window // 2
+        stderr = float(w.std(ddof=1)) / math.sqrt(self.window)
+        trend = abs(float(w[:half].mean()) - float(w[half:].mean()))
+        return stderr <= self.tolerance / 2.0 and trend <= self.tolerance
+
+    @property
+    def settled(self):
+        return self._settled
+
+    @property
+    def exhausted(self):
+        return self.count >= self.max_samples
+
+    @property
+    def done(self):
+        return self._settled or self.exhausted
+
+    def result(self, reason=None):
+        """
+        Current estimate: the mean of the settled window, or the median of the
+        recent window when the reading never settled.
+        """
+        elapsed = time.monotonic() - self.started_at
+        if not self._accepted:
+            return WeightEstimate(None, self.count, 0, self.rejected, settled=False, elapsed_s=elapsed,
+                                  reason=reason or 'no valid samples', timestamp=self.last_timestamp)
+        w = np.asarray(self._accepted[-self.window:])
+        variance = float(w.var(ddof=1)) if len(w) > 1 else float('nan')
+        if self._settled:
+            value = float(w.mean())
+            reason = reason or ''
+        else:
+            value = float(np.median(w))
+            reason = reason or ('sample budget exhausted' if self.exhausted else 'still settling')
+        return WeightEstimate(value, self.count, len(w), self.rejected, variance,
+                              self._settled, elapsed, reason, self.last_timestamp)
+
+
+def estimate_stream(read, estimator, max_time=5.0):
+    """
+    Feed samples from a blocking `read()` callable into `estimator` until it
+    settles, the sample budget is used up or `max_time` seconds pass.
+
+    :return: WeightEstimate
+    """
+    deadline = estimator.started_at + max_time
+    while not estimator.done:
+        if time.monotonic() >= deadline:
+            return estimator.result('time budget exhausted')
+        estimator.add(read())
+    return estimator.result()
+
+
+def estimate_buffered(engine, estimator, since=None, max_time=5.0):
+    """
+    Feed samples from an acquisition engine's ring buffer into `estimator`.
+
+    Starts with the newest buffered window (so a scale that is already
+    steady settles without waiting), then consumes samples as the engine
+    produces them until the estimator is done or `max_time` passes.
+
+    :param engine: HX711Acquisition (or a bank channel view) that is running
+    :param since: Only use samples taken at or after this time.monotonic() value
+    :return: WeightEstimate
+    """
+    deadline = estimator.started_at + max_time
+    timestamps, values = engine.ring.latest(estimator.window, since)
+    cursor = since
+    while True:
+        for timestamp, value in zip(timestamps, values):
+            estimator.add(value, float(timestamp))
+            if estimator.done:
+                return estimator.result()
+        if len(timestamps):
+            # Strictly after the newest sample already consumed
+            cursor = float(timestamps[-1]) + 1e-9
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return estimator.result('time budget exhausted')
+        if not engine.wait_for_samples(1, since=cursor, timeout=remaining) and not engine.running:
+            return estimator.result('acquisition stopped')
+        timestamps, values = engine.ring.latest(None, cursor)